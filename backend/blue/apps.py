@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BlueConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blue'
+
+    def ready(self):
+        import blue.signals
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Subscription
+from identity.util import adjust_author_counter
+
+@receiver(post_save, sender=Subscription)
+def handle_save_subscription(sender, instance: Subscription, created: bool, **kwargs):
+  if created:
+    adjust_author_counter(instance.author_id, "subscription_count", 1)
+
+@receiver(post_delete, sender=Subscription)
+def handle_delete_subscription(sender, instance: Subscription, **kwargs):
+  adjust_author_counter(instance.author_id, "subscription_count", -1)
@@ -4,19 +4,40 @@ followers, inbox messages etc to avoid the redundancy of re-populating the
 database for each app's test-suite.
 """
 
-from django.test import TestCase
+import shutil
+import tempfile
+from django.test import TestCase, override_settings
 from django.conf import settings
+from django.core.cache import cache
 from identity.models import Author, InboxMessage
 from posts.models import Post, Comment
 from following.models import Following, FollowingRequest
 from django.contrib.auth.models import User
 from likes.models import Like
+from nodes.registry import invalidate_node_registry
 from deadlybird.util import generate_full_api_url, generate_next_id
 from deadlybird.settings import SITE_HOST_URL
 
 class BaseTestCase(TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Stored images go to a directory which is removed with the test case
+        cls.image_store_root = tempfile.mkdtemp(prefix="deadlybird-images-")
+        cls.image_store_settings = override_settings(IMAGE_STORE_ROOT=cls.image_store_root)
+        cls.image_store_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.image_store_settings.disable()
+        shutil.rmtree(cls.image_store_root, ignore_errors=True)
+        super().tearDownClass()
+
     def setUp(self):
+        cache.clear()
+        # Rolled back nodes of earlier tests never fire the delete signal
+        invalidate_node_registry()
         self.authors            = self.create_authors()
         self.posts              = self.create_posts(self.authors)
         self.follow_requests    = self.create_follow_request(self.authors)
@@ -103,7 +124,8 @@ class BaseTestCase(TestCase):
             msg = InboxMessage.objects.create(
                 author=post.author,
                 content_id=post.id,
-                content_type=InboxMessage.ContentType.POST
+                content_type=InboxMessage.ContentType.POST,
+                post=post
             )
             inbox_messages.append(msg)
 
@@ -111,7 +133,8 @@ class BaseTestCase(TestCase):
             msg = InboxMessage.objects.create(
                 author=follow_request.target_author,
                 content_id=follow_request.id,
-                content_type=InboxMessage.ContentType.FOLLOW
+                content_type=InboxMessage.ContentType.FOLLOW,
+                follow_request=follow_request
             )
             inbox_messages.append(msg)
         return inbox_messages
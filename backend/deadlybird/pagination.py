@@ -1,23 +1,135 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework import serializers
 from drf_spectacular.utils import inline_serializer, OpenApiParameter
+import json
 
-class Pagination(PageNumberPagination):
+class KeysetPaginationMixin:
+    """
+    Opt-in keyset (cursor) pagination for PageNumberPagination subclasses.
+
+    When `cursor_ordering` is set, passing the `cursor` query parameter (empty for
+    the first page) switches to seeking past the last row seen on those columns
+    instead of using OFFSET, and skips the COUNT(*) of the page number mode.
+    Without it the regular page/size API is used.
+    """
+    cursor_query_param = 'cursor'
+    cursor_ordering = None    # must be unique, so end with the primary key
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_ordering is None or self.cursor_query_param not in request.query_params:
+            self.cursor_mode = False
+            return super().paginate_queryset(queryset, request, view)
+
+        self.cursor_mode = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request.query_params[self.cursor_query_param])
+
+        ordering = self.cursor_ordering if not reverse else tuple(self._flip(field) for field in self.cursor_ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._seek_filter(ordering, position))
+
+        # Fetch one extra row to know if there is anything past this page
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.page_results = results
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = position is not None if not reverse else has_more
+        return results
+
+    def get_next_link(self):
+        if not getattr(self, "cursor_mode", False):
+            return super().get_next_link()
+        if not self.has_next or len(self.page_results) == 0:
+            return None
+        return self._cursor_link(self.page_results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not getattr(self, "cursor_mode", False):
+            return super().get_previous_link()
+        if not self.has_previous or len(self.page_results) == 0:
+            return None
+        return self._cursor_link(self.page_results[0], reverse=True)
+
+    def decode_cursor(self, cursor: str) -> tuple[list|None, bool]:
+        """
+        Returns the ordering values to seek past and whether we are paginating backwards.
+        """
+        if len(cursor) == 0:
+            return (None, False)
+        try:
+            payload = json.loads(urlsafe_b64decode(cursor.encode("ascii") + b"=" * (-len(cursor) % 4)))
+            position = payload["p"]
+            if not isinstance(position, list) or len(position) != len(self.cursor_ordering):
+                raise ValueError()
+            return (position, bool(payload.get("r", False)))
+        except Exception:
+            raise NotFound("Invalid cursor")
+
+    def encode_cursor(self, position: list, reverse: bool) -> str:
+        payload = json.dumps({ "p": position, "r": reverse }, separators=(",", ":"), default=str)
+        return urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+    def _cursor_link(self, item, reverse: bool) -> str:
+        position = []
+        for field in self.cursor_ordering:
+            value = getattr(item, field.lstrip("-"))
+            position.append(value.isoformat() if hasattr(value, "isoformat") else value)
+
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position, reverse))
+
+    @staticmethod
+    def _flip(field: str) -> str:
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def _seek_filter(ordering: tuple, position: list) -> Q:
+        """
+        Build (a > x) OR (a = x AND b > y) ... for the given ordering, with the
+        comparison direction of each column following its sort direction.
+        """
+        seek = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            seek |= equal & Q(**{ f"{name}__{lookup}": value })
+            equal &= Q(**{ name: value })
+        return seek
+
+class Pagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = 10                  # default page size
     page_size_query_param = 'size'  # allow client to override the page size using this query parameter
     max_page_size = 100             # maximum limit of the page size
 
-    def __init__(self, type) -> None:
+    def __init__(self, type, cursor_ordering: tuple = None) -> None:
         super().__init__()
         self.items_type = type
+        self.cursor_ordering = cursor_ordering
 
 
     def get_paginated_response(self, data):
+        return self.build_response(data, self.get_next_link(), self.get_previous_link())
+
+    def build_response(self, data, next_link: str|None, previous_link: str|None):
+        """
+        Build a paginated response from links that were computed earlier (e.g. a cached page).
+        """
         return Response({
             "type": self.items_type,
-            "next": self.get_next_link(),
-            "prev": self.get_previous_link(),
+            "next": next_link,
+            "prev": previous_link,
             "items": data
         })
     
@@ -41,8 +153,14 @@ def generate_pagination_schema(paginator_name: str, serializer: serializers.Seri
     
     return serializer
 
-def generate_pagination_query_schema():
-    return [
+def generate_pagination_query_schema(cursor: bool = False):
+    parameters = [
         OpenApiParameter(name="page", description="The page to retrieve items from", type=int, required=False, location=OpenApiParameter.QUERY),
         OpenApiParameter(name="count", description="The amount of items to show per page", type=int, required=False, location=OpenApiParameter.QUERY)
-    ]
\ No newline at end of file
+    ]
+    if cursor:
+        parameters.append(generate_cursor_query_schema())
+    return parameters
+
+def generate_cursor_query_schema():
+    return OpenApiParameter(name="cursor", description="Opaque cursor from a previous next/prev link (empty for the first page). Enables keyset pagination", type=str, required=False, location=OpenApiParameter.QUERY)
\ No newline at end of file
@@ -32,6 +32,11 @@ DEBUG = True
 # If we are running tests
 TESTING = sys.argv[1:2] == ['test']
 
+# If the background jobs (queues, syncs, GitHub activity) run in this process. Defaults to server processes only
+# (runserver or gunicorn), so one-off management commands like migrate do not drain queues or call remote nodes
+IS_SERVER_PROCESS = sys.argv[1:2] == ['runserver'] or os.path.basename(sys.argv[0]) == 'gunicorn'
+RUN_SCHEDULER = os.environ.get("RUN_SCHEDULER", str(IS_SERVER_PROCESS)).lower() == "true" and not TESTING
+
 ALLOWED_HOSTS = [
   'thedeadlybird.willqi.dev',
   'http://localhost:3000',
@@ -134,6 +139,38 @@ else:
     }
 
 
+# Cache
+# Defaults to a per-process in-memory cache. Set CACHE_URL (redis://...) to share it between workers through Redis,
+# or CACHE_DIR to use a file based cache.
+if len(os.environ.get("CACHE_URL", "")) > 0 and not TESTING:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ.get("CACHE_URL"),
+        }
+    }
+elif len(os.environ.get("CACHE_DIR", "")) > 0 and not TESTING:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_DIR"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+
+# Content addressed storage of image post blobs (tests get a temporary directory per test case, see BaseTestCase)
+if IS_DOCKER_APP:
+    IMAGE_STORE_ROOT = os.environ.get("IMAGE_STORE_ROOT", str(BASE_DIR / "data" / "images"))
+else:
+    IMAGE_STORE_ROOT = os.environ.get("IMAGE_STORE_ROOT", str(BASE_DIR / "media" / "images"))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -196,6 +233,75 @@ SITE_HOST_URL = os.environ.get("HOST_URL", "http://localhost:8000")
 SITE_REMOTE_AUTH_USERNAME = os.environ.get("REMOTE_AUTH_USERNAME", "username")
 SITE_REMOTE_AUTH_PASSWORD = os.environ.get("REMOTE_AUTH_PASSWORD", "password")
 
+# Pooled HTTP client used for requests to remote nodes
+NODE_CLIENT_CONNECT_TIMEOUT = float(os.environ.get("NODE_CLIENT_CONNECT_TIMEOUT", "5"))
+NODE_CLIENT_READ_TIMEOUT = float(os.environ.get("NODE_CLIENT_READ_TIMEOUT", "30"))
+NODE_CLIENT_POOL_SIZE = int(os.environ.get("NODE_CLIENT_POOL_SIZE", "10"))
+# Seconds a worker keeps its in-memory copy of the node table (changes made by this worker invalidate it right away)
+NODE_REGISTRY_TTL_SECONDS = int(os.environ.get("NODE_REGISTRY_TTL_SECONDS", "60"))
+
+# Shared inbox: most deliveries accepted in one request, and how often remote nodes are asked whether they have one
+SHARED_INBOX_MAX_DELIVERIES = int(os.environ.get("SHARED_INBOX_MAX_DELIVERIES", "500"))
+SHARED_INBOX_DISCOVERY_SECONDS = int(os.environ.get("SHARED_INBOX_DISCOVERY_SECONDS", "3600"))
+
+# Responses of remote nodes proxied for comments, likes and liked: seconds served as is,
+# then seconds served stale while being refreshed in the background
+NODE_PROXY_CACHE_SECONDS = int(os.environ.get("NODE_PROXY_CACHE_SECONDS", "15"))
+NODE_PROXY_STALE_SECONDS = int(os.environ.get("NODE_PROXY_STALE_SECONDS", "60"))
+NODE_PROXY_REVALIDATE_WORKERS = int(os.environ.get("NODE_PROXY_REVALIDATE_WORKERS", "2"))
+
+# Local mirror of the comments and likes of remote posts in our feeds (see posts.replica)
+REPLICA_RECONCILE_POLL_SECONDS = int(os.environ.get("REPLICA_RECONCILE_POLL_SECONDS", "10"))
+REPLICA_BATCH_SIZE = int(os.environ.get("REPLICA_BATCH_SIZE", "50"))
+REPLICA_SYNC_WORKERS = int(os.environ.get("REPLICA_SYNC_WORKERS", "4"))
+# Posts are synced this often on their first day, doubling every day of age up to the maximum
+REPLICA_SYNC_INTERVAL_SECONDS = int(os.environ.get("REPLICA_SYNC_INTERVAL_SECONDS", "60"))
+REPLICA_SYNC_MAX_INTERVAL_SECONDS = int(os.environ.get("REPLICA_SYNC_MAX_INTERVAL_SECONDS", "600"))
+# Mirrors older than this are not served, reads are proxied to the remote node instead
+REPLICA_MAX_STALENESS_SECONDS = int(os.environ.get("REPLICA_MAX_STALENESS_SECONDS", "900"))
+REPLICA_POST_MAX_AGE_DAYS = int(os.environ.get("REPLICA_POST_MAX_AGE_DAYS", "14"))
+REPLICA_MAX_COMMENT_PAGES = int(os.environ.get("REPLICA_MAX_COMMENT_PAGES", "5"))
+REPLICA_COMMENT_PAGE_SIZE = int(os.environ.get("REPLICA_COMMENT_PAGE_SIZE", "100"))
+
+# Outbound delivery queue used to push inbox messages to remote nodes
+OUTBOUND_DELIVERY_POLL_SECONDS = int(os.environ.get("OUTBOUND_DELIVERY_POLL_SECONDS", "5"))
+OUTBOUND_DELIVERY_WORKERS = int(os.environ.get("OUTBOUND_DELIVERY_WORKERS", "8"))
+# Per worker process, every process running the queue adds this many requests to a node
+OUTBOUND_DELIVERY_PER_NODE_CONCURRENCY = int(os.environ.get("OUTBOUND_DELIVERY_PER_NODE_CONCURRENCY", "2"))
+OUTBOUND_DELIVERY_BATCH_SIZE = int(os.environ.get("OUTBOUND_DELIVERY_BATCH_SIZE", "100"))
+OUTBOUND_DELIVERY_MAX_ATTEMPTS = int(os.environ.get("OUTBOUND_DELIVERY_MAX_ATTEMPTS", "8"))
+
+# Seconds a serialized public stream page is cached for (pages are also invalidated when posts change)
+PUBLIC_STREAM_CACHE_SECONDS = int(os.environ.get("PUBLIC_STREAM_CACHE_SECONDS", "60"))
+
+# Inbound inbox queue: remote activities are answered with 202 Accepted and processed in the background
+INBOX_ASYNC_INGESTION = os.environ.get("INBOX_ASYNC_INGESTION", "false").lower() == "true"
+INBOX_INGESTION_POLL_SECONDS = int(os.environ.get("INBOX_INGESTION_POLL_SECONDS", "2"))
+INBOX_INGESTION_WORKERS = int(os.environ.get("INBOX_INGESTION_WORKERS", "1"))
+INBOX_INGESTION_BATCH_SIZE = int(os.environ.get("INBOX_INGESTION_BATCH_SIZE", "100"))
+INBOX_INGESTION_MAX_ATTEMPTS = int(os.environ.get("INBOX_INGESTION_MAX_ATTEMPTS", "8"))
+# Seconds processed activities are kept around to drop redeliveries
+INBOX_INGESTION_RETENTION_SECONDS = int(os.environ.get("INBOX_INGESTION_RETENTION_SECONDS", "86400"))
+
+# Seconds the block list of an author is cached for (changes made through this worker invalidate it right away)
+BLOCKED_AUTHORS_CACHE_SECONDS = int(os.environ.get("BLOCKED_AUTHORS_CACHE_SECONDS", "60"))
+
+# Posts of authors with more followers than this are pulled into following streams instead of fanned out
+FEED_FANOUT_FOLLOWER_THRESHOLD = int(os.environ.get("FEED_FANOUT_FOLLOWER_THRESHOLD", "5000"))
+
+# Seconds fetched remote author documents are reused for, and failed fetches are not retried for
+REMOTE_AUTHOR_CACHE_SECONDS = int(os.environ.get("REMOTE_AUTHOR_CACHE_SECONDS", "300"))
+REMOTE_AUTHOR_NEGATIVE_CACHE_SECONDS = int(os.environ.get("REMOTE_AUTHOR_NEGATIVE_CACHE_SECONDS", "30"))
+
+# Background mirroring of the author directories of remote nodes
+REMOTE_AUTHOR_SYNC_POLL_SECONDS = int(os.environ.get("REMOTE_AUTHOR_SYNC_POLL_SECONDS", "30"))
+REMOTE_AUTHOR_SYNC_INTERVAL_SECONDS = int(os.environ.get("REMOTE_AUTHOR_SYNC_INTERVAL_SECONDS", "300"))
+REMOTE_AUTHOR_SYNC_PAGES_PER_RUN = int(os.environ.get("REMOTE_AUTHOR_SYNC_PAGES_PER_RUN", "5"))
+REMOTE_AUTHOR_SYNC_PAGE_SIZE = int(os.environ.get("REMOTE_AUTHOR_SYNC_PAGE_SIZE", "100"))
+# Full directory pulls fetch pages concurrently, bounded overall and per node
+REMOTE_AUTHOR_FETCH_MAX_IN_FLIGHT = int(os.environ.get("REMOTE_AUTHOR_FETCH_MAX_IN_FLIGHT", "16"))
+REMOTE_AUTHOR_FETCH_PER_NODE = int(os.environ.get("REMOTE_AUTHOR_FETCH_PER_NODE", "4"))
+
 # In the case scenario of localhost testing, we can override the cookie name
 SESSION_COOKIE_NAME = os.environ.get("COOKIE_NAME", "sessionid")
 
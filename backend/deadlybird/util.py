@@ -1,5 +1,7 @@
 from django.urls import reverse
 from django.conf import settings
+from django.db.models import Count, IntegerField, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
 from deadlybird.settings import SITE_HOST_URL
 from urllib.parse import urljoin, urlparse
 import os
@@ -62,11 +64,9 @@ def get_host_from_api_url(url: str) -> str|None:
   if url.startswith(dockerize_localhost(remove_trailing_slash(SITE_HOST_URL))):
      return SITE_HOST_URL
   
-  from nodes.models import Node
-  for node in Node.objects.all():
-    if url.startswith(remove_trailing_slash(node.host)):
-      return node.host
-  return None
+  from nodes.registry import find_node_by_api_url
+  node = find_node_by_api_url(url)
+  return node.host if node is not None else None
 
 def get_host_with_slash(host: str):
   return host if host.endswith("/") else host + "/"
@@ -94,4 +94,16 @@ def compare_domains(url1, url2):
       return domain1 == domain2
 
 def remove_trailing_slash(input: str):
-  return input[:-1] if input.endswith("/") else input
\ No newline at end of file
+  return input[:-1] if input.endswith("/") else input
+
+def count_subquery(queryset: QuerySet, field: str):
+  """
+  Correlated COUNT(*) subquery of the queryset rows whose field matches the outer primary key.
+  Subqueries only run for the rows that are returned, unlike a JOIN + GROUP BY.
+  """
+  counts = queryset.filter(**{ field: OuterRef("pk") }) \
+    .order_by() \
+    .values(field) \
+    .annotate(count=Count("pk")) \
+    .values("count")
+  return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
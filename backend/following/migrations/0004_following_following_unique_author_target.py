@@ -0,0 +1,37 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:32
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicate_followings(apps, schema_editor):
+    Author = apps.get_model("identity", "Author")
+    Following = apps.get_model("following", "Following")
+
+    duplicates = Following.objects.values("author", "target_author") \
+        .annotate(rows=Count("id"), keep=Min("id")) \
+        .filter(rows__gt=1)
+    for duplicate in duplicates:
+        removed, _ = Following.objects \
+            .filter(author=duplicate["author"], target_author=duplicate["target_author"]) \
+            .exclude(id=duplicate["keep"]) \
+            .delete()
+        # Keep the denormalized counters in line, signals do not run in migrations
+        Author.objects.filter(id=duplicate["author"]).update(following_count=F("following_count") - removed)
+        Author.objects.filter(id=duplicate["target_author"]).update(follower_count=F("follower_count") - removed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('following', '0003_alter_following_id_alter_followingrequest_id'),
+        ('identity', '0022_inboxmessage_inbox_author_id_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_followings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='following',
+            constraint=models.UniqueConstraint(fields=('author', 'target_author'), name='following_unique_author_target'),
+        ),
+    ]
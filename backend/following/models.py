@@ -16,6 +16,11 @@ class Following(models.Model):
                              on_delete=models.CASCADE, 
                              related_name="following_from")
 
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(fields=["author", "target_author"], name="following_unique_author_target")
+    ]
+
   def __str__(self) -> str:
       return f"Following - ({self.author.display_name} to {self.target_author.display_name})"
 
@@ -1,9 +1,15 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import FollowingRequest
-from identity.models import InboxMessage
+from .models import Following
+from identity.util import adjust_author_counter
 
-@receiver(post_delete, sender=FollowingRequest)
-def handle_delete_follow_request(sender, instance: FollowingRequest, **kwargs):
-  follow_request_id = instance.id
-  InboxMessage.objects.all().filter(content_type=InboxMessage.ContentType.FOLLOW, content_id=follow_request_id).delete()
\ No newline at end of file
+@receiver(post_save, sender=Following)
+def handle_save_following(sender, instance: Following, created: bool, **kwargs):
+  if created:
+    adjust_author_counter(instance.author_id, "following_count", 1)
+    adjust_author_counter(instance.target_author_id, "follower_count", 1)
+
+@receiver(post_delete, sender=Following)
+def handle_delete_following(sender, instance: Following, **kwargs):
+  adjust_author_counter(instance.author_id, "following_count", -1)
+  adjust_author_counter(instance.target_author_id, "follower_count", -1)
@@ -7,6 +7,7 @@ Run tests for the Following and FollowRequest models and views
 
 from django.urls import reverse
 from .models import Following, FollowingRequest
+from .util import get_friend_ids, is_friends
 from deadlybird.base_test import BaseTestCase
 from identity.models import InboxMessage
 
@@ -95,4 +96,26 @@ class FollowersTestCase(BaseTestCase):
         
         res = self.client.get(url)
 
-        self.assertEqual(res.status_code, 200)
\ No newline at end of file
+        self.assertEqual(res.status_code, 200)
+
+class FriendshipTestCase(BaseTestCase):
+    def test_friend_ids(self):
+        """
+        Mutual follows should be resolved with a single query.
+        """
+        author, friend, follower, followee = self.authors[0:4]
+        Following.objects.filter(author__in=self.authors[0:4]).delete()
+        Following.objects.filter(target_author__in=self.authors[0:4]).delete()
+        Following.objects.create(author=author, target_author=friend)
+        Following.objects.create(author=friend, target_author=author)
+        Following.objects.create(author=follower, target_author=author)
+        Following.objects.create(author=author, target_author=followee)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(set(get_friend_ids(author.id)), { friend.id })
+        with self.assertNumQueries(1):
+            self.assertEqual(list(get_friend_ids(author.id, among=[follower.id, followee.id])), [])
+        with self.assertNumQueries(1):
+            self.assertTrue(is_friends(friend.id, author.id))
+        self.assertFalse(is_friends(author.id, follower.id))
+        self.assertFalse(is_friends(author.id, followee.id))
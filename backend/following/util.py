@@ -1,5 +1,21 @@
+from django.db.models import QuerySet
 from .models import Following
 
+def get_friend_ids(author_id: str, among: list[str] = None) -> QuerySet:
+  """
+    Ids of the authors who are friends with an author, as a lazy queryset which
+    can be evaluated or used as a subquery. Friends are resolved with one self-join on Following.
+
+    Params:
+    - author_id - author whose friends are retrieved
+    - among - optionally only consider these author ids
+  """
+  friends = Following.objects.filter(author=author_id, target_author__following_from__target_author=author_id)
+  if among is not None:
+    friends = friends.filter(target_author__in=among)
+
+  return friends.values_list("target_author", flat=True)
+
 def is_friends(author_id: str, other_author_id: str):
   """
     If two authors are friends, then they should both be following one another.
@@ -8,10 +24,4 @@ def is_friends(author_id: str, other_author_id: str):
     - author_id - author id A
     - other_author_id - author id B
   """
-  try:
-    Following.objects.get(author=author_id, target_author=other_author_id)
-    Following.objects.get(author=other_author_id, target_author=author_id)
-  except Following.DoesNotExist:
-    return False
-
-  return True
\ No newline at end of file
+  return get_friend_ids(author_id, among=[other_author_id]).exists()
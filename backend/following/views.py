@@ -12,12 +12,12 @@ from deadlybird.pagination import Pagination, generate_pagination_query_schema
 from deadlybird.serializers import GenericErrorSerializer, GenericSuccessSerializer
 from drf_spectacular.utils import extend_schema, OpenApiParameter, inline_serializer
 from deadlybird.settings import SITE_HOST_URL
-from nodes.util import get_auth_from_host
+from nodes.client import node_post
 from deadlybird.util import resolve_remote_route, compare_domains, remove_trailing_slash
 from identity.util import check_author_is_remote
 from identity.serializers import AuthorSerializer
-import requests
 import json
+import requests
 
 
 @extend_schema(
@@ -158,19 +158,21 @@ def modify_follower(request, author_id: str, foreign_author_id: str):
             remote_route = resolve_remote_route(author.host, view="inbox", kwargs={
                 "author_id": author_id,
             })
-            auth = get_auth_from_host(author.host)
             post_json = {
                 "type": "Unfollow",
                 "summary": f"{foreign_author.display_name} wants to unfollow {author.display_name}",
                 "actor": AuthorSerializer(foreign_author).data,
                 "object": AuthorSerializer(author).data,
             }
-            requests.post(
-                url=remote_route, 
-                headers={'Content-Type': 'application/json'},
-                data=json.dumps(post_json),
-                auth=auth,
-            )
+            try:
+                node_post(
+                    url=remote_route, 
+                    headers={'Content-Type': 'application/json'},
+                    data=json.dumps(post_json)
+                )
+            except requests.RequestException as e:
+                print(f"Failed to send Unfollow to \"{remote_route}\": {e}")
+                return Response({"error": True, "message": "Follower removed, but the remote node could not be reached"}, status=502)
         return Response({"error": False, "message": "Follower removed successfully."}, status=204)
 
     elif request.method == "PUT": 
@@ -194,7 +196,6 @@ def modify_follower(request, author_id: str, foreign_author_id: str):
             route = resolve_remote_route(foreign_author.host, view="inbox", kwargs={
                 "author_id": foreign_author_id,
             })
-            auth = get_auth_from_host(foreign_author.host)
             post_json = {
                 "type": "FollowResponse",
                 "summary": f"{author.display_name} accepted your follow request",
@@ -202,12 +203,15 @@ def modify_follower(request, author_id: str, foreign_author_id: str):
                 "object": AuthorSerializer(foreign_author).data,
                 "accepted": True,
             }
-            requests.post(
-                url=route,
-                headers={'Content-Type': 'application/json'},
-                data=json.dumps(post_json),
-                auth=auth,
-            )
+            try:
+                node_post(
+                    url=route,
+                    headers={'Content-Type': 'application/json'},
+                    data=json.dumps(post_json)
+                )
+            except requests.RequestException as e:
+                print(f"Failed to send FollowResponse to \"{route}\": {e}")
+                return Response({"error": True, "message": "Follower added, but the remote node could not be reached"}, status=502)
 
         return Response({"error": False, "message": "Follower added successfully."}, status=201)
     
@@ -291,7 +295,6 @@ def request_follower(request: HttpRequest, author_id: str, target_author_id: str
             route = resolve_remote_route(author.host, view="inbox", kwargs={
                 "author_id": author_id,
             })
-            auth = get_auth_from_host(author.host)
             post_json = {
                 "type": "FollowResponse",
                 "summary": f"{target_author.display_name} rejected your follow request",
@@ -299,12 +302,15 @@ def request_follower(request: HttpRequest, author_id: str, target_author_id: str
                 "object": AuthorSerializer(author).data,
                 "accepted": False,
             }
-            requests.post(
-                url=route,
-                headers={'Content-Type': 'application/json'},
-                data=json.dumps(post_json),
-                auth=auth,
-            )
+            try:
+                node_post(
+                    url=route,
+                    headers={'Content-Type': 'application/json'},
+                    data=json.dumps(post_json)
+                )
+            except requests.RequestException as e:
+                print(f"Failed to send FollowResponse to \"{route}\": {e}")
+                return Response({"error": True, "message": "Follow request deleted, but the remote node could not be reached"}, status=502)
 
         return Response({
             "message": "Successfully deleted follow request"
@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import Author, InboxMessage
+from .models import Author, InboxMessage, InboundActivity
 
 # Register your models here.
 admin.site.register(Author)
-admin.site.register(InboxMessage)
\ No newline at end of file
+admin.site.register(InboxMessage)
+admin.site.register(InboundActivity)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.apps import AppConfig
-from deadlybird.settings import TESTING
+from deadlybird.settings import RUN_SCHEDULER, REMOTE_AUTHOR_SYNC_POLL_SECONDS, INBOX_INGESTION_POLL_SECONDS
 from apscheduler.schedulers.background import BackgroundScheduler
 
 class IdentityConfig(AppConfig):
@@ -7,8 +7,13 @@ class IdentityConfig(AppConfig):
     name = 'identity'
 
     def ready(self):
-        if not TESTING:
-            from .jobs import github_task
+        import identity.signals
+
+        if RUN_SCHEDULER:
+            from .jobs import github_task, sync_remote_authors_task
+            from .ingestion import drain_inbound_activities
             scheduler = BackgroundScheduler()
             scheduler.add_job(github_task, 'interval', minutes=1)
+            scheduler.add_job(sync_remote_authors_task, 'interval', seconds=REMOTE_AUTHOR_SYNC_POLL_SECONDS, max_instances=1, coalesce=True)
+            scheduler.add_job(drain_inbound_activities, 'interval', seconds=INBOX_INGESTION_POLL_SECONDS, max_instances=1, coalesce=True)
             scheduler.start()
\ No newline at end of file
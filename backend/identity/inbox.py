@@ -1,6 +1,7 @@
 # Utility file to factor out the large inbox view in views.py
-import requests
 import json
+import requests
+from django.db import transaction
 from django.http import HttpRequest
 from django.contrib.auth.models import User
 from rest_framework.response import Response
@@ -10,12 +11,120 @@ from identity.util import check_authors_exist
 from identity.serializers import InboxAuthorSerializer
 from deadlybird.settings import SITE_HOST_URL
 from deadlybird.util import resolve_remote_route, get_host_from_api_url, generate_next_id, remove_trailing_slash
-from nodes.util import get_auth_from_host, get_or_create_remote_author_from_api_payload
+from nodes.resolver import resolve_remote_author, store_remote_author
+from nodes.client import get_node_auth, node_post
+from nodes.proxy import invalidate_proxied
 from posts.models import Post, Comment, FollowingFeedPost
 from likes.models import Like
 from posts.serializers import InboxPostSerializer, InboxCommentSerializer
+from posts.replica import track_remote_post
 from deadlybird.util import resolve_remote_route, get_host_with_slash, compare_domains
-from nodes.util import get_or_create_remote_author_from_api_payload
+
+INBOX_ACTIVITY_TYPES = ("Like", "post", "Follow", "Unfollow", "FollowResponse", "comment")
+# Activities handled once per recipient. Every other type names its target inside the activity itself.
+RECIPIENT_SCOPED_ACTIVITY_TYPES = ("post",)
+
+class InboxActivityRequest:
+  """
+  Stands in for the request of an activity which did not arrive on its own (queued or taken out of
+  a shared inbox body), the inbox handlers only read its data.
+  """
+  def __init__(self, data: dict):
+    self.data = data
+
+def handle_inbox_activity(request: HttpRequest, author_id: str):
+  """
+  Process an activity POSTed to the inbox of an author, dispatching on its type.
+  """
+  # Check request data
+  content_type = request.data.get("type")
+  print(f"INBOX REQUEST RECEIVED WITH TYPE {content_type}")
+  print(request.data)
+
+  if content_type == None:
+    return Response({
+      "error": True,
+      "message": "Missing necessary request body parameters"
+    }, status=400)
+  
+  if content_type == "Like":
+    # Ensure like data is valid data
+    return handle_like_inbox(request)
+  elif content_type == "post":
+    return handle_post_inbox(request, target_author_id=author_id)
+
+  elif content_type == "Follow": 
+    return handle_follow_inbox(request)
+
+  elif content_type == "Unfollow":
+    return handle_unfollow_inbox(request)
+
+  elif content_type == "FollowResponse":
+    return handle_follow_response_inbox(request)
+
+  elif content_type == "comment":
+    return handle_comment_inbox(request)
+  
+  else:
+    return Response({ "error": True, "message": "Unknown inbox type" }, status=400)
+
+def get_shared_inbox_deliveries(data) -> list[tuple[dict, list[str]]]|None:
+  """
+  Parse the body POSTed to the shared inbox, either a single envelope
+  { "type": "inbox", "activity": {...}, "recipients": [...] } or a list of them.
+  Recipients are author ids or author urls. Activities which do not depend on the recipient
+  are only kept for their first recipient, so they are not processed several times.
+  Returns (activity, recipient ids) pairs, or None if the body is malformed.
+  """
+  envelopes = data if isinstance(data, list) else [data]
+  deliveries = []
+  for envelope in envelopes:
+    if not isinstance(envelope, dict):
+      return None
+    activity = envelope.get("activity")
+    recipients = envelope.get("recipients")
+    if not isinstance(activity, dict) or not isinstance(recipients, list) or len(recipients) == 0:
+      return None
+    if not all(isinstance(recipient, str) and len(recipient) > 0 for recipient in recipients):
+      return None
+
+    recipient_ids = list(dict.fromkeys(remove_trailing_slash(recipient).split("/")[-1] for recipient in recipients))
+    if activity.get("type") not in RECIPIENT_SCOPED_ACTIVITY_TYPES:
+      recipient_ids = recipient_ids[:1]
+    deliveries.append((activity, recipient_ids))
+
+  return deliveries
+
+def handle_shared_inbox(deliveries: list[tuple[dict, list[str]]]) -> Response:
+  """
+  Process every (activity, recipient) delivery of a shared inbox body in one transaction.
+  Rejected deliveries are rolled back on their own and reported. A delivery failing on our side
+  rolls the whole batch back, so the sender can retry it as a whole.
+  """
+  results = []
+  failed = False
+  with transaction.atomic():
+    for activity, recipient_ids in deliveries:
+      for recipient_id in recipient_ids:
+        try:
+          with transaction.atomic():
+            response = handle_inbox_activity(InboxActivityRequest(activity), recipient_id)
+            if response.status_code >= 400:
+              transaction.set_rollback(True)
+          status = response.status_code
+        except Exception as e:
+          print(f"Failed to process shared inbox {activity.get('type')} activity for {recipient_id}: {type(e).__name__}: {e}")
+          status = 500
+
+        results.append({ "recipient": recipient_id, "type": activity.get("type"), "status": status })
+        failed = failed or status >= 500
+
+    if failed:
+      transaction.set_rollback(True)
+
+  if failed:
+    return Response({ "error": True, "message": "Failed to process the deliveries, nothing was stored", "items": results }, status=500)
+  return Response({ "error": False, "message": "Processed", "items": results }, status=200)
 
 def handle_follow_inbox(request: HttpRequest):
     """
@@ -42,7 +151,7 @@ def handle_follow_inbox(request: HttpRequest):
 
     print(f"Checking from author exists")
     if not check_authors_exist(from_author.validated_data["id"]):
-      remote_author = get_or_create_remote_author_from_api_payload(from_author.data) 
+      remote_author = store_remote_author(from_author.data) 
       if not remote_author:
         return Response({
           "error": True, "message": "Failed to create remote author"
@@ -76,16 +185,20 @@ def handle_follow_inbox(request: HttpRequest):
         url = resolve_remote_route(receiving_host, "inbox", {
            "author_id": to_author.id
         })
-        auth = get_auth_from_host(receiving_host)
+        auth = get_node_auth(receiving_host)
         
         if auth is not None and url is not None: 
           print("auth: ", auth, "url: ", url, "data:", json.dumps(request.data))
-          res = requests.post(
-            url=url,
-            headers={'Content-Type': 'application/json'}, 
-            data=json.dumps(request.data), 
-            auth=auth
-          )
+          try:
+            res = node_post(
+              url=url,
+              headers={'Content-Type': 'application/json'}, 
+              data=json.dumps(request.data), 
+              auth=auth
+            )
+          except requests.RequestException as e:
+            print(f"Failed to send remote follow request to \"{url}\": {e}")
+            return Response({ "error": True, "message": "Remote node could not be reached" }, status=502)
 
           print(f"request status = {res.status_code} with text {res.text}")
           if res.ok:
@@ -111,7 +224,8 @@ def handle_follow_inbox(request: HttpRequest):
         InboxMessage.objects.create(
             author_id=to_author.id,
             content_id=follow_req.id,
-            content_type=InboxMessage.ContentType.FOLLOW
+            content_type=InboxMessage.ContentType.FOLLOW,
+            follow_request=follow_req
         ) 
       return Response({
         "error": False,
@@ -179,6 +293,11 @@ def handle_follow_response_inbox(request: HttpRequest):
 
   return Response("Successfuly created follow", status=201) 
       
+def _invalidate_proxied_liked(author: Author):
+  # Likes of remote authors are read through the proxy cache (see likes.views.liked)
+  if not compare_domains(author.host, SITE_HOST_URL):
+    invalidate_proxied(resolve_remote_route(author.host, "liked", { "author_id": author.id }))
+
 def _like_post(request: HttpRequest, post_id, source_author):
   # someone liked a post
   try:
@@ -206,24 +325,31 @@ def _like_post(request: HttpRequest, post_id, source_author):
     print("pushing remote like payload")
     print(payload)
 
-    auth = get_auth_from_host(get_host_from_api_url(post.source))
-    response = requests.post(
-      url=url,
-      headers={'Content-Type': 'application/json'}, 
-      data=json.dumps(payload), 
-      auth=auth
-    )
+    try:
+      response = node_post(
+        url=url,
+        headers={'Content-Type': 'application/json'}, 
+        data=json.dumps(payload)
+      )
+    except requests.RequestException as e:
+      print(f"An error occurred while propagating a remote post like to \"{url}\": {e}")
+      return Response({ "error": True, "message": "Remote node could not be reached" }, status=502)
 
     if not response.ok:
       print(f"An error occurred while propagating a remote post like to \"{url}\" (status={response.status_code})")
     else:
-      # Create a local copy of it so that our /liked route works fin
+      invalidate_proxied(resolve_remote_route(get_host_from_api_url(post.source), "post_likes", {
+          "author_id": source_author_id,
+          "post_id": source_post_id
+      }))
+      _invalidate_proxied_liked(source_author)
 
-      Like.objects.create(
+      # Create a local copy of it so that our /liked route works fin
+      Like.objects.get_or_create(
         send_author=source_author,
-        receive_author=post.author,
         content_id=post.id,
-        content_type=Like.ContentType.POST
+        content_type=Like.ContentType.POST,
+        defaults={ "receive_author": post.author, "post": post }
       )
 
     return Response(response.json(), status=response.status_code)
@@ -244,7 +370,8 @@ def _like_post(request: HttpRequest, post_id, source_author):
     send_author=source_author,
     receive_author=post.author,
     content_id=post.id,
-    content_type=Like.ContentType.POST
+    content_type=Like.ContentType.POST,
+    post=post
   )
   
   return Response({
@@ -276,23 +403,34 @@ def _like_comment(request: HttpRequest, post_id, comment_id, source_author):
         "author_id": origin_author_id
     })
 
-    auth = get_auth_from_host(get_host_from_api_url(post.origin))
-    response = requests.post(
-      url=url,
-      headers={'Content-Type': 'application/json'}, 
-      data=json.dumps(payload), 
-      auth=auth
-    )
+    try:
+      response = node_post(
+        url=url,
+        headers={'Content-Type': 'application/json'}, 
+        data=json.dumps(payload)
+      )
+    except requests.RequestException as e:
+      print(f"An error occurred while propagating a remote comment like to \"{url}\": {e}")
+      return Response({ "error": True, "message": "Remote node could not be reached" }, status=502)
 
     if not response.ok:
       print(f"An error occurred while propagating a remote comment like to \"{url}\" (status={response.status_code})")
     else:
+      # Same url as read by likes.views.comment_likes
+      invalidate_proxied(resolve_remote_route(get_host_from_api_url(post.source), "comment_likes", {
+          "author_id": origin_author_id,
+          "post_id": origin_post_id,
+          "comment_id": comment_id
+      }))
+      _invalidate_proxied_liked(source_author)
+
       # Create a local copy of it so that our /liked route works fine
-      Like.objects.create(
+      Like.objects.get_or_create(
         send_author=source_author,
-        receive_author=post.author,
         content_id=comment_id,
-        content_type=Like.ContentType.COMMENT
+        content_type=Like.ContentType.COMMENT,
+        # The comment only exists here if it was mirrored from the remote node
+        defaults={ "receive_author": post.author, "comment": Comment.objects.filter(id=comment_id).first() }
       )
 
     return Response(response.json(), status=response.status_code)
@@ -320,7 +458,8 @@ def _like_comment(request: HttpRequest, post_id, comment_id, source_author):
       send_author=source_author,
       receive_author=comment.author,
       content_id=comment.id,
-      content_type=Like.ContentType.COMMENT
+      content_type=Like.ContentType.COMMENT,
+      comment=comment
   )
   
   return Response({
@@ -346,7 +485,7 @@ def handle_like_inbox(request: HttpRequest):
   
   # Ensure the author sending the like exists
   # In the case the author does not exist within our system, it's a remote author who's liking it.
-  author_who_created_like = get_or_create_remote_author_from_api_payload(author_payload)
+  author_who_created_like = store_remote_author(author_payload)
   print("author who created like is")
   print(author_who_created_like)
   print(author_payload)
@@ -380,59 +519,18 @@ def handle_post_inbox(request: HttpRequest, target_author_id: str):
 
   origin_author_id = origin_url.split("/")[-3]
 
-  try:
-    origin_author = Author.objects.get(id=origin_author_id)
-  except Author.DoesNotExist:
-    # Origin author does not exist in our systems. Register them
-    origin_host = get_host_from_api_url(origin_url)
-    url = resolve_remote_route(origin_host, "author", {
-      "author_id": origin_author_id
-    })
-    auth = get_auth_from_host(origin_host)    
-    res = requests.get(
-      url=url,
-      auth=auth
-    )
-    
-    if not res.ok:
-      print(f"Failed to get origin author from \"{url}\" using credentials.")
-      return Response({ "error": True, "message": "Failed to GET origin author" }, status=500)
-
-    origin_author_serializer = InboxAuthorSerializer(data=res.json())
-    if not origin_author_serializer.is_valid():
-      print(f"Failed to parse origin author JSON from \"{url}\"")
-      return Response({ "error": True, "message": "Invalid origin author JSON format" }, status=500)
-    
-    origin_author = get_or_create_remote_author_from_api_payload(origin_author_serializer.data)
+  # Origin author may not exist in our systems yet, register them
+  origin_author = resolve_remote_author(origin_author_id, get_host_from_api_url(origin_url))
+  if origin_author is None:
+    return Response({ "error": True, "message": "Failed to GET origin author" }, status=500)
 
   # Ensure source author also exists in our system
   source_url = serializer.data["source"]
   source_author_id = source_url.split("/")[-3]
 
-  try:
-    source_author = Author.objects.get(id=source_author_id)
-  except Author.DoesNotExist:
-    # Source auth does not exist in our system, register them
-    source_host = get_host_from_api_url(source_url)
-    url = resolve_remote_route(source_host, "author", {
-      "author_id": source_author_id
-    })
-    auth = get_auth_from_host(source_host)    
-    res = requests.get(
-      url=url,
-      auth=auth
-    )
-
-    if not res.ok:
-      print(f"Failed to get source author from \"{url}\" using credentials.")
-      return Response({ "error": True, "message": "Failed to GET source author" }, status=500)
-    
-    source_author_serializer = InboxAuthorSerializer(data=res.json())
-    if not source_author_serializer.is_valid():
-      print(f"Failed to parse source author JSON from \"{url}\"")
-      return Response({ "error": True, "message": "Invalid source author JSON format" }, status=500)
-
-    source_author = get_or_create_remote_author_from_api_payload(source_author_serializer.data)
+  source_author = resolve_remote_author(source_author_id, get_host_from_api_url(source_url))
+  if source_author is None:
+    return Response({ "error": True, "message": "Failed to GET source author" }, status=500)
 
   try:
     target_author = Author.objects.get(id=target_author_id)
@@ -498,18 +596,25 @@ def handle_post_inbox(request: HttpRequest, target_author_id: str):
         visibility=serializer.data["visibility"]
       )
 
+  # Mirror its comments and likes, or refresh them if the post was sent again
+  track_remote_post(post_in_question)
+
   # Add post to feed
   FollowingFeedPost.objects.create(
     post=post_in_question,
     follower=target_author,
-    from_author=source_author
+    from_author=source_author,
+    published_date=post_in_question.published_date,
+    visibility=post_in_question.visibility,
+    origin_author=post_in_question.origin_author
   )
 
   # Create inbox message
   InboxMessage.objects.create(
     author=target_author,
     content_id=post_in_question.id,
-    content_type=InboxMessage.ContentType.POST
+    content_type=InboxMessage.ContentType.POST,
+    post=post_in_question
   )
 
   return Response({
@@ -548,7 +653,7 @@ def handle_comment_inbox(request: HttpRequest):
   
   print("domain matches")
 
-  author = get_or_create_remote_author_from_api_payload(serializer.data["author"])
+  author = store_remote_author(serializer.data["author"])
   comment = Comment.objects.create(
     id=comment_id,
     post=post,
@@ -562,7 +667,8 @@ def handle_comment_inbox(request: HttpRequest):
   InboxMessage.objects.create(
     author=local_author,
     content_id=comment.id,
-    content_type=InboxMessage.ContentType.COMMENT
+    content_type=InboxMessage.ContentType.COMMENT,
+    comment=comment
   )
 
   return Response({
@@ -0,0 +1,189 @@
+# Durable queue of remote inbox activities, processed outside of the request cycle
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+from deadlybird.util import generate_next_id
+from nodes.delivery import get_backoff_delay
+from .models import Author, InboundActivity
+
+# Seconds before a claimed activity is considered abandoned (e.g. worker crashed)
+CLAIM_LEASE_SECONDS = 300
+# Upper bound of batches processed by a single drain so one tick cannot run forever
+MAX_BATCHES_PER_DRAIN = 10
+
+def get_dedup_key(data: dict, author_id: str) -> str|None:
+  """
+  Activities redelivered by a peer map to the same key.
+  Activities without an id (e.g. Follow, Unfollow) have no key, identical ones may be sent again on purpose.
+  """
+  activity_id = data.get("id")
+  if not isinstance(activity_id, str) or len(activity_id) == 0:
+    return None
+  return hashlib.sha256(f"{author_id}\n{data.get('type')}\n{activity_id}".encode("utf-8")).hexdigest()
+
+def _validate_activity(data, author_id: str) -> str|None:
+  """
+  Error message if the activity cannot be queued for the author.
+  """
+  from .inbox import INBOX_ACTIVITY_TYPES
+
+  if not isinstance(data, dict) or data.get("type") not in INBOX_ACTIVITY_TYPES:
+    return "Unknown inbox type"
+  if not Author.objects.filter(id=author_id).exists():
+    return "Unknown author inbox"
+  return None
+
+def _queue_activity(data: dict, author_id: str) -> InboundActivity:
+  fields = {
+    "author_id": author_id,
+    "activity_type": data["type"],
+    "payload": json.dumps(data)
+  }
+  dedup_key = get_dedup_key(data, author_id)
+  if dedup_key is None:
+    return InboundActivity.objects.create(**fields)
+
+  activity, created = InboundActivity.objects.get_or_create(dedup_key=dedup_key, defaults=fields)
+  if not created:
+    print(f"[INGESTION] Dropping duplicate {activity.activity_type} activity to {author_id} ({activity.id})")
+  return activity
+
+def enqueue_inbound_activity(data, author_id: str) -> Response:
+  """
+  Validate and durably queue an activity POSTed to an inbox, answering 202 Accepted right away.
+  """
+  error = _validate_activity(data, author_id)
+  if error is not None:
+    return Response({ "error": True, "message": error }, status=400)
+
+  _queue_activity(data, author_id)
+  return Response({ "error": False, "message": "Accepted" }, status=202)
+
+def enqueue_shared_inbox_deliveries(deliveries: list[tuple[dict, list[str]]]) -> Response:
+  """
+  Queue every (activity, recipient) delivery of a shared inbox body in one transaction.
+  Invalid deliveries are reported, the others are answered with 202 Accepted.
+  """
+  results = []
+  with transaction.atomic():
+    for data, recipient_ids in deliveries:
+      for recipient_id in recipient_ids:
+        error = _validate_activity(data, recipient_id)
+        if error is None:
+          _queue_activity(data, recipient_id)
+        results.append({ "recipient": recipient_id, "type": data.get("type"), "status": 202 if error is None else 400 })
+
+  return Response({ "error": False, "message": "Accepted", "items": results }, status=202)
+
+def _claim_due_activities(limit: int) -> list[InboundActivity]:
+  """
+  Mark up to `limit` due activities as in flight and return them, oldest first.
+  The claim token keeps concurrent drainers (one per web worker) from processing the same row twice.
+  """
+  now = timezone.now()
+
+  abandoned = InboundActivity.objects \
+    .filter(status=InboundActivity.Status.IN_FLIGHT, claimed_at__lt=now - timedelta(seconds=CLAIM_LEASE_SECONDS))
+  if abandoned.exists():
+    abandoned.update(status=InboundActivity.Status.PENDING, claim_token=None, claimed_at=None)
+
+  due_ids = list(InboundActivity.objects \
+    .filter(status=InboundActivity.Status.PENDING, next_attempt_at__lte=now) \
+    .order_by("next_attempt_at", "created_at") \
+    .values_list("id", flat=True)[:limit])
+  if len(due_ids) == 0:
+    return []
+
+  claim_token = generate_next_id()
+  InboundActivity.objects \
+    .filter(id__in=due_ids, status=InboundActivity.Status.PENDING) \
+    .update(status=InboundActivity.Status.IN_FLIGHT, claim_token=claim_token, claimed_at=now)
+
+  return list(InboundActivity.objects.filter(claim_token=claim_token, status=InboundActivity.Status.IN_FLIGHT).order_by("created_at"))
+
+def _process_activity(activity: InboundActivity) -> tuple[bool, bool, str]:
+  """
+  Run a queued activity through the inbox handlers.
+  Returns (processed, retryable, error message).
+  """
+  from .inbox import InboxActivityRequest, handle_inbox_activity
+
+  try:
+    with transaction.atomic():
+      response = handle_inbox_activity(InboxActivityRequest(json.loads(activity.payload)), activity.author_id)
+  except Exception as e:
+    return (False, True, f"{type(e).__name__}: {e}")
+
+  if response.status_code < 400:
+    return (True, False, "")
+
+  # Invalid activities will not become valid by retrying, failures of remote nodes might
+  retryable = response.status_code >= 500 or response.status_code in (408, 429)
+  return (False, retryable, f"HTTP {response.status_code}: {json.dumps(response.data)[:1000]}")
+
+def _process_on_worker(activity: InboundActivity) -> tuple[bool, bool, str]:
+  try:
+    return _process_activity(activity)
+  finally:
+    # Worker threads open their own connections
+    close_old_connections()
+
+def _record_result(activity: InboundActivity, processed: bool, retryable: bool, error: str):
+  activity.claim_token = None
+  activity.claimed_at = None
+  if processed:
+    activity.status = InboundActivity.Status.DONE
+    activity.processed_at = timezone.now()
+    activity.last_error = ""
+    activity.save()
+    return
+
+  activity.attempts += 1
+  activity.last_error = error
+  if retryable and activity.attempts < settings.INBOX_INGESTION_MAX_ATTEMPTS:
+    activity.status = InboundActivity.Status.PENDING
+    activity.next_attempt_at = timezone.now() + get_backoff_delay(activity.attempts)
+  else:
+    activity.status = InboundActivity.Status.FAILED
+  activity.save()
+
+  print(f"[INGESTION] Failed to process {activity.activity_type} activity {activity.id} (attempt {activity.attempts}, status={activity.status}): {error}")
+
+def process_inbound_batch(limit: int = None) -> int:
+  """
+  Claim and process one batch of due activities. Runs on the calling thread when a single
+  worker is configured, otherwise on a pool of INBOX_INGESTION_WORKERS threads.
+  Returns the number of activities attempted.
+  """
+  activities = _claim_due_activities(limit or settings.INBOX_INGESTION_BATCH_SIZE)
+  if len(activities) == 0:
+    return 0
+
+  if settings.INBOX_INGESTION_WORKERS <= 1:
+    results = [(activity, _process_activity(activity)) for activity in activities]
+  else:
+    with ThreadPoolExecutor(max_workers=settings.INBOX_INGESTION_WORKERS) as executor:
+      futures = [(activity, executor.submit(_process_on_worker, activity)) for activity in activities]
+      results = [(activity, future.result()) for activity, future in futures]
+
+  for activity, (processed, retryable, error) in results:
+    _record_result(activity, processed, retryable, error)
+
+  return len(activities)
+
+def drain_inbound_activities():
+  """
+  Scheduled job which processes every due activity and forgets processed ones past the dedup window.
+  """
+  InboundActivity.objects \
+    .filter(status=InboundActivity.Status.DONE, processed_at__lt=timezone.now() - timedelta(seconds=settings.INBOX_INGESTION_RETENTION_SECONDS)) \
+    .delete()
+
+  for _ in range(MAX_BATCHES_PER_DRAIN):
+    if process_inbound_batch() < settings.INBOX_INGESTION_BATCH_SIZE:
+      break
@@ -1,12 +1,19 @@
 from posts.models import Post
 from .models import Author
+from django.conf import settings
 from django.utils import timezone
-from deadlybird.util import generate_full_api_url, generate_next_id
+from datetime import timedelta
+from deadlybird.util import generate_full_api_url, generate_next_id, resolve_remote_route
 from deadlybird.settings import GITHUB_API_TOKEN, SITE_HOST_URL
+from nodes.client import node_get
+from nodes.models import Node
+from nodes.util import upsert_remote_authors_from_api_payloads
 from posts.util import send_post_to_inboxes
 import requests
 
 AUTHORS_PER_CRON_CHECK = 10
+# Upper bound of the delay before retrying a node whose author directory could not be fetched
+AUTHOR_SYNC_MAX_BACKOFF_SECONDS = 60 * 60
 
 def github_task():
   print("[GITHUB CRON] Starting Task")
@@ -85,4 +92,83 @@ def github_task():
     author.last_github_check = timezone.now()
     author.last_github_id = latest_github_id
     author.save()
-  print("[GITHUB CRON] Ending Task")
\ No newline at end of file
+  print("[GITHUB CRON] Ending Task")
+
+def sync_remote_authors_task():
+  """
+  Mirror the author directories of remote nodes into the local author table, a few pages per node
+  at a time. Each node remembers the page to continue from, so large directories are synced over
+  several runs and one slow or dead node never holds up the others for long.
+  """
+  nodes = Node.objects.filter(author_sync_next_at__lte=timezone.now())
+  for node in nodes:
+    sync_node_authors(node)
+
+def sync_node_authors(node: Node, max_pages: int = None) -> int:
+  """
+  Fetch up to max_pages pages of a node's author directory starting from its saved page.
+  Returns the amount of authors mirrored.
+  """
+  max_pages = max_pages or settings.REMOTE_AUTHOR_SYNC_PAGES_PER_RUN
+  page = node.author_sync_page
+  synced = 0
+  completed = False
+
+  for _ in range(max_pages):
+    try:
+      response = node_get(
+        url=resolve_remote_route(node.host, "authors"),
+        params={ "page": page, "size": settings.REMOTE_AUTHOR_SYNC_PAGE_SIZE }
+      )
+    except requests.RequestException as e:
+      _record_author_sync_failure(node, str(e))
+      return synced
+
+    if response.status_code == 404 and page > 1:
+      # Paginators reject pages past the end
+      completed = True
+      break
+    if not response.ok:
+      _record_author_sync_failure(node, f"HTTP {response.status_code}")
+      return synced
+
+    try:
+      body = response.json()
+      members = body["items"]
+    except (KeyError, TypeError, ValueError):
+      _record_author_sync_failure(node, "Response is not in the API standardized pagination format")
+      return synced
+
+    synced += sum(1 for author in upsert_remote_authors_from_api_payloads(members) if author is not None)
+
+    if len(members) == 0 or ("next" in body and not body["next"]):
+      completed = True
+      break
+    page += 1
+
+  now = timezone.now()
+  state = {
+    "author_sync_page": 1 if completed else page,
+    "author_synced_at": now,
+    "author_sync_failures": 0,
+    "author_sync_error": "",
+    # Continue right away with the rest of an unfinished directory
+    "author_sync_next_at": now + timedelta(seconds=settings.REMOTE_AUTHOR_SYNC_INTERVAL_SECONDS) if completed else now
+  }
+  if completed:
+    state["author_sync_completed_at"] = now
+  # Update through the queryset so that the Node post_save handlers do not run again
+  Node.objects.filter(id=node.id).update(**state)
+
+  print(f"[AUTHOR SYNC] Synced {synced} authors from {node.host} (completed={completed})")
+  return synced
+
+def _record_author_sync_failure(node: Node, error: str):
+  failures = node.author_sync_failures + 1
+  backoff = min(settings.REMOTE_AUTHOR_SYNC_POLL_SECONDS * (2 ** failures), AUTHOR_SYNC_MAX_BACKOFF_SECONDS)
+  Node.objects.filter(id=node.id).update(
+    author_sync_failures=failures,
+    author_sync_error=error,
+    author_sync_next_at=timezone.now() + timedelta(seconds=backoff)
+  )
+  print(f"[AUTHOR SYNC] Failed to sync authors from {node.host} (failures={failures}): {error}")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from identity.models import Author
+from identity.util import rebuild_author_counters
+
+class Command(BaseCommand):
+  help = "Recompute the denormalized post/follower/following/subscription counters of authors."
+
+  def add_arguments(self, parser):
+    parser.add_argument("--author", action="append", dest="authors", help="Only rebuild the counters of this author id (repeatable)")
+
+  def handle(self, *args, **options):
+    authors = Author.objects.all()
+    if options["authors"]:
+      authors = authors.filter(id__in=options["authors"])
+
+    updated = rebuild_author_counters(authors)
+    self.stdout.write(f"Rebuilt counters for {updated} authors")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from identity.jobs import sync_remote_authors_task
+from nodes.directory import fetch_author_directories
+from nodes.models import Node
+
+class Command(BaseCommand):
+  help = "Mirror the author directories of remote nodes. Runs one incremental sync pass unless --full is given."
+
+  def add_arguments(self, parser):
+    parser.add_argument("--full", action="store_true", help="Pull every page of every directory concurrently")
+    parser.add_argument("--node", action="append", dest="hosts", help="Only sync the node with this host (repeatable, --full only)")
+
+  def handle(self, *args, **options):
+    if not options["full"]:
+      sync_remote_authors_task()
+      return
+
+    nodes = Node.objects.all()
+    if options["hosts"]:
+      nodes = nodes.filter(host__in=options["hosts"])
+
+    for state in fetch_author_directories(list(nodes)):
+      status = "ok" if state.error is None else f"failed ({state.error})"
+      self.stdout.write(f"{state.node.host}: {state.authors} authors, {state.pages} pages, {state.elapsed_seconds():.2f}s, {status}")
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('identity', '0019_blockedauthor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='follower_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='following_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='post_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='subscription_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
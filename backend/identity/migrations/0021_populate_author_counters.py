@@ -0,0 +1,40 @@
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field):
+    counts = queryset.filter(**{ field: OuterRef("pk") }) \
+        .order_by() \
+        .values(field) \
+        .annotate(count=Count("pk")) \
+        .values("count")
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def populate_author_counters(apps, schema_editor):
+    Author = apps.get_model("identity", "Author")
+    Post = apps.get_model("posts", "Post")
+    Following = apps.get_model("following", "Following")
+    Subscription = apps.get_model("blue", "Subscription")
+
+    Author.objects.update(
+        post_count=count_subquery(Post.objects.all(), "author"),
+        follower_count=count_subquery(Following.objects.all(), "target_author"),
+        following_count=count_subquery(Following.objects.all(), "author"),
+        subscription_count=count_subquery(Subscription.objects.all(), "author")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('identity', '0020_author_counters'),
+        ('posts', '0012_post_origin_author'),
+        ('following', '0003_alter_following_id_alter_followingrequest_id'),
+        ('blue', '0002_ad'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_author_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('identity', '0021_populate_author_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inboxmessage',
+            index=models.Index(fields=['author', 'id'], name='inbox_author_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inboxmessage',
+            index=models.Index(fields=['content_type', 'content_id'], name='inbox_content_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_inbox_message_content(apps, schema_editor):
+    InboxMessage = apps.get_model("identity", "InboxMessage")
+    targets = {
+        "post": ("post", apps.get_model("posts", "Post")),
+        "comment": ("comment", apps.get_model("posts", "Comment")),
+        "Like": ("like", apps.get_model("likes", "Like")),
+        "follow": ("follow_request", apps.get_model("following", "FollowingRequest")),
+    }
+
+    for content_type, (field, model) in targets.items():
+        messages = InboxMessage.objects.filter(content_type=content_type)
+        messages.update(**{ field: Subquery(model.objects.filter(id=OuterRef("content_id")).values("id")[:1]) })
+        # Content is always stored locally, so a message without it refers to something already deleted
+        messages.filter(**{ f"{field}__isnull": True }).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('following', '0004_following_following_unique_author_target'),
+        ('identity', '0022_inboxmessage_inbox_author_id_idx_and_more'),
+        ('likes', '0009_like_typed_content'),
+        ('posts', '0015_feed_denormalization'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='inboxmessage',
+            name='inbox_content_idx',
+        ),
+        migrations.AddField(
+            model_name='inboxmessage',
+            name='comment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inbox_messages', to='posts.comment'),
+        ),
+        migrations.AddField(
+            model_name='inboxmessage',
+            name='follow_request',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inbox_messages', to='following.followingrequest'),
+        ),
+        migrations.AddField(
+            model_name='inboxmessage',
+            name='like',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inbox_messages', to='likes.like'),
+        ),
+        migrations.AddField(
+            model_name='inboxmessage',
+            name='post',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inbox_messages', to='posts.post'),
+        ),
+        migrations.RunPython(populate_inbox_message_content, migrations.RunPython.noop),
+    ]
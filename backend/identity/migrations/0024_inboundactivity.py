@@ -0,0 +1,37 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:22
+
+import deadlybird.util
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('identity', '0023_inboxmessage_typed_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboundActivity',
+            fields=[
+                ('id', models.CharField(default=deadlybird.util.generate_next_id, max_length=255, primary_key=True, serialize=False)),
+                ('activity_type', models.CharField(max_length=50)),
+                ('dedup_key', models.CharField(max_length=64, unique=True)),
+                ('payload', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_flight', 'In Flight'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claim_token', models.CharField(blank=True, max_length=255, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='identity.author')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='inbound_status_next_idx')],
+            },
+        ),
+    ]
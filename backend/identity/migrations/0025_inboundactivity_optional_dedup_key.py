@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('identity', '0024_inboundactivity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inboundactivity',
+            name='dedup_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
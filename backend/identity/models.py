@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
 from deadlybird.util import generate_next_id
 
 # Create your models here.
@@ -14,6 +15,11 @@ class Author(models.Model):
   bio = models.CharField(max_length=255, blank=True, null=False, default="")
   profile_url = models.CharField(max_length=255, blank=False, null=False)
   profile_picture = models.TextField(blank=True, null=True)
+  # Denormalized counters kept up to date by post/following/subscription signals
+  post_count = models.IntegerField(blank=False, null=False, default=0)
+  follower_count = models.IntegerField(blank=False, null=False, default=0)
+  following_count = models.IntegerField(blank=False, null=False, default=0)
+  subscription_count = models.IntegerField(blank=False, null=False, default=0)
 
   def __str__(self):
     return f"Author (displayName: {self.display_name}) [username: {self.user.username}]"
@@ -36,4 +42,49 @@ class InboxMessage(models.Model):
   id = models.CharField(primary_key=True, max_length=255, default=generate_next_id)
   author = models.ForeignKey(Author, on_delete=models.CASCADE, blank=False, null=False)
   content_id = models.CharField(max_length=255, blank=False, null=False)
-  content_type = models.CharField(choices=ContentType.choices, max_length=50, blank=False, null=False)
\ No newline at end of file
+  content_type = models.CharField(choices=ContentType.choices, max_length=50, blank=False, null=False)
+  # Typed reference to the content, set to the one matching content_type. Messages are deleted with their content.
+  post = models.ForeignKey("posts.Post", on_delete=models.CASCADE, blank=True, null=True, related_name="inbox_messages")
+  comment = models.ForeignKey("posts.Comment", on_delete=models.CASCADE, blank=True, null=True, related_name="inbox_messages")
+  like = models.ForeignKey("likes.Like", on_delete=models.CASCADE, blank=True, null=True, related_name="inbox_messages")
+  follow_request = models.ForeignKey("following.FollowingRequest", on_delete=models.CASCADE, blank=True, null=True, related_name="inbox_messages")
+
+  class Meta:
+    indexes = [
+      # Inbox listing: an author's messages by id
+      models.Index(fields=["author", "id"], name="inbox_author_id_idx")
+    ]
+
+class InboundActivity(models.Model):
+  """
+  A remote inbox POST accepted with 202 Accepted and waiting to be processed by identity.ingestion.
+  Processed rows are kept for a while so that redelivered activities are dropped as duplicates.
+  """
+  class Status(models.TextChoices):
+    PENDING = "pending"
+    IN_FLIGHT = "in_flight"
+    DONE = "done"
+    FAILED = "failed"
+
+  id = models.CharField(primary_key=True, max_length=255, default=generate_next_id)
+  author = models.ForeignKey(Author, on_delete=models.CASCADE, blank=False, null=False)
+  activity_type = models.CharField(max_length=50, blank=False, null=False)
+  # Hash of the target inbox and the activity id, activities without an id are never deduplicated
+  dedup_key = models.CharField(max_length=64, unique=True, blank=True, null=True)
+  payload = models.TextField(blank=False, null=False)
+  status = models.CharField(choices=Status.choices, max_length=16, default=Status.PENDING, blank=False, null=False)
+  attempts = models.PositiveIntegerField(default=0)
+  next_attempt_at = models.DateTimeField(default=timezone.now, blank=False, null=False)
+  claim_token = models.CharField(max_length=255, blank=True, null=True)
+  claimed_at = models.DateTimeField(blank=True, null=True)
+  last_error = models.TextField(blank=True, null=False, default="")
+  created_at = models.DateTimeField(auto_now_add=True, blank=False, null=False)
+  processed_at = models.DateTimeField(blank=True, null=True)
+
+  class Meta:
+    indexes = [
+      models.Index(fields=["status", "next_attempt_at"], name="inbound_status_next_idx")
+    ]
+
+  def __str__(self):
+    return f"InboundActivity {self.id} ({self.activity_type} to {self.author_id}) [{self.status}] [attempts: {self.attempts}]"
@@ -3,11 +3,13 @@ from rest_framework.response import Response
 from rest_framework import serializers
 from drf_spectacular.utils import inline_serializer, OpenApiParameter
 from posts.serializers import PostSerializer
+from deadlybird.pagination import KeysetPaginationMixin, generate_cursor_query_schema
 
-class InboxPagination(PageNumberPagination):
+class InboxPagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = 10                  # default page size
     page_size_query_param = 'size'  # allow client to override the page size using this query parameter
     max_page_size = 100             # maximum limit of the page size
+    cursor_ordering = ("id",)       # inbox messages are listed by id
 
     def __init__(self, author_id) -> None:
       self.author_id = author_id
@@ -36,5 +38,6 @@ def generate_inbox_pagination_schema():
 def generate_inbox_pagination_query_schema():
     return [
         OpenApiParameter(name="page", description="The page to retrieve items from", type=int, required=False, location=OpenApiParameter.QUERY),
-        OpenApiParameter(name="count", description="The amount of items to show per page", type=int, required=False, location=OpenApiParameter.QUERY)
+        OpenApiParameter(name="count", description="The amount of items to show per page", type=int, required=False, location=OpenApiParameter.QUERY),
+        generate_cursor_query_schema()
     ]
\ No newline at end of file
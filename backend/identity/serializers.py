@@ -1,10 +1,11 @@
+from collections import defaultdict
 from django.conf import settings
 from rest_framework import serializers
-from blue.models import Subscription
 from posts.models import Post, Comment
 from likes.models import Like
-from following.models import Following, FollowingRequest
-from .models import Author, InboxMessage, BlockedAuthor
+from following.models import FollowingRequest
+from .models import Author, InboxMessage
+from .util import get_blocked_author_ids
 from nodes.models import Node
 from deadlybird.util import resolve_remote_route, remove_trailing_slash
 from urllib.parse import urljoin
@@ -24,13 +25,13 @@ class AuthorSerializer(serializers.ModelSerializer):
   subscribed = serializers.SerializerMethodField()
 
   def get_posts(self, obj: Author) -> int:
-    return Post.objects.filter(author=obj).count()
+    return obj.post_count
   
   def get_followers(self, obj: Author) -> int:
-    return Following.objects.filter(target_author=obj).count()
+    return obj.follower_count
 
   def get_following(self, obj: Author) -> int:
-    return Following.objects.filter(author=obj).count()
+    return obj.following_count
   
   def get_email(self, obj: Author) -> str|None:
     if "id" in self.context and obj.id == self.context["id"]:
@@ -47,11 +48,7 @@ class AuthorSerializer(serializers.ModelSerializer):
       return urljoin(settings.SITE_HOST_URL, "/static/default-avatar.png")
     
   def get_subscribed(self, obj: Author) -> bool:
-    try:
-      Subscription.objects.get(author=obj)
-      return True
-    except Subscription.DoesNotExist:
-      return False
+    return obj.subscription_count > 0
     
   def to_internal_value(self, data):
     internal_data = super().to_internal_value(data)
@@ -65,7 +62,7 @@ class AuthorSerializer(serializers.ModelSerializer):
     data = super().to_representation(instance)
 
     if "id" in self.context:
-      data["blocked"] = BlockedAuthor.objects.filter(author_id=self.context["id"], blocked_author_id=data["id"]).first() != None
+      data["blocked"] = data["id"] in get_blocked_author_ids(self.context["id"])
 
     data["id"] = resolve_remote_route(data["host"], "author", kwargs={ "author_id": data["id"] }, force_no_slash=True)
     if "github" in data and data["github"] is not None:
@@ -84,25 +81,60 @@ class InboxMessageSerializer(serializers.Serializer):
   Items field is a list of heterogenous serialized objects.
   """
 
+  @staticmethod
+  def load_page_context(messages: list[InboxMessage]) -> dict:
+    """
+    Load the content of a page of messages with one query per content type, so the
+    messages are serialized from memory instead of fetching their content one by one.
+    """
+    from posts.serializers import PostSerializer, CommentSerializer
+    from likes.serializers import LikeSerializer
+
+    ids = defaultdict(list)
+    for message in messages:
+      ids[message.content_type].append(message.content_id)
+
+    posts = PostSerializer.setup_eager_loading(Post.objects.filter(id__in=ids[InboxMessage.ContentType.POST]))
+    follow_requests = FollowingRequest.objects.filter(id__in=ids[InboxMessage.ContentType.FOLLOW]).select_related("author", "target_author")
+    likes = list(Like.objects.filter(id__in=ids[InboxMessage.ContentType.LIKE]).select_related("send_author"))
+    comments = CommentSerializer.setup_eager_loading(Comment.objects.filter(id__in=ids[InboxMessage.ContentType.COMMENT]))
+
+    return {
+      "posts": { post.id: post for post in posts },
+      "follow_requests": { request.id: request for request in follow_requests },
+      "likes": { like.id: like for like in likes },
+      "liked_objects": LikeSerializer.load_liked_objects(likes),
+      "comments": { comment.id: comment for comment in comments }
+    }
+
   def to_representation(self, instance):
+    # Use the content loaded for the whole page when the view provided it (see load_page_context)
     if instance.content_type == InboxMessage.ContentType.POST:
       from posts.serializers import PostSerializer
-      post = Post.objects.get(id=instance.content_id)
+      post = self.context.get("posts", {}).get(instance.content_id)
+      if post is None:
+        post = Post.objects.get(id=instance.content_id)
       serializer = PostSerializer(instance=post)
       return serializer.data
     elif instance.content_type == InboxMessage.ContentType.FOLLOW:
       from following.serializers import FollowRequestSerializer
-      request = FollowingRequest.objects.get(id=instance.content_id)
+      request = self.context.get("follow_requests", {}).get(instance.content_id)
+      if request is None:
+        request = FollowingRequest.objects.get(id=instance.content_id)
       serializer = FollowRequestSerializer(instance=request)
       return serializer.data
     elif instance.content_type == InboxMessage.ContentType.LIKE:
       from likes.serializers import LikeSerializer
-      like = Like.objects.get(id=instance.content_id)
-      serializer = LikeSerializer(instance=like)
+      like = self.context.get("likes", {}).get(instance.content_id)
+      if like is None:
+        like = Like.objects.get(id=instance.content_id)
+      serializer = LikeSerializer(instance=like, context={ "liked_objects": self.context.get("liked_objects", {}) })
       return serializer.data
     elif instance.content_type == InboxMessage.ContentType.COMMENT:
       from posts.serializers import CommentSerializer
-      comment = Comment.objects.get(id=instance.content_id)
+      comment = self.context.get("comments", {}).get(instance.content_id)
+      if comment is None:
+        comment = Comment.objects.get(id=instance.content_id)
       serializer = CommentSerializer(instance=comment)
       return serializer.data
 
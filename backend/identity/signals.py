@@ -0,0 +1,9 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import BlockedAuthor
+from .util import invalidate_blocked_author_ids
+
+@receiver(post_save, sender=BlockedAuthor)
+@receiver(post_delete, sender=BlockedAuthor)
+def handle_change_blocked_author(sender, instance: BlockedAuthor, **kwargs):
+  invalidate_blocked_author_ids(instance.author_id)
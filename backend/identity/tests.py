@@ -1,10 +1,29 @@
 from rest_framework import status
+from unittest.mock import Mock, patch
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from datetime import timedelta
 from django.urls import reverse
-from identity.models import InboxMessage
+from identity.models import Author, InboxMessage, InboundActivity
+from blue.models import Subscription
+from following.models import Following, FollowingRequest
+from posts.models import Post, Comment, FollowingFeedPost
+from posts.serializers import InboxPostSerializer
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from deadlybird.base_test import BaseTestCase
 from deadlybird.util import generate_full_api_url
 import json
-from identity.serializers import AuthorSerializer
+from io import StringIO
+from identity.serializers import AuthorSerializer, InboxMessageSerializer
+from identity.util import get_blocked_author_ids
+from identity.jobs import sync_remote_authors_task
+from identity.ingestion import drain_inbound_activities
+from deadlybird.settings import SITE_REMOTE_AUTH_USERNAME, SITE_REMOTE_AUTH_PASSWORD
+import base64
+from nodes.models import Node
+import requests
 from django.contrib.auth.models import User
 from likes.models import Like
 
@@ -129,6 +148,24 @@ class AuthorTests(BaseTestCase):
     self.assertEquals(response["id"], generate_full_api_url("author", kwargs={ "author_id": self.authors[1].id }, force_no_slash=True))
     self.assertEquals(response["displayName"], self.authors[1].display_name)
 
+  def test_block_list_is_cached(self):
+    """
+    Check that the block list is cached and follows blocks and unblocks.
+    """
+    author, target = self.authors[0], self.authors[1]
+    self.edit_session(id=author.id)
+    self.assertEquals(get_blocked_author_ids(author.id), frozenset())
+    with self.assertNumQueries(0):
+      get_blocked_author_ids(author.id)
+
+    self.assertEquals(self.client.post(reverse("block", kwargs={ "author_id": target.id })).status_code, 200)
+    self.assertEquals(get_blocked_author_ids(author.id), frozenset({ target.id }))
+    response = self.client.get(reverse("author", kwargs={ "author_id": target.id })).json()
+    self.assertTrue(response["blocked"])
+
+    self.assertEquals(self.client.delete(reverse("block", kwargs={ "author_id": target.id })).status_code, 200)
+    self.assertEquals(get_blocked_author_ids(author.id), frozenset())
+
   def _is_author_object(self, obj):
     """
     Check that an author object is valid.
@@ -140,6 +177,84 @@ class AuthorTests(BaseTestCase):
     return True
 
 
+class AuthorCounterTests(BaseTestCase):
+  def setUp(self):
+    super().setUp()
+
+  def test_counters_follow_writes(self):
+    """
+    Check that the denormalized counters track post, following and subscription writes.
+    """
+    author = self.create_author()
+    follower = self.create_author()
+
+    post = self.create_post(author.id)
+    follow = Following.objects.create(author=follower, target_author=author)
+    subscription = Subscription.objects.create(author=author, type=Subscription.Type.MONTHLY)
+
+    author.refresh_from_db()
+    follower.refresh_from_db()
+    self.assertEquals((author.post_count, author.follower_count, author.following_count, author.subscription_count), (1, 1, 0, 1))
+    self.assertEquals(follower.following_count, 1)
+
+    # Serializing the author should not touch the database anymore
+    with self.assertNumQueries(0):
+      data = AuthorSerializer(author).data
+    self.assertEquals((data["posts"], data["followers"], data["following"], data["subscribed"]), (1, 1, 0, True))
+
+    post.delete()
+    follow.delete()
+    subscription.delete()
+    author.refresh_from_db()
+    follower.refresh_from_db()
+    self.assertEquals((author.post_count, author.follower_count, author.subscription_count), (0, 0, 0))
+    self.assertEquals(follower.following_count, 0)
+
+  def test_rebuild_counters(self):
+    """
+    Check that the rebuild command repairs drifted counters.
+    """
+    Author.objects.update(post_count=100, follower_count=100, following_count=100, subscription_count=100)
+    call_command("rebuild_author_counters", stdout=StringIO())
+
+    for author in self.authors:
+      author.refresh_from_db()
+      self.assertEquals(author.post_count, 1)
+      self.assertEquals(author.follower_count, Following.objects.filter(target_author=author).count())
+      self.assertEquals(author.following_count, Following.objects.filter(author=author).count())
+      self.assertEquals(author.subscription_count, 0)
+
+class InboxQueryPlanTest(BaseTestCase):
+  def setUp(self):
+    super().setUp()
+
+  def test_inbox_queries_use_indexes(self):
+    """
+    Check that the inbox listing and identity.inbox lookups are served by indexes.
+    """
+    author = self.authors[0]
+
+    plan = InboxMessage.objects.filter(author=author.id).order_by("id").explain()
+    self.assertIn("inbox_author_id_idx", plan)
+    self.assertNotIn("TEMP B-TREE", plan)
+
+    # Messages are joined to and cascaded from their content through the typed foreign keys
+    plan = InboxMessage.objects.filter(post=self.posts[0]).explain()
+    self.assertIn("USING INDEX", plan)
+    self.assertNotIn("SCAN", plan)
+
+    plan = Like.objects.filter(content_type=Like.ContentType.POST, content_id=self.posts[0].id).explain()
+    self.assertIn("like_content_idx", plan)
+
+    # Served by the indexes backing the unique constraints
+    plan = Like.objects.filter(content_type=Like.ContentType.POST, send_author=author, content_id=self.posts[0].id).explain()
+    self.assertIn("USING INDEX", plan)
+    self.assertNotIn("SCAN", plan)
+
+    plan = Following.objects.filter(author=author.id, target_author=self.authors[1].id).explain()
+    self.assertIn("USING INDEX", plan)
+    self.assertNotIn("SCAN", plan)
+
 class InboxMessageTests(BaseTestCase):
   def setUp(self):
     super().setUp()
@@ -157,6 +272,62 @@ class InboxMessageTests(BaseTestCase):
     self.assertEquals(response.status_code, 200)
     self.assertTrue(len(response.json()['items']) > 0)
 
+  def _fill_inbox(self, author, others):
+    """
+    Add one message of every content type from each of the other authors.
+    """
+    post = self.create_post(author.id)
+    for other in others:
+      comment = Comment.objects.create(post=post, author=other, content="A comment", content_type=Comment.ContentType.PLAIN)
+      post_like = Like.objects.create(send_author=other, receive_author=author, content_id=post.id, content_type=Like.ContentType.POST, post=post)
+      comment_like = Like.objects.create(send_author=other, receive_author=author, content_id=comment.id, content_type=Like.ContentType.COMMENT, comment=comment)
+      follow_request = FollowingRequest.objects.create(author=other, target_author=author)
+      shared_post = self.create_post(other.id)
+      InboxMessage.objects.create(author=author, content_id=comment.id, content_type=InboxMessage.ContentType.COMMENT, comment=comment)
+      InboxMessage.objects.create(author=author, content_id=post_like.id, content_type=InboxMessage.ContentType.LIKE, like=post_like)
+      InboxMessage.objects.create(author=author, content_id=comment_like.id, content_type=InboxMessage.ContentType.LIKE, like=comment_like)
+      InboxMessage.objects.create(author=author, content_id=follow_request.id, content_type=InboxMessage.ContentType.FOLLOW, follow_request=follow_request)
+      InboxMessage.objects.create(author=author, content_id=shared_post.id, content_type=InboxMessage.ContentType.POST, post=shared_post)
+
+  def _get_inbox(self, author):
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.get(reverse("inbox", kwargs={ "author_id": author.id }), { "size": 100 })
+    self.assertEquals(response.status_code, 200)
+    return (response.json()["items"], len(queries))
+
+  def test_inbox_get_is_batched(self):
+    """
+    Check that the inbox is serialized with a constant number of queries and the same output as one message at a time.
+    """
+    author = self.create_author()
+    self.edit_session(id=author.id)
+
+    self._fill_inbox(author, self.authors[0:2])
+    _, small_inbox_queries = self._get_inbox(author)
+    self._fill_inbox(author, self.authors[2:8])
+    items, large_inbox_queries = self._get_inbox(author)
+
+    self.assertEquals(len(items), 40)
+    self.assertEquals(small_inbox_queries, large_inbox_queries)
+    messages = InboxMessage.objects.filter(author=author).order_by("id")
+    self.assertEquals(items, json.loads(json.dumps(InboxMessageSerializer(messages, many=True).data)))
+
+  def test_inbox_messages_are_deleted_with_content(self):
+    """
+    Check that deleting content removes its likes and inbox messages through the foreign keys.
+    """
+    author = self.create_author()
+    self._fill_inbox(author, self.authors[0:2])
+    self.assertEquals(InboxMessage.objects.filter(author=author).count(), 10)
+
+    FollowingRequest.objects.filter(target_author=author).delete()
+    self.assertEquals(InboxMessage.objects.filter(author=author).count(), 8)
+
+    # The post cascades to its comments, their likes and every message about them
+    Post.objects.filter(author=author).delete()
+    self.assertFalse(Like.objects.filter(receive_author=author).exists())
+    self.assertEquals(set(InboxMessage.objects.filter(author=author).values_list("content_type", flat=True)), { InboxMessage.ContentType.POST })
+
   def test_inbox_post(self):
     """
     Emulate adding sending a random like to Author0's inbox
@@ -215,4 +386,209 @@ class InboxMessageTests(BaseTestCase):
     response = self.client.delete(url)
     self.assertEquals(response.status_code, 204)
     msgs = InboxMessage.objects.filter(author_id=self.authors[0].id)
-    self.assertTrue(len(msgs) == 0)
\ No newline at end of file
+    self.assertTrue(len(msgs) == 0)
+
+@override_settings(INBOX_ASYNC_INGESTION=True, INBOX_INGESTION_WORKERS=1)
+class InboundIngestionTests(BaseTestCase):
+  def _post_as_node(self, author, body):
+    return self.client.post(reverse("inbox", kwargs={ "author_id": author.id }), data=json.dumps(body), content_type="application/json", headers={
+      "Authorization": f"Basic {base64.b64encode(bytes(f'{SITE_REMOTE_AUTH_USERNAME}:{SITE_REMOTE_AUTH_PASSWORD}', encoding='utf8')).decode('ascii')}"
+    })
+
+  def test_remote_follow_is_queued(self):
+    """
+    Check that a remote activity is accepted right away, redeliveries of its id are dropped and the drain processes it once.
+    """
+    target_author = self.create_author()
+    author = self.create_author()
+    request_body = {
+      "id": "http://remote.example.com/api/activities/1",
+      "summary": "Summary",
+      "type": "Follow",
+      "actor": AuthorSerializer(author).data,
+      "object": AuthorSerializer(target_author).data
+    }
+
+    self.assertEquals(self._post_as_node(target_author, request_body).status_code, 202)
+    self.assertEquals(self._post_as_node(target_author, request_body).status_code, 202)
+    self.assertEquals(InboundActivity.objects.count(), 1)
+    self.assertFalse(FollowingRequest.objects.filter(author=author, target_author=target_author).exists())
+
+    drain_inbound_activities()
+    activity = InboundActivity.objects.get()
+    self.assertEquals(activity.status, InboundActivity.Status.DONE)
+    self.assertEquals(FollowingRequest.objects.filter(author=author, target_author=target_author).count(), 1)
+    self.assertTrue(InboxMessage.objects.filter(author=target_author, content_type=InboxMessage.ContentType.FOLLOW).exists())
+
+  def test_follow_after_unfollow_is_queued(self):
+    """
+    Check that activities without an id are never dropped as duplicates, so a follow can follow an unfollow.
+    """
+    target_author = self.create_author()
+    author = self.create_author()
+    follow_body = {
+      "summary": "Summary",
+      "type": "Follow",
+      "actor": AuthorSerializer(author).data,
+      "object": AuthorSerializer(target_author).data
+    }
+    unfollow_body = { **follow_body, "type": "Unfollow" }
+
+    self.assertEquals(self._post_as_node(target_author, follow_body).status_code, 202)
+    drain_inbound_activities()
+    # Request accepted by the target author
+    FollowingRequest.objects.filter(author=author, target_author=target_author).delete()
+    Following.objects.create(author=author, target_author=target_author)
+
+    self.assertEquals(self._post_as_node(target_author, unfollow_body).status_code, 202)
+    drain_inbound_activities()
+    self.assertFalse(Following.objects.filter(author=author, target_author=target_author).exists())
+
+    self.assertEquals(self._post_as_node(target_author, follow_body).status_code, 202)
+    drain_inbound_activities()
+    self.assertEquals(InboundActivity.objects.filter(status=InboundActivity.Status.DONE).count(), 3)
+    self.assertEquals(FollowingRequest.objects.filter(author=author, target_author=target_author).count(), 1)
+
+  def test_invalid_activity_is_not_retried(self):
+    """
+    Check that activities rejected by the handlers fail without retries and unknown types are refused up front.
+    """
+    target_author = self.create_author()
+    self.assertEquals(self._post_as_node(target_author, { "type": "Unknown" }).status_code, 400)
+
+    response = self._post_as_node(target_author, { "type": "Follow", "actor": {}, "object": {} })
+    self.assertEquals(response.status_code, 202)
+    drain_inbound_activities()
+    activity = InboundActivity.objects.get()
+    self.assertEquals(activity.status, InboundActivity.Status.FAILED)
+    self.assertEquals(activity.attempts, 1)
+
+class SharedInboxTests(BaseTestCase):
+  def _create_post(self, author):
+    post = self.create_post(author.id)
+    post.origin = post.source = generate_full_api_url("post", kwargs={ "author_id": author.id, "post_id": post.id })
+    post.save()
+    return post
+
+  def _post_as_node(self, body):
+    return self.client.post(reverse("shared-inbox"), data=json.dumps(body), content_type="application/json", headers={
+      "Authorization": f"Basic {base64.b64encode(bytes(f'{SITE_REMOTE_AUTH_USERNAME}:{SITE_REMOTE_AUTH_PASSWORD}', encoding='utf8')).decode('ascii')}"
+    })
+
+  def test_post_to_several_authors(self):
+    """
+    Check that one request delivers a post to every recipient, and a rejected recipient does not undo the others.
+    """
+    post = self._create_post(self.authors[0])
+    recipients = [generate_full_api_url("author", kwargs={ "author_id": author.id }, force_no_slash=True) for author in self.authors[1:4]]
+
+    response = self._post_as_node({ "type": "inbox", "activity": InboxPostSerializer(post).data, "recipients": recipients + ["missing"] })
+    self.assertEquals(response.status_code, 200)
+    self.assertEquals([item["status"] for item in response.json()["items"]], [201, 201, 201, 400])
+    self.assertEquals(InboxMessage.objects.filter(post=post).count(), 3)
+    self.assertEquals(FollowingFeedPost.objects.filter(post=post).count(), 3)
+
+  def test_late_post_keeps_its_date_in_feed(self):
+    """
+    Check that a post arriving after newer ones is paged by its own date in the following stream.
+    """
+    Following.objects.get_or_create(author=self.authors[1], target_author=self.authors[0])
+    older_post = self._create_post(self.authors[0])
+    Post.objects.filter(id=older_post.id).update(published_date=timezone.now() - timedelta(days=1))
+    older_post.refresh_from_db()
+    newer_post = self._create_post(self.authors[0])
+
+    for post in (newer_post, older_post):
+      response = self._post_as_node({ "type": "inbox", "activity": InboxPostSerializer(post).data, "recipients": [self.authors[1].id] })
+      self.assertEquals(response.status_code, 200)
+
+    self.edit_session(id=self.authors[1].id)
+    response = self.client.get(reverse("post_stream", kwargs={ "stream_type": "following" }), { "size": 1, "cursor": "" }).json()
+    self.assertEquals([post["id"].split("/")[-1] for post in response["items"]], [newer_post.id])
+    response = self.client.get(response["next"]).json()
+    self.assertEquals([post["id"].split("/")[-1] for post in response["items"]], [older_post.id])
+
+  def test_list_of_activities(self):
+    """
+    Check that a list of deliveries is processed, activities naming their own target only once.
+    """
+    post = self._create_post(self.authors[0])
+    target_author = self.create_author()
+    author = self.create_author()
+    follow = {
+      "summary": "Summary",
+      "type": "Follow",
+      "actor": AuthorSerializer(author).data,
+      "object": AuthorSerializer(target_author).data
+    }
+
+    response = self._post_as_node([
+      { "type": "inbox", "activity": InboxPostSerializer(post).data, "recipients": [self.authors[1].id, self.authors[2].id] },
+      { "type": "inbox", "activity": follow, "recipients": [target_author.id, target_author.id] }
+    ])
+    self.assertEquals(response.status_code, 200)
+    self.assertEquals(len(response.json()["items"]), 3)
+    self.assertEquals(InboxMessage.objects.filter(post=post).count(), 2)
+    self.assertEquals(FollowingRequest.objects.filter(author=author, target_author=target_author).count(), 1)
+
+    self.assertEquals(self._post_as_node({ "type": "inbox", "activity": follow }).status_code, 400)
+    self.assertEquals(self.client.post(reverse("shared-inbox"), data=json.dumps([]), content_type="application/json").status_code, 403)
+
+@override_settings(REMOTE_AUTHOR_SYNC_PAGE_SIZE=2, REMOTE_AUTHOR_SYNC_PAGES_PER_RUN=2)
+class RemoteAuthorSyncTests(BaseTestCase):
+  REMOTE_HOST = "http://remote.example.com/"
+
+  def setUp(self):
+    super().setUp()
+    with patch("nodes.directory.node_get", return_value=Mock(status_code=503)):
+      self.node = Node.objects.create(host=self.REMOTE_HOST, outgoing_username="remote", outgoing_password="secret")
+    self.remote_authors = [{
+      "type": "author",
+      "id": f"{self.REMOTE_HOST}api/authors/remote-{i}",
+      "host": self.REMOTE_HOST,
+      "displayName": f"remote{i}",
+      "url": f"{self.REMOTE_HOST}api/authors/remote-{i}",
+      "github": None,
+      "profileImage": ""
+    } for i in range(5)]
+
+  def _authors_page(self, url, params, **kwargs):
+    page, size = params["page"], params["size"]
+    items = self.remote_authors[(page - 1) * size:page * size]
+    has_next = page * size < len(self.remote_authors)
+    return Mock(ok=True, status_code=200, json=Mock(return_value={ "type": "authors", "next": "next" if has_next else None, "items": items }))
+
+  def test_sync_resumes_across_runs(self):
+    """
+    Check that a directory larger than one run is mirrored over several runs and that the authors view only reads the local table.
+    """
+    with patch("identity.jobs.node_get", side_effect=self._authors_page):
+      sync_remote_authors_task()
+      self.node.refresh_from_db()
+      self.assertEquals(Author.objects.filter(host="http://remote.example.com").count(), 4)
+      self.assertEquals(self.node.author_sync_page, 3)
+      self.assertIsNone(self.node.author_sync_completed_at)
+
+      sync_remote_authors_task()
+      self.node.refresh_from_db()
+      self.assertEquals(Author.objects.filter(host="http://remote.example.com").count(), 5)
+      self.assertEquals(self.node.author_sync_page, 1)
+      self.assertIsNotNone(self.node.author_sync_completed_at)
+      self.assertGreater(self.node.author_sync_next_at, timezone.now())
+
+    self.edit_session(id=self.authors[0].id)
+    response = self.client.get(reverse("authors"), { "size": 100 }).json()
+    self.assertEquals(len(response["items"]), len(self.authors) + 5)
+
+  def test_sync_failure_backs_off(self):
+    """
+    Check that an unreachable node is retried later instead of on every run.
+    """
+    with patch("identity.jobs.node_get", side_effect=requests.ConnectionError("unreachable")) as mock_get:
+      sync_remote_authors_task()
+      self.node.refresh_from_db()
+      self.assertEquals(self.node.author_sync_failures, 1)
+      self.assertGreater(self.node.author_sync_next_at, timezone.now())
+
+      sync_remote_authors_task()
+      self.assertEquals(mock_get.call_count, 1)
@@ -9,6 +9,7 @@ urlpatterns = [
   path("login/", view=views.login, name="login"),
   path("register/", view=views.register),
   path("logout/", view=views.logout, name="logout"),
+  path("inbox", view=views.shared_inbox, name="shared-inbox"),
   path("authors/<str:author_id>/inbox", view=views.inbox, name="inbox"),
   path("authors/<str:author_id>/inbox/", view=views.inbox, name="inbox2") # Our GET inbox seems to failure otherwise?
 ]
\ No newline at end of file
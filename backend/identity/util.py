@@ -1,4 +1,7 @@
-from .models import Author
+from .models import Author, BlockedAuthor
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
 from django.http import HttpRequest
 from deadlybird.settings import SITE_HOST_URL
 from deadlybird.util import compare_domains
@@ -29,4 +32,46 @@ def check_author_is_remote(author_id: str) -> bool:
         # if hosts don't match then remote author
         return not compare_domains(this_host, check_host)
     # author does not exist 
-    return False
\ No newline at end of file
+    return False
+
+def adjust_author_counter(author_id: str, counter: str, delta: int):
+    """
+    Atomically add delta to one of the denormalized author counters
+    """
+    Author.objects.filter(id=author_id).update(**{ counter: F(counter) + delta })
+
+def rebuild_author_counters(authors=None) -> int:
+    """
+    Recompute the denormalized author counters from the source tables.
+    Returns the amount of authors updated.
+    """
+    from posts.models import Post
+    from following.models import Following
+    from blue.models import Subscription
+    from deadlybird.util import count_subquery
+
+    if authors is None:
+        authors = Author.objects.all()
+    return authors.update(
+        post_count=count_subquery(Post.objects.all(), "author"),
+        follower_count=count_subquery(Following.objects.all(), "target_author"),
+        following_count=count_subquery(Following.objects.all(), "author"),
+        subscription_count=count_subquery(Subscription.objects.all(), "author")
+    )
+
+def get_blocked_authors_cache_key(author_id: str) -> str:
+    return f"blocked_authors:{author_id}"
+
+def get_blocked_author_ids(author_id: str) -> frozenset[str]:
+    """
+    Ids of the authors blocked by an author, cached until their block list changes
+    """
+    key = get_blocked_authors_cache_key(author_id)
+    blocked = cache.get(key)
+    if blocked is None:
+        blocked = frozenset(BlockedAuthor.objects.filter(author=author_id).values_list("blocked_author", flat=True))
+        cache.set(key, blocked, timeout=settings.BLOCKED_AUTHORS_CACHE_SECONDS)
+    return blocked
+
+def invalidate_blocked_author_ids(author_id: str):
+    cache.delete(get_blocked_authors_cache_key(author_id))
@@ -1,23 +1,20 @@
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.http import HttpRequest
 from rest_framework import serializers
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from nodes.models import Node
-from nodes.util import get_auth_from_host, get_or_create_remote_author_from_api_payload
 from .models import Author, InboxMessage, BlockedAuthor
-from deadlybird.permissions import RemoteOrSessionAuthenticated, SessionAuthenticated, IsGetRequest, IsPutRequest, IsPostRequest, IsDeleteRequest
+from deadlybird.permissions import RemoteNodeAuthenticated, RemoteOrSessionAuthenticated, SessionAuthenticated, IsGetRequest, IsPutRequest, IsPostRequest, IsDeleteRequest
 from deadlybird.serializers import GenericErrorSerializer, GenericSuccessSerializer
-from deadlybird.util import generate_next_id, generate_full_api_url, remove_trailing_slash, resolve_remote_route
+from deadlybird.util import generate_next_id, generate_full_api_url, remove_trailing_slash
 from deadlybird.pagination import Pagination, generate_pagination_schema, generate_pagination_query_schema
 from deadlybird.settings import SITE_HOST_URL
 from likes.serializers import APIDocsLikeSerializer
 from drf_spectacular.utils import extend_schema, OpenApiParameter, inline_serializer
 from .pagination import InboxPagination, generate_inbox_pagination_query_schema, generate_inbox_pagination_schema
-from .serializers import AuthorSerializer, InboxMessageSerializer, InboxAuthorSerializer
+from .serializers import AuthorSerializer, InboxMessageSerializer
 from identity.util import get_this_host_url
-import requests
-import json
 
 @extend_schema(
     operation_id="api_authors_retrieve_all",
@@ -44,20 +41,7 @@ def authors(request: HttpRequest):
 
   if hasattr(request, "is_node_authenticated") and request.is_node_authenticated:
     authors = authors.filter(host__icontains=remove_trailing_slash(SITE_HOST_URL))
-  else:
-    # For the sake of group propagation, I present a hacky method to show authors we don't have information on
-    # Only for local requests do we fetch all the users again (avoid infinite loop)
-    for node in Node.objects.all():
-      authors_url = resolve_remote_route(node.host, "authors") + "?size=100"
-      auth = get_auth_from_host(node.host)
-      response = requests.get(url=authors_url, auth=auth).json()
-      for author_json in response["items"]:
-        inbox_author_serializer = InboxAuthorSerializer(data=author_json)
-        if not inbox_author_serializer.is_valid():
-          print(f"Invalid inbox author received: {json.dumps(author_json)}")
-          continue
-        get_or_create_remote_author_from_api_payload(inbox_author_serializer.data)
-      
+  # Remote authors are mirrored in the background by identity.jobs.sync_remote_authors_task
 
   # Paginate the queryset
   paginator = Pagination("authors")
@@ -386,50 +370,23 @@ def inbox(request: HttpRequest, author_id: str):
   DELETE [local]: clear the inbox
   """
   if request.method == "POST":
-    # Check request data
-    content_type = request.data.get("type")
-    print("INBOX REQUEST RECEIVED WITH TYPE " + content_type)
-    print(request.data)
-
-    if content_type == None:
-      return Response({
-        "error": True,
-        "message": "Missing necessary request body parameters"
-      }, status=400)
-    
-    if content_type == "Like":
-      # Ensure like data is valid data
-      from .inbox import handle_like_inbox
-      return handle_like_inbox(request)
-    elif content_type == "post":
-      from .inbox import handle_post_inbox
-      return handle_post_inbox(request, target_author_id=author_id)
-
-    elif content_type == "Follow": 
-      from .inbox import handle_follow_inbox
-      return handle_follow_inbox(request)
-
-    elif content_type == "Unfollow":
-      from .inbox import handle_unfollow_inbox
-      return handle_unfollow_inbox(request)
-
-    elif content_type == "FollowResponse":
-      from .inbox import handle_follow_response_inbox
-      return handle_follow_response_inbox(request)
-
-    elif content_type == "comment":
-      from .inbox import handle_comment_inbox
-      return handle_comment_inbox(request)
-    
-    else:
-      return Response({ "error": True, "message": "Unknown inbox type" }, status=400)
+    node_authenticated = hasattr(request, "is_node_authenticated") and request.is_node_authenticated
+    if node_authenticated and settings.INBOX_ASYNC_INGESTION:
+      # Remote activities are queued and processed by identity.ingestion
+      from .ingestion import enqueue_inbound_activity
+      return enqueue_inbound_activity(request.data, author_id)
+
+    from .inbox import handle_inbox_activity
+    return handle_inbox_activity(request, author_id)
   
   if request.method == "GET":
     # Return the list of inbox messages for the author   
     inbox_messages = InboxMessage.objects.filter(author=author_id).order_by("id")
     paginator = InboxPagination(author_id=author_id)
     page = paginator.paginate_queryset(inbox_messages, request)
-    serializer = InboxMessageSerializer(page, many=True)
+
+    # Load the content of every message on the page at once, one query per content type
+    serializer = InboxMessageSerializer(page, many=True, context=InboxMessageSerializer.load_page_context(page))
 
     return paginator.get_paginated_response(serializer.data)
   
@@ -441,6 +398,40 @@ def inbox(request: HttpRequest, author_id: str):
     except:
       return Response({"error": True, "message": "unable to delete inbox"}, status=404)
 
+@extend_schema(
+  methods=["POST"],
+  request=inline_serializer("SharedInboxPayload", fields={
+    "type": serializers.CharField(default="inbox"),
+    "activity": serializers.DictField(),
+    "recipients": serializers.ListField(child=serializers.CharField())
+  }),
+  responses={
+    200: GenericSuccessSerializer,
+    202: GenericSuccessSerializer,
+    400: GenericErrorSerializer,
+    500: GenericErrorSerializer
+  }
+)
+@api_view(["POST"])
+@permission_classes([ RemoteNodeAuthenticated ])
+def shared_inbox(request: HttpRequest):
+  """
+  URL: ://service/inbox
+  POST [remote]: deliver an activity to several of our authors at once, or a list of such deliveries
+  """
+  from .inbox import get_shared_inbox_deliveries, handle_shared_inbox
+
+  deliveries = get_shared_inbox_deliveries(request.data)
+  if deliveries is None:
+    return Response({ "error": True, "message": "Expected an activity with a list of recipients, or a list of them" }, status=400)
+  if sum(len(recipient_ids) for _, recipient_ids in deliveries) > settings.SHARED_INBOX_MAX_DELIVERIES:
+    return Response({ "error": True, "message": f"At most {settings.SHARED_INBOX_MAX_DELIVERIES} deliveries are accepted at once" }, status=400)
+
+  if settings.INBOX_ASYNC_INGESTION:
+    from .ingestion import enqueue_shared_inbox_deliveries
+    return enqueue_shared_inbox_deliveries(deliveries)
+  return handle_shared_inbox(deliveries)
+
 @api_view(["POST", "DELETE"])
 @permission_classes([ SessionAuthenticated ])
 def block(request: HttpRequest, author_id: str):
@@ -4,6 +4,3 @@ from django.apps import AppConfig
 class LikesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'likes'
-
-    def ready(self):
-        import likes.signals
\ No newline at end of file
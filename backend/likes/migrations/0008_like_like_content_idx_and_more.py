@@ -0,0 +1,37 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:32
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    Like = apps.get_model("likes", "Like")
+
+    duplicates = Like.objects.values("send_author", "content_type", "content_id") \
+        .annotate(rows=Count("id"), keep=Min("id")) \
+        .filter(rows__gt=1)
+    for duplicate in duplicates:
+        Like.objects \
+            .filter(send_author=duplicate["send_author"], content_type=duplicate["content_type"], content_id=duplicate["content_id"]) \
+            .exclude(id=duplicate["keep"]) \
+            .delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('identity', '0022_inboxmessage_inbox_author_id_idx_and_more'),
+        ('likes', '0007_alter_like_content_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['content_type', 'content_id'], name='like_content_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('send_author', 'content_type', 'content_id'), name='like_unique_send_author_content'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_like_content(apps, schema_editor):
+    Like = apps.get_model("likes", "Like")
+    Post = apps.get_model("posts", "Post")
+    Comment = apps.get_model("posts", "Comment")
+
+    Like.objects.filter(content_type="post").update(
+        post=Subquery(Post.objects.filter(id=OuterRef("content_id")).values("id")[:1])
+    )
+    Like.objects.filter(content_type="comment").update(
+        comment=Subquery(Comment.objects.filter(id=OuterRef("content_id")).values("id")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('likes', '0008_like_like_content_idx_and_more'),
+        ('posts', '0015_feed_denormalization'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='like',
+            name='comment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='likes', to='posts.comment'),
+        ),
+        migrations.AddField(
+            model_name='like',
+            name='post',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='likes', to='posts.post'),
+        ),
+        migrations.RunPython(populate_like_content, migrations.RunPython.noop),
+    ]
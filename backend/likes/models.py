@@ -1,6 +1,6 @@
 from django.db import models
 from identity.models import Author
-from posts.models import Post
+from posts.models import Post, Comment
 from deadlybird.util import generate_next_id
 
 class Like(models.Model): 
@@ -13,4 +13,17 @@ class Like(models.Model):
   send_author = models.ForeignKey(Author, related_name='sent_like', blank=False, null=False, on_delete=models.CASCADE)
   receive_author = models.ForeignKey(Author, related_name='received_like', blank=False, null=False, on_delete=models.CASCADE)
   content_id = models.CharField(max_length=255, blank=False, null=False)
-  content_type = models.CharField(choices=ContentType.choices, max_length=50, blank=False, null=False) 
\ No newline at end of file
+  content_type = models.CharField(choices=ContentType.choices, max_length=50, blank=False, null=False)
+  # Typed reference to the liked object when it is stored on this node (local copies of remote comment likes have none).
+  # Likes are deleted with the object they like.
+  post = models.ForeignKey(Post, on_delete=models.CASCADE, blank=True, null=True, related_name="likes")
+  comment = models.ForeignKey(Comment, on_delete=models.CASCADE, blank=True, null=True, related_name="likes")
+
+  class Meta:
+    indexes = [
+      models.Index(fields=["content_type", "content_id"], name="like_content_idx")
+    ]
+    constraints = [
+      # An author can only like something once
+      models.UniqueConstraint(fields=["send_author", "content_type", "content_id"], name="like_unique_send_author_content")
+    ]
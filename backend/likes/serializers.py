@@ -26,13 +26,27 @@ class LikeSerializer(serializers.ModelSerializer):
         else:
             return f"{obj.send_author.display_name} likes your comment"
 
+    @staticmethod
+    def load_liked_objects(likes: list[Like]) -> dict:
+        """
+        Load the posts and comments liked by a list of likes with one query each, keyed by id.
+        Pass the result as the "liked_objects" context to avoid a query per like.
+        """
+        post_ids = [like.content_id for like in likes if like.content_type == Like.ContentType.POST]
+        comment_ids = [like.content_id for like in likes if like.content_type == Like.ContentType.COMMENT]
+
+        liked_objects = { post.id: post for post in Post.objects.filter(id__in=post_ids).only("id", "author_id") }
+        liked_objects.update({ comment.id: comment for comment in Comment.objects.filter(id__in=comment_ids).select_related("post").only("id", "post__id", "post__author_id") })
+        return liked_objects
+
     def get_object(self, obj: Like) -> str:
+        liked_object = self.context.get("liked_objects", {}).get(obj.content_id)
         if obj.content_type == Like.ContentType.POST:
-            post = Post.objects.get(id=obj.content_id)
-            return generate_full_api_url("post", kwargs={ "author_id": post.author.id, "post_id": post.id })
+            post = liked_object or Post.objects.get(id=obj.content_id)
+            return generate_full_api_url("post", kwargs={ "author_id": post.author_id, "post_id": post.id })
         else:
-            comment = Comment.objects.get(id=obj.content_id)
-            return f"{get_host_with_slash(SITE_HOST_URL)}api/authors/{comment.post.author.id}/posts/{comment.post.id}/comments/{comment.id}"
+            comment = liked_object or Comment.objects.select_related("post").get(id=obj.content_id)
+            return f"{get_host_with_slash(SITE_HOST_URL)}api/authors/{comment.post.author_id}/posts/{comment.post.id}/comments/{comment.id}"
     
     def to_representation(self, instance):
         data = super().to_representation(instance)
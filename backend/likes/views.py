@@ -10,11 +10,11 @@ from deadlybird.serializers import GenericErrorSerializer
 from deadlybird.permissions import RemoteOrSessionAuthenticated
 from deadlybird.settings import SITE_HOST_URL
 from deadlybird.util import resolve_remote_route, get_host_from_api_url, compare_domains
-from nodes.util import get_auth_from_host
+from nodes.proxy import proxy_get
+from posts.replica import has_fresh_replica
 from identity.models import Author
 from drf_spectacular.utils import extend_schema, OpenApiParameter, inline_serializer
 from .serializers import LikeSerializer, APIDocsLikeManySerializer
-import requests
 
 
 @extend_schema(
@@ -58,9 +58,8 @@ def comment_likes(request: HttpRequest, author_id: str, post_id: str, comment_id
             "comment_id": comment_id
         })
 
-        auth = get_auth_from_host(get_host_from_api_url(author_post.origin))
-        res = requests.get(url=url, auth=auth)
-        return Response(res.json(), status=res.status_code)
+        status, body = proxy_get(url)
+        return Response(body, status=status)
 
     # This is a local post
     # Get comment and its likes
@@ -104,23 +103,15 @@ def post_likes(request: HttpRequest, author_id: str, post_id: str):
                 "message": "author post not found"
             }, 404)
 
-        if not compare_domains(author_post.source, SITE_HOST_URL):
-            # Fetch from source node
+        if not compare_domains(author_post.source, SITE_HOST_URL) and not has_fresh_replica(author_post):
+            # Fetch from source node unless the likes are mirrored (see posts.replica)
             author_id, _, post_id = author_post.source.split("/")[-3:]
             url = resolve_remote_route(get_host_from_api_url(author_post.source), "post_likes", {
                 "author_id": author_id,
                 "post_id": post_id
             })
-            print("CHECKING ERROR THING")
-            print(url)
-
-            auth = get_auth_from_host(get_host_from_api_url(author_post.source))
-            print(auth)
-            res = requests.get(url=url, auth=auth)
-            print(res.status_code)
-            likes_json = res.json()
-            print(likes_json)
-            return Response(likes_json, status=res.status_code)
+            status, body = proxy_get(url)
+            return Response(body, status=status)
                 
         # Get the likes for the post
         likes = Like.objects.all()\
@@ -165,13 +156,8 @@ def liked(request: HttpRequest, author_id: str):
         url = resolve_remote_route(author.host, "liked", {
             "author_id": author.id
         })
-        auth = get_auth_from_host(author.host)
-        response = requests.get(
-            url=url,
-            auth=auth
-        )
-
-        return Response(response.json(), status=response.status_code)
+        status, body = proxy_get(url)
+        return Response(body, status=status)
 
     # Get likes
     liked = Like.objects.all()\
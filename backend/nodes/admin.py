@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Node
+from .models import Node, OutboundDelivery
 
 # Register your models here.
 admin.site.register(Node)
+admin.site.register(OutboundDelivery)
@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from deadlybird.settings import RUN_SCHEDULER, OUTBOUND_DELIVERY_POLL_SECONDS
+from apscheduler.schedulers.background import BackgroundScheduler
 
 
 class NodesConfig(AppConfig):
@@ -6,4 +8,11 @@ class NodesConfig(AppConfig):
     name = 'nodes'
 
     def ready(self):
-        import nodes.signals
\ No newline at end of file
+        import nodes.signals
+
+        if RUN_SCHEDULER:
+            from .delivery import drain_delivery_queue, refresh_shared_inboxes
+            scheduler = BackgroundScheduler()
+            scheduler.add_job(drain_delivery_queue, 'interval', seconds=OUTBOUND_DELIVERY_POLL_SECONDS, max_instances=1, coalesce=True)
+            scheduler.add_job(refresh_shared_inboxes, 'interval', minutes=1, max_instances=1, coalesce=True)
+            scheduler.start()
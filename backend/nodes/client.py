@@ -0,0 +1,59 @@
+# Shared HTTP client for all traffic to remote nodes
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from deadlybird.util import normalize_author_host
+from .util import get_auth_from_host
+
+# Sessions only pool connections, credentials are passed with every request
+_sessions: dict[str, requests.Session] = {}
+_lock = threading.Lock()
+
+def _get_session(host: str) -> requests.Session:
+  """
+  Retrieve the keep-alive session of a remote host, creating it on first use.
+  """
+  with _lock:
+    session = _sessions.get(host)
+    if session is None:
+      adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.NODE_CLIENT_POOL_SIZE)
+      session = requests.Session()
+      session.mount("http://", adapter)
+      session.mount("https://", adapter)
+      _sessions[host] = session
+    return session
+
+def get_node_auth(host: str) -> tuple[str, str]:
+  """
+  Retrieve the credentials used to talk to a host. Looked up in the node registry, so credentials
+  changed by another worker process are picked up once its copy expires (NODE_REGISTRY_TTL_SECONDS).
+  """
+  return get_auth_from_host(normalize_author_host(host))
+
+def node_request(method: str, url: str, **kwargs) -> requests.Response:
+  """
+  Send a request to a remote node over its pooled connection.
+  Credentials of the node are used unless `auth` is given, and the default timeouts apply unless `timeout` is given.
+  """
+  host = normalize_author_host(url)
+  if kwargs.get("auth") is None:
+    kwargs["auth"] = get_node_auth(host)
+  kwargs.setdefault("timeout", (settings.NODE_CLIENT_CONNECT_TIMEOUT, settings.NODE_CLIENT_READ_TIMEOUT))
+
+  return _get_session(host).request(method, url, **kwargs)
+
+def node_get(url: str, **kwargs) -> requests.Response:
+  return node_request("GET", url, **kwargs)
+
+def node_post(url: str, **kwargs) -> requests.Response:
+  return node_request("POST", url, **kwargs)
+
+def reset_node_clients():
+  """
+  Drop pooled connections. Called whenever nodes change.
+  """
+  with _lock:
+    for session in _sessions.values():
+      session.close()
+    _sessions.clear()
@@ -0,0 +1,220 @@
+# Durable queue used to push payloads to remote inboxes outside of the request cycle
+import json
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from deadlybird.util import compare_domains, generate_next_id, normalize_author_host, resolve_remote_route
+from .models import Node, OutboundDelivery
+from .client import get_node_auth, node_get, node_post
+from .registry import invalidate_node_registry
+import requests
+
+# Seconds added to the longest a claimed batch can take before it is considered abandoned (see get_claim_lease)
+CLAIM_LEASE_MARGIN_SECONDS = 60
+# Retry backoff bounds (seconds)
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 60 * 60
+# Connect/read timeouts for a single delivery attempt
+DELIVERY_TIMEOUT = (5, 30)
+# Upper bound of batches processed by a single drain so one tick cannot run forever
+MAX_BATCHES_PER_DRAIN = 10
+
+_node_semaphores: dict[str, threading.BoundedSemaphore] = {}
+_node_semaphores_lock = threading.Lock()
+
+def enqueue_delivery(url: str, payload: dict) -> OutboundDelivery:
+  """
+  Queue a JSON payload to be POSTed to a remote url.
+  """
+  return OutboundDelivery.objects.create(
+    host=normalize_author_host(url),
+    url=url,
+    payload=json.dumps(payload)
+  )
+
+def enqueue_shared_inbox_delivery(url: str, activity: dict, recipients: list[str]) -> list[OutboundDelivery]:
+  """
+  Queue an activity for several authors of a node to the node's shared inbox,
+  split into requests of at most SHARED_INBOX_MAX_DELIVERIES recipients.
+  """
+  size = settings.SHARED_INBOX_MAX_DELIVERIES
+  return [
+    enqueue_delivery(url, { "type": "inbox", "activity": activity, "recipients": recipients[i:i + size] })
+    for i in range(0, len(recipients), size)
+  ]
+
+def discover_shared_inbox(node: Node) -> str:
+  """
+  Shared inbox url advertised by a node on its hostname route, or "" if it has none.
+  Urls on another host are refused, posts for the node's followers must not be handed to a third party.
+  The known url is kept when the node cannot be reached.
+  """
+  try:
+    response = node_get(url=resolve_remote_route(node.host, "hostname"))
+  except requests.RequestException as e:
+    print(f"[DELIVERY] Failed to ask {node.host} for its shared inbox: {e}")
+    return node.shared_inbox_url
+  if response.status_code >= 500:
+    return node.shared_inbox_url
+  if not response.ok:
+    return ""
+
+  try:
+    url = response.json().get("sharedInbox")
+  except (ValueError, AttributeError):
+    return ""
+  if not isinstance(url, str) or not url.startswith("http"):
+    return ""
+  if not compare_domains(url, node.host):
+    print(f"[DELIVERY] Ignoring shared inbox of {node.host} on another host: {url}")
+    return ""
+  return url
+
+def refresh_shared_inboxes():
+  """
+  Scheduled job which asks nodes for their shared inbox every SHARED_INBOX_DISCOVERY_SECONDS.
+  """
+  now = timezone.now()
+  due = Node.objects.filter(Q(shared_inbox_checked_at__isnull=True) | Q(shared_inbox_checked_at__lte=now - timedelta(seconds=settings.SHARED_INBOX_DISCOVERY_SECONDS)))
+
+  changed = False
+  for node in due:
+    url = discover_shared_inbox(node)
+    changed = changed or url != node.shared_inbox_url
+    # Update through the queryset so that the Node post_save handlers do not reset the clients
+    Node.objects.filter(id=node.id).update(shared_inbox_url=url, shared_inbox_checked_at=timezone.now())
+
+  if changed:
+    invalidate_node_registry()
+
+def get_backoff_delay(attempts: int) -> timedelta:
+  """
+  Exponential backoff delay after the given number of failed attempts.
+  """
+  return timedelta(seconds=min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS))
+
+def get_claim_lease() -> timedelta:
+  """
+  Time after which a claimed delivery is considered abandoned (e.g. worker crashed).
+  In the worst case a whole batch targets one slow node, so its attempts run OUTBOUND_DELIVERY_PER_NODE_CONCURRENCY
+  at a time and each one uses up DELIVERY_TIMEOUT. The lease outlasts that, so live batches are never sent twice.
+  """
+  parallel = max(min(settings.OUTBOUND_DELIVERY_PER_NODE_CONCURRENCY, settings.OUTBOUND_DELIVERY_WORKERS), 1)
+  rounds = math.ceil(settings.OUTBOUND_DELIVERY_BATCH_SIZE / parallel)
+  return timedelta(seconds=rounds * sum(DELIVERY_TIMEOUT) + CLAIM_LEASE_MARGIN_SECONDS)
+
+def _get_node_semaphore(host: str) -> threading.BoundedSemaphore:
+  """
+  Limits concurrent deliveries to a node to OUTBOUND_DELIVERY_PER_NODE_CONCURRENCY.
+  The limit is per process, a node receives up to that many requests from each worker process.
+  """
+  with _node_semaphores_lock:
+    if host not in _node_semaphores:
+      _node_semaphores[host] = threading.BoundedSemaphore(settings.OUTBOUND_DELIVERY_PER_NODE_CONCURRENCY)
+    return _node_semaphores[host]
+
+def _claim_due_deliveries(limit: int) -> list[OutboundDelivery]:
+  """
+  Mark up to `limit` due deliveries as in flight and return them.
+  The claim token keeps concurrent drainers (one per web worker) from sending the same row twice.
+  """
+  now = timezone.now()
+
+  # Release deliveries whose worker never reported back. Checked first so an idle poll never takes a write lock.
+  abandoned = OutboundDelivery.objects \
+    .filter(status=OutboundDelivery.Status.IN_FLIGHT, claimed_at__lt=now - get_claim_lease())
+  if abandoned.exists():
+    abandoned.update(status=OutboundDelivery.Status.PENDING, claim_token=None, claimed_at=None)
+
+  due_ids = list(OutboundDelivery.objects \
+    .filter(status=OutboundDelivery.Status.PENDING, next_attempt_at__lte=now) \
+    .order_by("next_attempt_at") \
+    .values_list("id", flat=True)[:limit])
+  if len(due_ids) == 0:
+    return []
+
+  claim_token = generate_next_id()
+  OutboundDelivery.objects \
+    .filter(id__in=due_ids, status=OutboundDelivery.Status.PENDING) \
+    .update(status=OutboundDelivery.Status.IN_FLIGHT, claim_token=claim_token, claimed_at=now)
+
+  return list(OutboundDelivery.objects.filter(claim_token=claim_token, status=OutboundDelivery.Status.IN_FLIGHT))
+
+def _send_delivery(delivery: OutboundDelivery, auth) -> tuple[bool, bool, str]:
+  """
+  POST a single delivery. Only performs network IO so that it can run on a worker thread.
+  Returns (delivered, retryable, error message).
+  """
+  with _get_node_semaphore(delivery.host):
+    try:
+      response = node_post(
+        url=delivery.url,
+        headers={'Content-Type': 'application/json'},
+        data=delivery.payload,
+        auth=auth,
+        timeout=DELIVERY_TIMEOUT
+      )
+    except requests.RequestException as e:
+      return (False, True, str(e))
+
+  if response.ok:
+    return (True, False, "")
+
+  # Client errors will not fix themselves by retrying (except for timeouts and rate limits)
+  retryable = response.status_code >= 500 or response.status_code in (408, 429)
+  return (False, retryable, f"HTTP {response.status_code}: {response.text[:1000]}")
+
+def _record_result(delivery: OutboundDelivery, delivered: bool, retryable: bool, error: str):
+  if delivered:
+    delivery.delete()
+    return
+
+  delivery.attempts += 1
+  delivery.last_error = error
+  delivery.claim_token = None
+  delivery.claimed_at = None
+  if retryable and delivery.attempts < settings.OUTBOUND_DELIVERY_MAX_ATTEMPTS:
+    delivery.status = OutboundDelivery.Status.PENDING
+    delivery.next_attempt_at = timezone.now() + get_backoff_delay(delivery.attempts)
+  else:
+    delivery.status = OutboundDelivery.Status.FAILED
+  delivery.save()
+
+  print(f"[DELIVERY] Failed to deliver {delivery.id} to {delivery.url} (attempt {delivery.attempts}, status={delivery.status}): {error}")
+
+def process_delivery_batch(limit: int = None) -> int:
+  """
+  Claim and send one batch of due deliveries using the worker pool.
+  Database access stays on the calling thread, worker threads only do HTTP.
+  Batches never exceed OUTBOUND_DELIVERY_BATCH_SIZE, which the claim lease is derived from.
+  Returns the number of deliveries attempted.
+  """
+  deliveries = _claim_due_deliveries(min(limit or settings.OUTBOUND_DELIVERY_BATCH_SIZE, settings.OUTBOUND_DELIVERY_BATCH_SIZE))
+  if len(deliveries) == 0:
+    return 0
+
+  auth_by_host = {}
+  for delivery in deliveries:
+    if delivery.host not in auth_by_host:
+      auth_by_host[delivery.host] = get_node_auth(delivery.host)
+
+  with ThreadPoolExecutor(max_workers=settings.OUTBOUND_DELIVERY_WORKERS) as executor:
+    futures = [(delivery, executor.submit(_send_delivery, delivery, auth_by_host[delivery.host])) for delivery in deliveries]
+    results = [(delivery, future.result()) for delivery, future in futures]
+
+  for delivery, (delivered, retryable, error) in results:
+    _record_result(delivery, delivered, retryable, error)
+
+  return len(deliveries)
+
+def drain_delivery_queue():
+  """
+  Scheduled job which sends every due delivery.
+  """
+  for _ in range(MAX_BATCHES_PER_DRAIN):
+    if process_delivery_batch() < settings.OUTBOUND_DELIVERY_BATCH_SIZE:
+      break
@@ -0,0 +1,143 @@
+# Concurrent full pulls of remote author directories
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from deadlybird.util import resolve_remote_route
+from .client import node_get
+from .models import Node
+from .util import upsert_remote_authors_from_api_payloads
+import requests
+
+class NodeFetchState:
+  """
+  Progress and timings of the directory pull of a single node.
+  """
+  def __init__(self, node: Node):
+    self.node = node
+    self.next_page = 1
+    self.last_page = None       # Known once a page reports that it is the last one
+    self.in_flight = 0
+    self.pages = 0
+    self.authors = 0
+    self.error = None
+    self.request_seconds = 0.0
+    self.started_at = time.monotonic()
+    self.finished_at = None
+
+  def can_schedule(self, per_node: int) -> bool:
+    if self.error is not None or self.in_flight >= per_node:
+      return False
+    return self.last_page is None or self.next_page <= self.last_page
+
+  def is_done(self) -> bool:
+    return self.in_flight == 0 and not self.can_schedule(per_node=1)
+
+  def elapsed_seconds(self) -> float:
+    return (self.finished_at or time.monotonic()) - self.started_at
+
+def _fetch_authors_page(node: Node, page: int) -> tuple[list, bool, str|None, float]:
+  """
+  Fetch one page of a node's author directory. Only performs network IO so that it can run on a worker thread.
+  Returns (authors, whether this is the last page, error message, request duration).
+  """
+  started_at = time.monotonic()
+  try:
+    response = node_get(
+      url=resolve_remote_route(node.host, "authors"),
+      params={ "page": page, "size": settings.REMOTE_AUTHOR_SYNC_PAGE_SIZE },
+      auth=(node.outgoing_username, node.outgoing_password)
+    )
+  except requests.RequestException as e:
+    return ([], True, str(e), time.monotonic() - started_at)
+  elapsed = time.monotonic() - started_at
+
+  if response.status_code == 404 and page > 1:
+    # Paginators reject pages past the end
+    return ([], True, None, elapsed)
+  if response.status_code != 200:
+    return ([], True, f"HTTP {response.status_code}", elapsed)
+
+  try:
+    body = response.json()
+    members = body["items"]
+  except (KeyError, TypeError, ValueError):
+    return ([], True, "Response is not in the API standardized pagination format", elapsed)
+
+  is_last = len(members) == 0 or ("next" in body and not body["next"])
+  return (members, is_last, None, elapsed)
+
+def _store_authors(members: list) -> int:
+  return sum(1 for author in upsert_remote_authors_from_api_payloads(members) if author is not None)
+
+def fetch_author_directories(nodes: list[Node], max_in_flight: int = None, per_node: int = None) -> list[NodeFetchState]:
+  """
+  Pull the complete author directory of every node, fetching pages of all nodes concurrently.
+  Pages past the end of a directory are fetched speculatively and discarded. Network IO runs
+  on the worker pool while authors are written on the calling thread, one transaction per page.
+  """
+  max_in_flight = max_in_flight or settings.REMOTE_AUTHOR_FETCH_MAX_IN_FLIGHT
+  per_node = per_node or settings.REMOTE_AUTHOR_FETCH_PER_NODE
+  states = [NodeFetchState(node) for node in nodes]
+  pending = {}
+
+  with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+    def schedule():
+      # Hand out pages round robin so one large directory cannot starve the others
+      scheduled = True
+      while scheduled and len(pending) < max_in_flight:
+        scheduled = False
+        for state in states:
+          if len(pending) >= max_in_flight:
+            break
+          if state.can_schedule(per_node):
+            pending[executor.submit(_fetch_authors_page, state.node, state.next_page)] = (state, state.next_page)
+            state.next_page += 1
+            state.in_flight += 1
+            scheduled = True
+
+    schedule()
+    while len(pending) > 0:
+      done, _ = wait(pending.keys(), return_when=FIRST_COMPLETED)
+      for future in done:
+        state, page = pending.pop(future)
+        state.in_flight -= 1
+        members, is_last, error, elapsed = future.result()
+        state.request_seconds += elapsed
+
+        if error is not None:
+          state.error = error
+        elif state.last_page is None or page <= state.last_page:
+          if len(members) > 0:
+            # Speculative pages past the end can complete before the real last page, those come back empty
+            state.pages += 1
+            state.authors += _store_authors(members)
+          if is_last:
+            state.last_page = page if state.last_page is None else min(state.last_page, page)
+
+        if state.is_done() and state.finished_at is None:
+          state.finished_at = time.monotonic()
+          _record_fetch(state)
+      schedule()
+
+  return states
+
+def _record_fetch(state: NodeFetchState):
+  requests_made = max(state.next_page - 1, 1)
+  print(f"[AUTHOR FETCH] {state.node.host}: {state.authors} authors from {state.pages} pages in {state.elapsed_seconds():.2f}s " \
+        f"(avg request {state.request_seconds / requests_made * 1000:.0f}ms, error={state.error})")
+
+  if state.error is not None:
+    return
+
+  # A full pull also completes the incremental sync of identity.jobs.sync_remote_authors_task
+  now = timezone.now()
+  Node.objects.filter(id=state.node.id).update(
+    author_sync_page=1,
+    author_synced_at=now,
+    author_sync_completed_at=now,
+    author_sync_next_at=now + timedelta(seconds=settings.REMOTE_AUTHOR_SYNC_INTERVAL_SECONDS),
+    author_sync_failures=0,
+    author_sync_error=""
+  )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from nodes.proxy import OUTCOMES, get_proxy_cache_stats, reset_proxy_cache_stats
+
+class Command(BaseCommand):
+  help = "Show how requests proxied to remote nodes were served. Counters are shared through the configured cache."
+
+  def add_arguments(self, parser):
+    parser.add_argument("--reset", action="store_true", help="Reset the counters after showing them")
+
+  def handle(self, *args, **options):
+    stats = get_proxy_cache_stats()
+    for outcome in OUTCOMES:
+      self.stdout.write(f"{outcome}: {stats[outcome]}")
+    self.stdout.write(f"hit rate: {stats['hit_rate']:.1%}")
+
+    if options["reset"]:
+      reset_proxy_cache_stats()
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:58
+
+import deadlybird.util
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nodes', '0006_remove_node_incoming_password_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundDelivery',
+            fields=[
+                ('id', models.CharField(default=deadlybird.util.generate_next_id, max_length=255, primary_key=True, serialize=False)),
+                ('host', models.CharField(max_length=255)),
+                ('url', models.URLField(max_length=1024)),
+                ('payload', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_flight', 'In Flight'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claim_token', models.CharField(blank=True, max_length=255, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='delivery_status_next_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nodes', '0007_outbounddelivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='node',
+            name='author_sync_completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='author_sync_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='author_sync_failures',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='author_sync_next_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='author_sync_page',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='author_synced_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nodes', '0008_node_author_sync_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='node',
+            name='shared_inbox_checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='shared_inbox_url',
+            field=models.URLField(blank=True, default='', max_length=1024),
+        ),
+    ]
@@ -1,5 +1,6 @@
 import secrets
 from django.db import models
+from django.utils import timezone
 from deadlybird.util import generate_next_id
 
 def generate_random_credential():
@@ -11,6 +12,46 @@ class Node(models.Model):
   host = models.URLField(blank=False, null=False)
   outgoing_username = models.CharField(max_length=255, blank=False, null=False)
   outgoing_password = models.CharField(max_length=255, blank=False, null=False)
+  # Remote author directory sync state (see identity.jobs.sync_remote_authors_task)
+  author_sync_page = models.PositiveIntegerField(default=1)
+  author_sync_next_at = models.DateTimeField(default=timezone.now, blank=False, null=False)
+  author_synced_at = models.DateTimeField(blank=True, null=True)
+  author_sync_completed_at = models.DateTimeField(blank=True, null=True)
+  author_sync_failures = models.PositiveIntegerField(default=0)
+  author_sync_error = models.TextField(blank=True, null=False, default="")
+  # Shared inbox advertised by the node, posts to several of its authors are delivered there at once
+  shared_inbox_url = models.URLField(max_length=1024, blank=True, null=False, default="")
+  shared_inbox_checked_at = models.DateTimeField(blank=True, null=True)
   
   def __str__(self):
-    return f"Node ({self.host})"
\ No newline at end of file
+    return f"Node ({self.host})"
+
+class OutboundDelivery(models.Model):
+  """
+  A payload waiting to be POSTed to a remote node. Rows are removed once
+  delivered and kept with the FAILED status once retries are exhausted.
+  """
+  class Status(models.TextChoices):
+    PENDING = "pending"
+    IN_FLIGHT = "in_flight"
+    FAILED = "failed"
+
+  id = models.CharField(primary_key=True, max_length=255, default=generate_next_id)
+  host = models.CharField(max_length=255, blank=False, null=False)
+  url = models.URLField(max_length=1024, blank=False, null=False)
+  payload = models.TextField(blank=False, null=False)
+  status = models.CharField(choices=Status.choices, max_length=16, default=Status.PENDING, blank=False, null=False)
+  attempts = models.PositiveIntegerField(default=0)
+  next_attempt_at = models.DateTimeField(default=timezone.now, blank=False, null=False)
+  claim_token = models.CharField(max_length=255, blank=True, null=True)
+  claimed_at = models.DateTimeField(blank=True, null=True)
+  last_error = models.TextField(blank=True, null=False, default="")
+  created_at = models.DateTimeField(auto_now_add=True, blank=False, null=False)
+
+  class Meta:
+    indexes = [
+      models.Index(fields=["status", "next_attempt_at"], name="delivery_status_next_idx")
+    ]
+
+  def __str__(self):
+    return f"OutboundDelivery {self.id} ({self.url}) [{self.status}] [attempts: {self.attempts}]"
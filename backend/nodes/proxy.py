@@ -0,0 +1,159 @@
+# Cache of GET responses proxied from remote nodes (comments, likes and liked of remote content)
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from .client import node_get
+
+STATS_KEY_PREFIX = "node_proxy:stats:"
+# Counted outcomes of proxy_get
+#   hit: served a fresh copy, stale: served a stale copy while revalidating in the background,
+#   miss: fetched while the caller waited, revalidated: remote answered 304 Not Modified,
+#   error: remote could not be reached or did not answer with JSON
+OUTCOMES = ("hit", "stale", "miss", "revalidated", "error")
+
+_executor: ThreadPoolExecutor|None = None
+_revalidating: set[str] = set()
+_lock = threading.Lock()
+
+def _get_url_version_key(url: str) -> str:
+  return "node_proxy:version:" + hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+def get_proxy_cache_key(url: str, params: dict = None) -> str:
+  # The url version is bumped by invalidate_proxied to drop the copies of every query of the url at once
+  version = cache.get(_get_url_version_key(url), 0)
+  query = urlencode(sorted((params or {}).items()))
+  return "node_proxy:" + hashlib.sha256(f"{version}\n{url}?{query}".encode("utf-8")).hexdigest()
+
+def invalidate_proxied(url: str, params: dict = None):
+  """
+  Drop the cached copy of a url after this node changed it on the remote node, so the next read sees the change.
+  Without params the copies of every query of the url (e.g. each page) are dropped.
+  """
+  if params is not None:
+    cache.delete(get_proxy_cache_key(url, params))
+    return
+
+  key = _get_url_version_key(url)
+  try:
+    cache.incr(key)
+  except ValueError:
+    cache.add(key, 0, timeout=None)
+    cache.incr(key)
+
+def _record(outcome: str):
+  key = STATS_KEY_PREFIX + outcome
+  try:
+    cache.incr(key)
+  except ValueError:
+    # Counter was never set or got evicted
+    cache.add(key, 0, timeout=None)
+    cache.incr(key)
+
+def get_proxy_cache_stats() -> dict[str, int|float]:
+  """
+  Outcome counters of proxied requests and the share served without waiting on a remote node.
+  """
+  stats = { outcome: cache.get(STATS_KEY_PREFIX + outcome, 0) for outcome in OUTCOMES }
+  total = stats["hit"] + stats["stale"] + stats["miss"]
+  stats["hit_rate"] = (stats["hit"] + stats["stale"]) / total if total > 0 else 0.0
+  return stats
+
+def reset_proxy_cache_stats():
+  cache.delete_many([STATS_KEY_PREFIX + outcome for outcome in OUTCOMES])
+
+def _fetch(key: str, url: str, params: dict, previous: dict|None) -> dict:
+  """
+  GET the url, conditionally when the previous copy came with validators.
+  Successful responses are cached for NODE_PROXY_CACHE_SECONDS plus NODE_PROXY_STALE_SECONDS.
+  Returns the cache entry ({ status, body, etag, last_modified, fetched_at }).
+  """
+  headers = {}
+  if previous is not None:
+    if previous["etag"]:
+      headers["If-None-Match"] = previous["etag"]
+    if previous["last_modified"]:
+      headers["If-Modified-Since"] = previous["last_modified"]
+
+  try:
+    response = node_get(url=url, params=params, headers=headers)
+  except requests.RequestException as e:
+    print(f"[PROXY] Failed to GET \"{url}\": {e}")
+    _record("error")
+    return previous or { "status": 502, "body": { "error": True, "message": "Remote node could not be reached" } }
+
+  if response.status_code == 304 and previous is not None:
+    _record("revalidated")
+    entry = { **previous, "fetched_at": time.time() }
+  else:
+    try:
+      body = response.json()
+    except ValueError:
+      print(f"[PROXY] Remote node answered \"{url}\" with status {response.status_code} and no JSON")
+      _record("error")
+      return previous or { "status": 502, "body": { "error": True, "message": "Invalid response from remote node" } }
+
+    entry = {
+      "status": response.status_code,
+      "body": body,
+      "etag": response.headers.get("ETag"),
+      "last_modified": response.headers.get("Last-Modified"),
+      "fetched_at": time.time()
+    }
+    if not response.ok:
+      # Errors are passed through but not cached
+      return entry
+
+  cache.set(key, entry, timeout=settings.NODE_PROXY_CACHE_SECONDS + settings.NODE_PROXY_STALE_SECONDS)
+  return entry
+
+def _revalidate(key: str, url: str, params: dict, previous: dict):
+  try:
+    _fetch(key, url, params, previous)
+  except Exception as e:
+    print(f"[PROXY] Failed to revalidate \"{url}\": {type(e).__name__}: {e}")
+  finally:
+    with _lock:
+      _revalidating.discard(key)
+    # Credential lookups may have opened a connection on this thread
+    close_old_connections()
+
+def _schedule_revalidation(key: str, url: str, params: dict, previous: dict):
+  """
+  Refresh a stale copy on a background thread, at most once at a time per key.
+  """
+  global _executor
+  with _lock:
+    if key in _revalidating:
+      return
+    _revalidating.add(key)
+    if _executor is None:
+      _executor = ThreadPoolExecutor(max_workers=settings.NODE_PROXY_REVALIDATE_WORKERS, thread_name_prefix="node-proxy")
+  _executor.submit(_revalidate, key, url, params, previous)
+
+def proxy_get(url: str, params: dict = None) -> tuple[int, any]:
+  """
+  GET a remote url on behalf of a client. Returns the status and JSON body to respond with.
+  Copies younger than NODE_PROXY_CACHE_SECONDS are served as is, older ones (up to
+  NODE_PROXY_STALE_SECONDS more) are served while being refreshed in the background.
+  """
+  params = params or {}
+  key = get_proxy_cache_key(url, params)
+  entry = cache.get(key)
+
+  if entry is not None:
+    if time.time() - entry["fetched_at"] < settings.NODE_PROXY_CACHE_SECONDS:
+      _record("hit")
+    else:
+      _record("stale")
+      _schedule_revalidation(key, url, params, entry)
+    return (entry["status"], entry["body"])
+
+  _record("miss")
+  entry = _fetch(key, url, params, None)
+  return (entry["status"], entry["body"])
@@ -0,0 +1,72 @@
+# In-process registry of the known nodes, so host lookups do not scan the node table
+import threading
+import time
+from urllib.parse import urlparse
+from django.conf import settings
+from deadlybird.util import dockerize_localhost, remove_trailing_slash
+from .models import Node
+
+class NodeRegistry:
+  """
+  Snapshot of every node keyed by normalized (hostname, port).
+  Hosts without an explicit port are also kept under (hostname, None) so that
+  lookups follow the same rules as deadlybird.util.compare_domains.
+  """
+  def __init__(self, nodes: list[Node]):
+    self.by_host: dict[tuple[str, int|None], list[Node]] = {}
+    self.by_hostname: dict[str, list[Node]] = {}
+    for node in nodes:
+      hostname, port = get_host_key(node.host)
+      self.by_host.setdefault((hostname, port), []).append(node)
+      self.by_hostname.setdefault(hostname, []).append(node)
+    self.loaded_at = time.monotonic()
+
+  def get_candidates(self, url: str) -> list[Node]:
+    hostname, port = get_host_key(url)
+    if port is None:
+      return self.by_hostname.get(hostname, [])
+    return self.by_host.get((hostname, port), []) + self.by_host.get((hostname, None), [])
+
+_registry: NodeRegistry|None = None
+_lock = threading.Lock()
+
+def get_host_key(url: str) -> tuple[str, int|None]:
+  parsed_url = urlparse(url)
+  return (dockerize_localhost(parsed_url.hostname or ""), parsed_url.port)
+
+def get_node_registry() -> NodeRegistry:
+  """
+  Retrieve the registry, loading it on first use. Node signals invalidate it in this process
+  and the TTL bounds how long other worker processes keep a stale copy.
+  """
+  global _registry
+  registry = _registry
+  if registry is not None and time.monotonic() - registry.loaded_at < settings.NODE_REGISTRY_TTL_SECONDS:
+    return registry
+
+  with _lock:
+    if _registry is None or _registry is registry:
+      _registry = NodeRegistry(list(Node.objects.all()))
+    return _registry
+
+def invalidate_node_registry():
+  global _registry
+  with _lock:
+    _registry = None
+
+def find_node_by_host(host: str) -> Node|None:
+  """
+  Node on the same domain and port as the host.
+  """
+  candidates = get_node_registry().get_candidates(host)
+  return candidates[0] if len(candidates) > 0 else None
+
+def find_node_by_api_url(url: str) -> Node|None:
+  """
+  Node whose host is a prefix of the url.
+  """
+  url = remove_trailing_slash(dockerize_localhost(url))
+  for node in get_node_registry().get_candidates(url):
+    if url.startswith(remove_trailing_slash(node.host)):
+      return node
+  return None
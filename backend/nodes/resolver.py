@@ -0,0 +1,106 @@
+# Resolution of remote authors referenced by inbox activities
+import threading
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from deadlybird.util import resolve_remote_route
+from identity.models import Author
+from identity.serializers import InboxAuthorSerializer
+from .client import node_get
+from .util import get_or_create_remote_author_from_api_payload
+
+class _Flight:
+  """
+  Fetch of an author document in progress, shared by every thread asking for the same author.
+  """
+  def __init__(self):
+    self.done = threading.Event()
+    self.payload: dict|None = None
+
+_flights: dict[str, _Flight] = {}
+_lock = threading.Lock()
+
+def get_remote_author_cache_key(author_id: str) -> str:
+  return f"remote_author:{author_id}"
+
+def _fetch_remote_author(author_id: str, host: str) -> dict|None:
+  if host is None:
+    print(f"Unable to fetch remote author {author_id} from an unknown node")
+    return None
+
+  url = resolve_remote_route(host, "author", { "author_id": author_id })
+
+  try:
+    res = node_get(url=url)
+  except requests.RequestException as e:
+    print(f"Failed to get remote author from \"{url}\": {e}")
+    return None
+  if not res.ok:
+    print(f"Failed to get remote author from \"{url}\" using credentials. Status {res.status_code}")
+    return None
+
+  try:
+    serializer = InboxAuthorSerializer(data=res.json())
+    valid = serializer.is_valid()
+  except (ValueError, KeyError):
+    valid = False
+  if not valid:
+    print(f"Failed to parse remote author JSON from \"{url}\"")
+    return None
+
+  return dict(serializer.data)
+
+def fetch_remote_author_payload(author_id: str, host: str) -> dict|None:
+  """
+  Author document of a remote author. Documents are cached for REMOTE_AUTHOR_CACHE_SECONDS and failures
+  for REMOTE_AUTHOR_NEGATIVE_CACHE_SECONDS, so a slow or broken peer is not asked again for every activity.
+  Concurrent calls for the same author wait for a single request. Returns None if the author could not be fetched.
+  """
+  key = get_remote_author_cache_key(author_id)
+  cached = cache.get(key)
+  if cached is not None:
+    return cached["payload"]
+
+  with _lock:
+    flight = _flights.get(key)
+    leader = flight is None
+    if leader:
+      flight = _flights[key] = _Flight()
+
+  if not leader:
+    flight.done.wait(settings.NODE_CLIENT_CONNECT_TIMEOUT + settings.NODE_CLIENT_READ_TIMEOUT)
+    return flight.payload
+
+  try:
+    flight.payload = _fetch_remote_author(author_id, host)
+    timeout = settings.REMOTE_AUTHOR_CACHE_SECONDS if flight.payload is not None else settings.REMOTE_AUTHOR_NEGATIVE_CACHE_SECONDS
+    cache.set(key, { "payload": flight.payload }, timeout=timeout)
+  finally:
+    with _lock:
+      _flights.pop(key, None)
+    flight.done.set()
+
+  return flight.payload
+
+def resolve_remote_author(author_id: str, host: str) -> Author|None:
+  """
+  Author with the id, fetching and storing it from its node when it is not known yet.
+  """
+  author = Author.objects.filter(id=author_id).first()
+  if author is not None:
+    return author
+
+  payload = fetch_remote_author_payload(author_id, host)
+  if payload is None:
+    return None
+  return get_or_create_remote_author_from_api_payload(payload)
+
+def store_remote_author(payload: dict) -> Author|None:
+  """
+  Create or refresh an author embedded in an activity and remember its document,
+  replacing a cached failure for that author.
+  """
+  author = get_or_create_remote_author_from_api_payload(payload)
+  if author is not None:
+    cache.set(get_remote_author_cache_key(author.id), { "payload": payload }, timeout=settings.REMOTE_AUTHOR_CACHE_SECONDS)
+  return author
@@ -1,11 +1,29 @@
 from django.urls import reverse
-from .models import Node
-from .util import get_auth_from_host
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from unittest.mock import Mock, patch
+from .models import Node, OutboundDelivery
+from .util import get_auth_from_host, upsert_remote_authors_from_api_payloads
+from .delivery import DELIVERY_TIMEOUT, enqueue_delivery, get_claim_lease, process_delivery_batch, refresh_shared_inboxes
+from .client import node_get, get_node_auth, reset_node_clients, _get_session
+from .directory import fetch_author_directories
+from .registry import get_node_registry, find_node_by_host
+from .proxy import proxy_get, invalidate_proxied, get_proxy_cache_key, get_proxy_cache_stats, _revalidating
+from .resolver import fetch_remote_author_payload, resolve_remote_author, store_remote_author
+from django.test import override_settings
+from identity.models import Author
+from following.models import Following
+from posts.util import send_post_to_inboxes
+from deadlybird.util import generate_next_id, get_host_from_api_url
 from deadlybird.base_test import BaseTestCase
 from deadlybird.settings import SITE_REMOTE_AUTH_USERNAME, SITE_REMOTE_AUTH_PASSWORD
 import requests
 import os
+import threading
+import time
 import base64
+import json
 
 port = os.environ.get("PORT", "8000")
 # Create your tests here.
@@ -47,4 +65,403 @@ class NodeTest(BaseTestCase):
     request = self.client.get(reverse("authors"), headers={
        "Authorization": f"Basic {base64.b64encode(bytes(f'{SITE_REMOTE_AUTH_USERNAME}:{SITE_REMOTE_AUTH_PASSWORD}', encoding='utf8')).decode('ascii')}"
     })
-    self.assertEquals(request.status_code, 200)
\ No newline at end of file
+    self.assertEquals(request.status_code, 200)
+
+class OutboundDeliveryTest(BaseTestCase):
+  def setUp(self):
+    super().setUp()
+    self.remote_host = "http://remote.example.com/"
+    user = User.objects.create_user(username="remote-user", password=None)
+    self.remote_author = Author.objects.create(
+      id=generate_next_id(),
+      user=user,
+      display_name="remote-user",
+      host=self.remote_host,
+      profile_url=f"{self.remote_host}api/authors/remote-user"
+    )
+    Following.objects.create(author=self.remote_author, target_author=self.authors[0])
+
+  def test_post_to_remote_follower_is_queued(self):
+    """
+    Creating a post should queue remote deliveries instead of sending them inline.
+    """
+    post = self.create_post(self.authors[0].id)
+    with patch("nodes.delivery.node_post") as mock_post:
+      send_post_to_inboxes(post.id, self.authors[0].id)
+      mock_post.assert_not_called()
+
+    delivery = OutboundDelivery.objects.get()
+    self.assertEquals(delivery.status, OutboundDelivery.Status.PENDING)
+    self.assertIn(self.remote_author.id, delivery.url)
+    self.assertEquals(json.loads(delivery.payload)["type"], "post")
+
+  def test_post_to_shared_inbox(self):
+    """
+    Followers on a node with a shared inbox should get the post through a single delivery.
+    """
+    with patch("nodes.directory.node_get", return_value=Mock(status_code=503)):
+      node = Node.objects.create(host=self.remote_host, outgoing_username="user", outgoing_password="pass")
+    with patch("nodes.delivery.node_get", return_value=Mock(ok=True, status_code=200, json=lambda: { "sharedInbox": f"{self.remote_host}api/inbox" })):
+      refresh_shared_inboxes()
+    node.refresh_from_db()
+    self.assertEquals(node.shared_inbox_url, f"{self.remote_host}api/inbox")
+    self.assertEquals(find_node_by_host(self.remote_host).shared_inbox_url, node.shared_inbox_url)
+
+    user = User.objects.create_user(username="remote-user-2", password=None)
+    other_remote_author = Author.objects.create(id=generate_next_id(), user=user, display_name="remote-user-2", host=self.remote_host, profile_url=f"{self.remote_host}api/authors/remote-user-2")
+    Following.objects.create(author=other_remote_author, target_author=self.authors[0])
+
+    post = self.create_post(self.authors[0].id)
+    send_post_to_inboxes(post.id, self.authors[0].id)
+
+    delivery = OutboundDelivery.objects.get()
+    self.assertEquals(delivery.url, node.shared_inbox_url)
+    payload = json.loads(delivery.payload)
+    self.assertEquals(payload["activity"]["type"], "post")
+    self.assertEquals(sorted(recipient.split("/")[-1] for recipient in payload["recipients"]), sorted([self.remote_author.id, other_remote_author.id]))
+
+  @override_settings(OUTBOUND_DELIVERY_BATCH_SIZE=100, OUTBOUND_DELIVERY_PER_NODE_CONCURRENCY=2)
+  def test_claim_lease_outlasts_slow_batch(self):
+    """
+    Deliveries of a batch stuck on one slow node should not be reclaimed by another drainer, abandoned ones should.
+    """
+    self.assertTrue(get_claim_lease() > timedelta(seconds=50 * sum(DELIVERY_TIMEOUT)))
+
+    delivery = enqueue_delivery(f"{self.remote_host}api/authors/remote-user/inbox", { "type": "post" })
+    OutboundDelivery.objects.filter(id=delivery.id).update(status=OutboundDelivery.Status.IN_FLIGHT, claimed_at=timezone.now() - timedelta(minutes=20))
+    with patch("nodes.delivery.node_post", return_value=Mock(ok=True, status_code=201)) as mock_post:
+      self.assertEquals(process_delivery_batch(), 0)
+
+      OutboundDelivery.objects.filter(id=delivery.id).update(claimed_at=timezone.now() - get_claim_lease() - timedelta(seconds=1))
+      self.assertEquals(process_delivery_batch(), 1)
+      mock_post.assert_called_once()
+
+  def test_shared_inbox_on_another_host_is_refused(self):
+    """
+    A shared inbox advertised on another host should not be used for the node's followers.
+    """
+    with patch("nodes.directory.node_get", return_value=Mock(status_code=503)):
+      node = Node.objects.create(host=self.remote_host, outgoing_username="user", outgoing_password="pass")
+    with patch("nodes.delivery.node_get", return_value=Mock(ok=True, status_code=200, json=lambda: { "sharedInbox": "http://elsewhere.example.com/api/inbox" })):
+      refresh_shared_inboxes()
+    node.refresh_from_db()
+    self.assertEquals(node.shared_inbox_url, "")
+
+    post = self.create_post(self.authors[0].id)
+    send_post_to_inboxes(post.id, self.authors[0].id)
+    self.assertEquals(OutboundDelivery.objects.get().url, f"{self.remote_host}api/authors/{self.remote_author.id}/inbox")
+
+  def test_successful_delivery_is_removed(self):
+    """
+    Delivered payloads should be removed from the queue.
+    """
+    enqueue_delivery(f"{self.remote_host}api/authors/remote-user/inbox", { "type": "post" })
+    with patch("nodes.delivery.node_post", return_value=Mock(ok=True, status_code=201)) as mock_post:
+      self.assertEquals(process_delivery_batch(), 1)
+      mock_post.assert_called_once()
+
+    self.assertFalse(OutboundDelivery.objects.exists())
+
+  def test_failed_delivery_is_retried_with_backoff(self):
+    """
+    Server errors should be retried later while client errors are given up on.
+    """
+    retried = enqueue_delivery(f"{self.remote_host}api/authors/remote-user/inbox", { "type": "post" })
+    with patch("nodes.delivery.node_post", return_value=Mock(ok=False, status_code=503, text="unavailable")):
+      process_delivery_batch()
+
+    retried.refresh_from_db()
+    self.assertEquals(retried.status, OutboundDelivery.Status.PENDING)
+    self.assertEquals(retried.attempts, 1)
+    self.assertTrue(retried.next_attempt_at > timezone.now())
+
+    # Not due yet, so nothing should be claimed
+    self.assertEquals(process_delivery_batch(), 0)
+
+    retried.delete()
+    rejected = enqueue_delivery(f"{self.remote_host}api/authors/remote-user/inbox", { "type": "post" })
+    with patch("nodes.delivery.node_post", return_value=Mock(ok=False, status_code=400, text="bad request")):
+      process_delivery_batch()
+
+    rejected.refresh_from_db()
+    self.assertEquals(rejected.status, OutboundDelivery.Status.FAILED)
+
+
+class NodeClientTest(BaseTestCase):
+  def setUp(self):
+    super().setUp()
+    reset_node_clients()
+
+  def _create_node(self):
+    # Skip the author import that runs when a node is saved
+    with patch("nodes.directory.node_get", return_value=Mock(status_code=503)):
+      return Node.objects.create(host="http://remote.example.com/", outgoing_username="remote", outgoing_password="secret")
+
+  def test_client_reuses_session_and_applies_timeouts(self):
+    """
+    Requests to the same node should share a pooled session, use the node credentials and always have a timeout.
+    """
+    self._create_node()
+
+    with patch("requests.Session.request", return_value=Mock(ok=True, status_code=200)) as mock_request:
+      node_get("http://remote.example.com/api/authors/")
+      node_get("http://remote.example.com/api/authors/1/")
+
+    self.assertEquals(mock_request.call_count, 2)
+    for call in mock_request.call_args_list:
+      self.assertEquals(call.kwargs["auth"], ("remote", "secret"))
+      self.assertIsNotNone(call.kwargs["timeout"])
+    self.assertIs(_get_session("http://remote.example.com"), _get_session("http://remote.example.com"))
+
+  def test_client_credentials_refresh_on_node_change(self):
+    """
+    Cached credentials should be dropped when the node is edited.
+    """
+    node = self._create_node()
+    self.assertEquals(get_node_auth("http://remote.example.com/"), ("remote", "secret"))
+
+    node.outgoing_password = "changed"
+    with patch("nodes.directory.node_get", return_value=Mock(status_code=503)):
+      node.save()
+    self.assertEquals(get_node_auth("http://remote.example.com/"), ("remote", "changed"))
+
+  @override_settings(NODE_REGISTRY_TTL_SECONDS=0)
+  def test_client_credentials_expire(self):
+    """
+    Credentials changed without this process' signals (e.g. by another worker) should be picked up once the registry expires.
+    """
+    node = self._create_node()
+    self.assertEquals(get_node_auth("http://remote.example.com/"), ("remote", "secret"))
+
+    Node.objects.filter(id=node.id).update(outgoing_password="changed")
+    self.assertEquals(get_node_auth("http://remote.example.com/"), ("remote", "changed"))
+
+class NodeRegistryTest(BaseTestCase):
+  def _create_node(self, host):
+    with patch("nodes.directory.node_get", return_value=Mock(status_code=503)):
+      return Node.objects.create(host=host, outgoing_username=host, outgoing_password="secret")
+
+  def test_lookups_use_registry(self):
+    """
+    Host lookups should be served from memory and follow node changes.
+    """
+    self._create_node("http://remote.example.com/")
+    node = self._create_node("http://other.example.com:8080/")
+    get_node_registry()
+
+    with self.assertNumQueries(0):
+      self.assertEquals(get_auth_from_host("http://remote.example.com:80/api/"), ("http://remote.example.com/", "secret"))
+      self.assertEquals(get_auth_from_host("http://other.example.com:8080"), ("http://other.example.com:8080/", "secret"))
+      self.assertEquals(get_auth_from_host("http://other.example.com:9090"), ("username", "password"))
+      self.assertEquals(get_host_from_api_url("http://other.example.com:8080/api/authors/1"), "http://other.example.com:8080/")
+      self.assertIsNone(get_host_from_api_url("http://unknown.example.com/api/authors/1"))
+
+    with patch("nodes.directory.node_get", return_value=Mock(status_code=503)):
+      node.delete()
+    self.assertIsNone(get_host_from_api_url("http://other.example.com:8080/api/authors/1"))
+
+@override_settings(REMOTE_AUTHOR_SYNC_PAGE_SIZE=2)
+class AuthorDirectoryFetchTest(BaseTestCase):
+  DIRECTORY_SIZES = { "http://big.example.com": 5, "http://small.example.com": 1 }
+
+  def setUp(self):
+    super().setUp()
+    with patch("nodes.directory.node_get", return_value=Mock(status_code=503)):
+      self.nodes = [Node.objects.create(host=f"{host}/", outgoing_username="remote", outgoing_password="secret") for host in [*self.DIRECTORY_SIZES, "http://down.example.com"]]
+
+  def _authors_page(self, url, params, **kwargs):
+    host = url.split("/api/")[0]
+    if host not in self.DIRECTORY_SIZES:
+      raise requests.ConnectionError("unreachable")
+
+    page, size = params["page"], params["size"]
+    start = (page - 1) * size
+    if start >= self.DIRECTORY_SIZES[host] and page > 1:
+      return Mock(status_code=404)
+    items = [{
+      "type": "author",
+      "id": f"{host}/api/authors/{host.split('//')[1]}-{i}",
+      "host": f"{host}/",
+      "displayName": f"remote{i}",
+      "url": f"{host}/api/authors/{host.split('//')[1]}-{i}",
+      "github": None,
+      "profileImage": ""
+    } for i in range(start, min(start + size, self.DIRECTORY_SIZES[host]))]
+    return Mock(status_code=200, json=Mock(return_value={ "type": "authors", "next": None if start + size >= self.DIRECTORY_SIZES[host] else "next", "items": items }))
+
+  def test_fetch_all_directories(self):
+    """
+    Every page of every reachable node should be imported, and an unreachable node should not stop the others.
+    """
+    with patch("nodes.directory.node_get", side_effect=self._authors_page):
+      states = fetch_author_directories(self.nodes, max_in_flight=4, per_node=2)
+
+    by_host = { state.node.host: state for state in states }
+    self.assertEquals(by_host["http://big.example.com/"].authors, 5)
+    self.assertEquals(by_host["http://big.example.com/"].pages, 3)
+    self.assertEquals(by_host["http://small.example.com/"].authors, 1)
+    self.assertIsNotNone(by_host["http://down.example.com/"].error)
+    for host, size in self.DIRECTORY_SIZES.items():
+      self.assertEquals(Author.objects.filter(host=host).count(), size)
+
+    big_node = Node.objects.get(host="http://big.example.com/")
+    self.assertIsNotNone(big_node.author_sync_completed_at)
+    self.assertIsNone(Node.objects.get(host="http://down.example.com/").author_sync_completed_at)
+
+class RemoteAuthorUpsertTest(BaseTestCase):
+  def _payload(self, i, display_name=None):
+    return {
+      "type": "author",
+      "id": f"http://remote.example.com/api/authors/upsert-{i}",
+      "host": "http://remote.example.com/",
+      "displayName": display_name or f"remote{i}",
+      "url": f"http://remote.example.com/api/authors/upsert-{i}",
+      "github": None,
+      "profileImage": ""
+    }
+
+  def test_upsert_batch(self):
+    """
+    A batch should be upserted with a constant number of queries, keeping the order of the payloads.
+    """
+    upsert_remote_authors_from_api_payloads([self._payload(0)])
+
+    payloads = [self._payload(0, display_name="renamed"), { "type": "author" }, *[self._payload(i) for i in range(1, 6)]]
+    # select, bulk update, user insert and author insert (plus the savepoint)
+    with self.assertNumQueries(6):
+      authors = upsert_remote_authors_from_api_payloads(payloads)
+
+    self.assertIsNone(authors[1])
+    self.assertEquals([author.id for author in authors if author is not None], [f"upsert-{i}" for i in range(6)])
+    self.assertEquals(Author.objects.get(id="upsert-0").display_name, "renamed")
+    self.assertEquals(Author.objects.filter(host="http://remote.example.com").count(), 6)
+    self.assertFalse(Author.objects.get(id="upsert-3").user.is_active)
+
+    # Nothing changed, only the select runs (plus the savepoint)
+    with self.assertNumQueries(3):
+      upsert_remote_authors_from_api_payloads(payloads)
+
+class RemoteAuthorResolverTest(BaseTestCase):
+  host = "http://remote.example.com/"
+
+  def _payload(self, id):
+    return {
+      "type": "author",
+      "id": f"http://remote.example.com/api/authors/{id}",
+      "host": self.host,
+      "displayName": id,
+      "url": f"http://remote.example.com/api/authors/{id}",
+      "github": None,
+      "profileImage": ""
+    }
+
+  def test_failures_are_cached(self):
+    """
+    A failed fetch should not be retried by the next activity, and an embedded payload replaces the cached failure.
+    """
+    with patch("nodes.resolver.node_get", return_value=Mock(ok=False, status_code=404)) as mock_get:
+      self.assertIsNone(resolve_remote_author("resolver-0", self.host))
+      self.assertIsNone(resolve_remote_author("resolver-0", self.host))
+      self.assertEquals(mock_get.call_count, 1)
+
+      store_remote_author(self._payload("resolver-0"))
+      self.assertEquals(fetch_remote_author_payload("resolver-0", self.host)["displayName"], "resolver-0")
+      self.assertEquals(resolve_remote_author("resolver-0", self.host).id, "resolver-0")
+      self.assertEquals(mock_get.call_count, 1)
+
+  def test_fetched_authors_are_stored(self):
+    with patch("nodes.resolver.node_get", return_value=Mock(ok=True, json=lambda: self._payload("resolver-1"))) as mock_get:
+      author = resolve_remote_author("resolver-1", self.host)
+      self.assertEquals(author.id, "resolver-1")
+      self.assertFalse(author.user.is_active)
+      self.assertEquals(mock_get.call_count, 1)
+
+  def test_concurrent_fetches_are_coalesced(self):
+    """
+    Threads asking for the same author while it is being fetched should share one request.
+    """
+    release = threading.Event()
+    def slow_get(**kwargs):
+      release.wait(5)
+      return Mock(ok=True, json=lambda: self._payload("resolver-2"))
+
+    results = []
+    with patch("nodes.resolver.node_get", side_effect=slow_get) as mock_get:
+      threads = [threading.Thread(target=lambda: results.append(fetch_remote_author_payload("resolver-2", self.host))) for _ in range(5)]
+      for thread in threads:
+        thread.start()
+      time.sleep(0.2)
+      release.set()
+      for thread in threads:
+        thread.join()
+
+    self.assertEquals(mock_get.call_count, 1)
+    self.assertEquals(len(results), 5)
+    self.assertTrue(all(result is not None and result["displayName"] == "resolver-2" for result in results))
+
+class ProxyCacheTest(BaseTestCase):
+  url = "http://remote.example.com/api/authors/a/posts/b/likes"
+
+  def _response(self, status_code=200, body=None, etag=None):
+    return Mock(ok=status_code < 400, status_code=status_code, json=lambda: body, headers={ "ETag": etag } if etag else {})
+
+  def test_fresh_copies_are_served(self):
+    with patch("nodes.proxy.node_get", return_value=self._response(body={ "type": "Likes", "items": [] })) as mock_get:
+      self.assertEquals(proxy_get(self.url), (200, { "type": "Likes", "items": [] }))
+      self.assertEquals(proxy_get(self.url), (200, { "type": "Likes", "items": [] }))
+      self.assertEquals(mock_get.call_count, 1)
+
+      # Different queries are different copies
+      proxy_get(self.url, params={ "page": 2 })
+      self.assertEquals(mock_get.call_count, 2)
+
+    stats = get_proxy_cache_stats()
+    self.assertEquals((stats["hit"], stats["miss"]), (1, 2))
+    self.assertAlmostEquals(stats["hit_rate"], 1 / 3)
+
+  def test_errors_are_not_cached(self):
+    with patch("nodes.proxy.node_get", return_value=self._response(status_code=404, body={ "error": True })) as mock_get:
+      self.assertEquals(proxy_get(self.url)[0], 404)
+      self.assertEquals(proxy_get(self.url)[0], 404)
+      self.assertEquals(mock_get.call_count, 2)
+
+    with patch("nodes.proxy.node_get", side_effect=requests.ConnectionError("unreachable")):
+      self.assertEquals(proxy_get(self.url)[0], 502)
+
+  def test_writes_invalidate_copies(self):
+    """
+    Invalidating a url should drop the copy of the given query, or of every query without one.
+    """
+    with patch("nodes.proxy.node_get", return_value=self._response(body={ "type": "Likes", "items": [] })) as mock_get:
+      proxy_get(self.url)
+      proxy_get(self.url, params={ "page": 2 })
+
+      invalidate_proxied(self.url, params={ "page": 2 })
+      proxy_get(self.url)
+      proxy_get(self.url, params={ "page": 2 })
+      self.assertEquals(mock_get.call_count, 3)
+
+      invalidate_proxied(self.url)
+      proxy_get(self.url)
+      proxy_get(self.url, params={ "page": 2 })
+      self.assertEquals(mock_get.call_count, 5)
+
+  @override_settings(NODE_PROXY_CACHE_SECONDS=0)
+  def test_stale_copies_are_revalidated(self):
+    """
+    Stale copies should be served right away and refreshed in the background with a conditional GET.
+    """
+    with patch("nodes.proxy.node_get", return_value=self._response(body={ "items": [1] }, etag="\"v1\"")):
+      proxy_get(self.url)
+
+    with patch("nodes.proxy.node_get", return_value=self._response(status_code=304)) as mock_get:
+      self.assertEquals(proxy_get(self.url), (200, { "items": [1] }))
+      deadline = time.monotonic() + 5
+      while get_proxy_cache_key(self.url) in _revalidating and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+      mock_get.assert_called_once()
+      self.assertEquals(mock_get.call_args.kwargs["headers"], { "If-None-Match": "\"v1\"" })
+
+    stats = get_proxy_cache_stats()
+    self.assertEquals((stats["stale"], stats["revalidated"]), (1, 1))
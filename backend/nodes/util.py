@@ -1,10 +1,13 @@
 from .models import Node
+from .registry import find_node_by_host
 from identity.models import Author
 from django.contrib.auth.models import User
-from deadlybird.util import generate_next_id, normalize_author_host, compare_domains
+from deadlybird.util import generate_next_id, normalize_author_host
+from django.db import transaction
 from django.db.utils import IntegrityError
 from django.utils import timezone
 from identity.serializers import InboxAuthorSerializer
+from posts.cache import invalidate_public_stream
 import json
 
 def format_node_api_url(node: Node, route: str):
@@ -16,62 +19,104 @@ def format_node_api_url(node: Node, route: str):
 def get_auth_from_host(host: str):
     "Given host return the authentication tuple"
 
-    nodes = Node.objects.all()
-    for node in nodes:
-       if compare_domains(node.host, host):
-          return (node.outgoing_username, node.outgoing_password)
+    node = find_node_by_host(host)
+    if node is not None:
+       return (node.outgoing_username, node.outgoing_password)
        
     print(f"Could not find credentials to requested host: {host} - Using default credentials")
     return ('username', 'password')
 
-def get_or_create_remote_author_from_api_payload(data: dict[str, any]):
-  serializer = InboxAuthorSerializer(data=data)
-  if not serializer.is_valid():
-    print(f"Unable to parse remote author JSON: {json.dumps(data)}")
-    print(serializer.errors)
-    return None
-  data = serializer.validated_data
-  
+# Profile fields of remote authors refreshed from their node on every upsert
+REMOTE_AUTHOR_SYNCED_FIELDS = ("profile_picture", "github", "display_name")
+
+def _build_remote_author(data: dict[str, any], user: User) -> Author:
+  return Author(
+    id=data["id"], # same id as remote object
+    user=user,
+    display_name=data["display_name"],
+    host=normalize_author_host(data["host"]),
+    profile_url=data["profile_url"],
+    profile_picture=data["profile_picture"],
+    last_github_check=timezone.now(),
+    github=data.get("github")
+  )
+
+def _build_remote_user(data: dict[str, any]) -> User:
+  user = User(
+    # TODO: RETHINK THIS OUT LATER:
+    # Problem is what if two nodes have an author with the same username?
+    username=data["display_name"] + "-" + generate_next_id()[0:7],
+    email="",
+    is_active=False # Remote users should not be allowed to login
+  )
+  user.set_unusable_password()
+  return user
+
+def _upsert_remote_authors(payloads: dict[str, dict[str, any]]) -> tuple[dict[str, Author], bool]:
+  """
+  Create or refresh the given validated payloads (keyed by id) using one select, one bulk insert
+  of users and authors and one bulk update. Returns the authors by id and if any author changed.
+  """
+  authors = Author.objects.in_bulk(list(payloads.keys()))
+
+  changed = []
+  for id, author in authors.items():
+    data = payloads[id]
+    if any(getattr(author, field) != data.get(field) for field in REMOTE_AUTHOR_SYNCED_FIELDS):
+      for field in REMOTE_AUTHOR_SYNCED_FIELDS:
+        setattr(author, field, data.get(field))
+      changed.append(author)
+  if len(changed) > 0:
+    Author.objects.bulk_update(changed, REMOTE_AUTHOR_SYNCED_FIELDS)
+
+  missing = [data for id, data in payloads.items() if id not in authors]
+  if len(missing) > 0:
+    users = User.objects.bulk_create([_build_remote_user(data) for data in missing])
+    created = Author.objects.bulk_create([_build_remote_author(data, user) for data, user in zip(missing, users)])
+    for author in created:
+      authors[author.id] = author
+
+  return (authors, len(changed) > 0 or len(missing) > 0)
+
+def upsert_remote_authors_from_api_payloads(payloads: list[dict[str, any]]) -> list[Author | None]:
+  """
+  Create or refresh remote authors from a batch of API author payloads.
+  Returns the author of every payload in the same order, or None for payloads which could not be parsed.
+  """
+  validated = []
+  for data in payloads:
+    serializer = InboxAuthorSerializer(data=data)
+    if not serializer.is_valid():
+      print(f"Unable to parse remote author JSON: {json.dumps(data)}")
+      print(serializer.errors)
+      validated.append(None)
+    else:
+      validated.append(serializer.validated_data)
+
+  # The last payload of an author wins if a batch repeats them
+  by_id = { data["id"]: data for data in validated if data is not None }
+  if len(by_id) == 0:
+    return [None] * len(validated)
+
   try:
-    author = Author.objects.get(id=data["id"])
-    if author.profile_picture != data["profile_picture"]:
-      author.profile_picture = data["profile_picture"]
-      author.save()
-    if author.github != data["github"]:
-      author.github = data["github"]
-      author.save()
-    if author.display_name != data["display_name"]:
-      author.display_name = data["display_name"]
-      author.save()
-
-    return author
-  except Author.DoesNotExist:
-   
-    try: 
-      created_user = User.objects.create_user(
-        # TODO: RETHINK THIS OUT LATER: 
-        # Problem is what if two nodes have an author with the same username?
-        username=data["display_name"] + "-" + generate_next_id()[0:7],
-        email=None,
-        password=None,
-      )
-      created_user.is_active = False    # Remote users should not be allowed to login
-      created_user.save()
-
-      # Create author object from user object
-      print("Creating user")
-      print(data)
-      return Author.objects.create(
-        id=data["id"], #same id as remote object          
-        user=created_user,
-        display_name=data["display_name"],
-        host=normalize_author_host(data["host"]),
-        profile_url=data["profile_url"],
-        profile_picture=data["profile_picture"],
-        last_github_check=timezone.now(),
-        github=data["github"]
-      )
-
-    except IntegrityError as e:
-      print("integrity error")
-      print(e)
\ No newline at end of file
+    with transaction.atomic():
+      authors, changed = _upsert_remote_authors(by_id)
+  except IntegrityError as e:
+    # Another worker inserted some of the authors concurrently, settle them one at a time
+    print(f"Bulk upsert of remote authors failed, retrying individually: {e}")
+    authors, changed = {}, True
+    for id, data in by_id.items():
+      try:
+        with transaction.atomic():
+          authors.update(_upsert_remote_authors({ id: data })[0])
+      except IntegrityError as e:
+        print(f"Failed to upsert remote author {id}: {e}")
+
+  if changed:
+    # Bulk writes skip the author signals which keep the public stream cache fresh
+    invalidate_public_stream()
+
+  return [None if data is None else authors.get(data["id"]) for data in validated]
+
+def get_or_create_remote_author_from_api_payload(data: dict[str, any]):
+  return upsert_remote_authors_from_api_payloads([data])[0]
@@ -3,12 +3,13 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from deadlybird.permissions import RemoteOrSessionAuthenticated
 from deadlybird.settings import SITE_HOST_URL
+from deadlybird.util import generate_full_api_url
 
 @api_view(["GET"])
 @permission_classes([RemoteOrSessionAuthenticated])
 def _getHostname(request: HttpRequest):
   """
   private method used by frontend to get the hostname for distinguishing between local
-  and remote authors
+  and remote authors. Also tells remote nodes where our shared inbox is.
   """
-  return Response({"hostname": SITE_HOST_URL}, status=200) 
\ No newline at end of file
+  return Response({"hostname": SITE_HOST_URL, "sharedInbox": generate_full_api_url("shared-inbox")}, status=200) 
\ No newline at end of file
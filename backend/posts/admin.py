@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Post, Comment, FollowingFeedPost
+from .models import Post, Comment, FollowingFeedPost, PostReplica
 
 # Register your models here.
 admin.site.register(Post)
 admin.site.register(Comment)
-admin.site.register(FollowingFeedPost)
\ No newline at end of file
+admin.site.register(FollowingFeedPost)
+admin.site.register(PostReplica)
\ No newline at end of file
@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from deadlybird.settings import RUN_SCHEDULER, REPLICA_RECONCILE_POLL_SECONDS
+from apscheduler.schedulers.background import BackgroundScheduler
 
 
 class PostsConfig(AppConfig):
@@ -6,4 +8,10 @@ class PostsConfig(AppConfig):
     name = 'posts'
 
     def ready(self):
-        import posts.signals
\ No newline at end of file
+        import posts.signals
+
+        if RUN_SCHEDULER:
+            from .replica import reconcile_replicas
+            scheduler = BackgroundScheduler()
+            scheduler.add_job(reconcile_replicas, 'interval', seconds=REPLICA_RECONCILE_POLL_SECONDS, max_instances=1, coalesce=True)
+            scheduler.start()
\ No newline at end of file
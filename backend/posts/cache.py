@@ -0,0 +1,43 @@
+# Cache of serialized public stream pages
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest
+
+# Bumped whenever something shown in the public stream changes, which orphans every cached page at once
+GENERATION_KEY = "public_stream:generation"
+
+def get_public_stream_generation() -> int:
+  generation = cache.get(GENERATION_KEY)
+  if generation is None:
+    cache.add(GENERATION_KEY, 1, timeout=None)
+    generation = cache.get(GENERATION_KEY, 1)
+  return generation
+
+def invalidate_public_stream():
+  """
+  Invalidate every cached public stream page.
+  """
+  try:
+    cache.incr(GENERATION_KEY)
+  except ValueError:
+    # Generation was never set or got evicted
+    cache.set(GENERATION_KEY, 1, timeout=None)
+
+def get_public_stream_cache_key(request: HttpRequest, node_authenticated: bool) -> str:
+  """
+  Cache key of a public stream page. Pages differ by the requested url (page/size/cursor)
+  and by whether remote nodes are asking (they only see our own posts).
+  """
+  url_hash = hashlib.sha256(request.build_absolute_uri().encode("utf-8")).hexdigest()
+  return f"public_stream:{get_public_stream_generation()}:{int(node_authenticated)}:{url_hash}"
+
+def get_cached_public_page(key: str) -> dict|None:
+  return cache.get(key)
+
+def cache_public_page(key: str, page: dict):
+  """
+  Page is a dict of next/prev links and items, each item holding the serialized post
+  along with its author ids so that blocks can be filtered per viewer.
+  """
+  cache.set(key, page, timeout=settings.PUBLIC_STREAM_CACHE_SECONDS)
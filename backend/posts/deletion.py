@@ -0,0 +1,57 @@
+# Set-based deletion of posts together with everything that refers to them
+from django.db import connections, transaction
+from django.db.models import Q, QuerySet
+from identity.models import InboxMessage
+from likes.models import Like
+from .models import Post, Comment, FollowingFeedPost, PostReplica
+
+def _delete_rows(queryset: QuerySet) -> int:
+  """
+  Delete the rows of a queryset with a single DELETE statement.
+  Skips the ORM collector (which loads every row to follow cascades and send signals),
+  so callers have to delete referring rows first.
+  """
+  meta = queryset.model._meta
+  select_sql, params = queryset.values("pk").query.sql_with_params()
+  connection = connections[queryset.db]
+  table = connection.ops.quote_name(meta.db_table)
+  pk = connection.ops.quote_name(meta.pk.column)
+  with connection.cursor() as cursor:
+    cursor.execute(f"DELETE FROM {table} WHERE {pk} IN ({select_sql})", params)
+    return cursor.rowcount
+
+def delete_posts(post_ids: list[str]) -> dict[str, int]:
+  """
+  Delete posts with their comments, likes, comment likes, inbox messages, feed rows and replica state
+  in one transaction. Everything but the posts is deleted with a single statement per table, so the
+  amount of statements does not grow with how popular the posts are. Returns the amount of rows deleted per table.
+  """
+  posts = Post.objects.filter(id__in=post_ids)
+  comments = Comment.objects.filter(post__in=posts.values("id"))
+  # Matched by content_id as well, it also covers likes made before the typed foreign keys existed
+  likes = Like.objects.filter(
+    Q(content_type=Like.ContentType.POST, content_id__in=posts.values("id")) |
+    Q(content_type=Like.ContentType.COMMENT, content_id__in=comments.values("id"))
+  )
+  messages = InboxMessage.objects.filter(
+    Q(post__in=posts.values("id")) |
+    Q(comment__in=comments.values("id")) |
+    Q(like__in=likes.values("id"))
+  )
+
+  with transaction.atomic():
+    if not posts.exists():
+      return {}
+
+    # Referring rows go first, the foreign keys are not followed by _delete_rows
+    deleted = {}
+    deleted["inbox_messages"] = _delete_rows(messages)
+    deleted["likes"] = _delete_rows(likes)
+    deleted["feed_posts"] = _delete_rows(FollowingFeedPost.objects.filter(post__in=posts.values("id")))
+    deleted["replicas"] = _delete_rows(PostReplica.objects.filter(post__in=posts.values("id")))
+    deleted["comments"] = _delete_rows(comments)
+    # Through the ORM so the post signals adjust the author counters and invalidate the public stream,
+    # the collector finds nothing left to cascade to
+    deleted["posts"] = posts.delete()[1].get(Post._meta.label, 0)
+
+  return deleted
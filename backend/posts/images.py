@@ -0,0 +1,190 @@
+# Content addressed storage of image post blobs
+import base64
+import binascii
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+from django.conf import settings
+from PIL import Image
+
+# Seconds clients may reuse an image before revalidating it with its ETag
+IMAGE_CACHE_MAX_AGE = 60 * 60
+
+# Longest side (in pixels) of the resized variants of an image
+VARIANT_SIZES = {
+  "thumbnail": 256,
+  "medium": 1024
+}
+ORIGINAL_VARIANT = "original"
+VARIANTS = (*VARIANT_SIZES.keys(), ORIGINAL_VARIANT)
+
+# Mime types of image posts when the data url does not state one
+CONTENT_TYPE_MIME_TYPES = {
+  "image/png;base64": "image/png",
+  "image/jpeg;base64": "image/jpeg",
+  "application/base64": "application/octet-stream"
+}
+
+# Magic numbers used to detect the type of images sent without a mime type
+MAGIC_MIME_TYPES = [
+  (b"\x89PNG\r\n\x1a\n", "image/png"),
+  (b"\xff\xd8\xff", "image/jpeg"),
+  (b"GIF87a", "image/gif"),
+  (b"GIF89a", "image/gif"),
+  (b"BM", "image/bmp")
+]
+
+def get_image_path(digest: str) -> str:
+  """
+  Location of a blob on disk, fanned out over two directory levels.
+  """
+  return os.path.join(settings.IMAGE_STORE_ROOT, digest[:2], digest[2:4], digest)
+
+def get_variant_path(digest: str, variant: str) -> str:
+  if variant == ORIGINAL_VARIANT:
+    return get_image_path(digest)
+  return f"{get_image_path(digest)}.{variant}"
+
+def get_variant_mime_type(mime_type: str) -> str:
+  """
+  Variants of JPEGs stay JPEGs, everything else is resized to PNG.
+  """
+  return "image/jpeg" if mime_type == "image/jpeg" else "image/png"
+
+def _write_atomically(path: str, data: bytes):
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  # Write to a temporary file first so readers never see a partially written blob
+  fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+  try:
+    with os.fdopen(fd, "wb") as temp_file:
+      temp_file.write(data)
+    os.replace(temp_path, path)
+  except:
+    if os.path.exists(temp_path):
+      os.remove(temp_path)
+    raise
+
+def store_image(data: bytes) -> str:
+  """
+  Store the bytes of an image and return their sha256 digest. Identical images are only stored once.
+  """
+  digest = hashlib.sha256(data).hexdigest()
+  path = get_image_path(digest)
+  if not os.path.exists(path):
+    _write_atomically(path, data)
+  return digest
+
+def generate_image_variants(digest: str, mime_type: str) -> list[str]:
+  """
+  Produce the resized variants of a stored image. Variants are only written when the
+  image is larger than the variant size, otherwise the original is served in its place.
+  Returns the variants that exist after generation.
+  """
+  generated = []
+  try:
+    with Image.open(get_image_path(digest)) as image:
+      image.load()
+      for variant, max_size in VARIANT_SIZES.items():
+        path = get_variant_path(digest, variant)
+        if os.path.exists(path):
+          generated.append(variant)
+          continue
+        if max(image.size) <= max_size:
+          continue
+
+        resized = image.copy()
+        resized.thumbnail((max_size, max_size))
+        output = BytesIO()
+        if get_variant_mime_type(mime_type) == "image/jpeg":
+          resized.convert("RGB").save(output, format="JPEG", quality=85, optimize=True)
+        else:
+          resized.save(output, format="PNG", optimize=True)
+        _write_atomically(path, output.getvalue())
+        generated.append(variant)
+  except (OSError, Image.DecompressionBombError) as e:
+    # Not an image Pillow understands, only the original can be served
+    print(f"Failed to generate variants of image {digest}: {e}")
+  return generated
+
+def resolve_image_variant(digest: str, mime_type: str, variant: str) -> tuple[str, str]:
+  """
+  Path and mime type of the file to serve for a variant, generating it if it is missing.
+  Falls back to the original image when there is no (smaller) variant.
+  """
+  if variant != ORIGINAL_VARIANT:
+    path = get_variant_path(digest, variant)
+    if os.path.exists(path) or variant in generate_image_variants(digest, mime_type):
+      return (path, get_variant_mime_type(mime_type))
+  return (get_image_path(digest), mime_type)
+
+def read_image(digest: str) -> bytes:
+  with open(get_image_path(digest), "rb") as image_file:
+    return image_file.read()
+
+def sniff_mime_type(data: bytes) -> str|None:
+  for magic, mime_type in MAGIC_MIME_TYPES:
+    if data.startswith(magic):
+      return mime_type
+  if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+    return "image/webp"
+  return None
+
+def parse_image_content(content: str, content_type: str) -> tuple[bytes, str]|None:
+  """
+  Decode the base64 content of an image post (either a data url or raw base64).
+  Returns the image bytes and their mime type, or None if the content is not valid base64.
+  """
+  mime_type = None
+  encoded = content
+  if "," in content:
+    header, encoded = content.split(",", 1)
+    if header.startswith("data:") and ";" in header:
+      mime_type = header[len("data:"):header.index(";")] or None
+
+  try:
+    data = base64.b64decode("".join(encoded.split()), validate=True)
+  except (binascii.Error, ValueError):
+    return None
+  if len(data) == 0:
+    return None
+
+  if mime_type is None or mime_type == "application/octet-stream":
+    mime_type = sniff_mime_type(data) or CONTENT_TYPE_MIME_TYPES.get(content_type, "application/octet-stream")
+  return (data, mime_type)
+
+def build_image_data_url(digest: str, mime_type: str) -> str:
+  """
+  Rebuild the base64 data url of a stored image, as federated nodes expect it in the post content.
+  """
+  return f"data:{mime_type};base64,{base64.b64encode(read_image(digest)).decode('ascii')}"
+
+class RangeNotSatisfiable(Exception):
+  pass
+
+def parse_range_header(header: str, size: int) -> tuple[int, int]|None:
+  """
+  Parse a single "bytes=start-end" range into inclusive offsets.
+  Returns None when the header should be ignored (malformed or multiple ranges)
+  and raises RangeNotSatisfiable when the range lies outside of the file.
+  """
+  if not header.startswith("bytes=") or "," in header:
+    return None
+  start, _, end = header[len("bytes="):].strip().partition("-")
+  try:
+    if len(start) == 0:
+      # Suffix range, the last N bytes
+      length = int(end)
+      if length <= 0:
+        raise RangeNotSatisfiable()
+      return (max(size - length, 0), size - 1)
+    start = int(start)
+    end = int(end) if len(end) > 0 else size - 1
+  except ValueError:
+    return None
+
+  if start >= size:
+    raise RangeNotSatisfiable()
+  if start > end:
+    return None
+  return (start, min(end, size - 1))
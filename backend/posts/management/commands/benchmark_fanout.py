@@ -0,0 +1,70 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from deadlybird.settings import SITE_HOST_URL
+from deadlybird.util import generate_full_api_url, generate_next_id
+from following.models import Following
+from identity.models import Author, InboxMessage
+from posts.models import Post, FollowingFeedPost
+from posts.util import send_post_to_inboxes
+
+class Command(BaseCommand):
+  help = "Measure local post fan-out throughput for an author with many followers. All rows are rolled back."
+
+  def add_arguments(self, parser):
+    parser.add_argument("--followers", type=int, default=10000, help="Amount of local followers to fan out to")
+    parser.add_argument("--visibility", choices=[Post.Visibility.PUBLIC, Post.Visibility.FRIENDS], default=Post.Visibility.PUBLIC)
+
+  def handle(self, *args, **options):
+    follower_count = options["followers"]
+
+    with transaction.atomic():
+      author = self._create_authors(1)[0]
+      followers = self._create_authors(follower_count)
+      Following.objects.bulk_create([Following(author=follower, target_author=author) for follower in followers], batch_size=500)
+      if options["visibility"] == Post.Visibility.FRIENDS:
+        Following.objects.bulk_create([Following(author=author, target_author=follower) for follower in followers], batch_size=500)
+
+      post_id = generate_next_id()
+      Post.objects.create(
+        id=post_id,
+        title="Benchmark",
+        description="Benchmark post",
+        content_type=Post.ContentType.PLAIN,
+        content="Benchmark post",
+        author=author,
+        visibility=options["visibility"],
+        origin=generate_full_api_url("post", kwargs={ "author_id": author.id, "post_id": post_id }),
+        source=generate_full_api_url("post", kwargs={ "author_id": author.id, "post_id": post_id })
+      )
+
+      start = time.perf_counter()
+      send_post_to_inboxes(post_id, author.id)
+      elapsed = time.perf_counter() - start
+
+      inbox_rows = InboxMessage.objects.filter(content_id=post_id).count()
+      feed_rows = FollowingFeedPost.objects.filter(post_id=post_id).count()
+      transaction.set_rollback(True)
+
+    rows = inbox_rows + feed_rows
+    self.stdout.write(f"Fanned out to {follower_count} followers ({options['visibility']}) in {elapsed:.3f}s")
+    self.stdout.write(f"{inbox_rows} inbox rows + {feed_rows} feed rows = {rows} rows ({rows / elapsed:.0f} rows/s)")
+
+  def _create_authors(self, count: int) -> list[Author]:
+    prefix = generate_next_id()[:8]
+    users = User.objects.bulk_create([
+      User(username=f"bench-{prefix}-{i}", is_active=False) for i in range(count)
+    ], batch_size=500)
+
+    authors = []
+    for user in users:
+      id = generate_next_id()
+      authors.append(Author(
+        id=id,
+        user=user,
+        display_name=user.username,
+        host=SITE_HOST_URL,
+        profile_url=generate_full_api_url("author", kwargs={ "author_id": id })
+      ))
+    return Author.objects.bulk_create(authors, batch_size=500)
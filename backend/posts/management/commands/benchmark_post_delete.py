@@ -0,0 +1,96 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from deadlybird.settings import SITE_HOST_URL
+from deadlybird.util import generate_full_api_url, generate_next_id
+from identity.models import Author, InboxMessage
+from likes.models import Like
+from posts.models import Post, Comment
+from posts.deletion import delete_posts
+
+class Command(BaseCommand):
+  help = "Measure deleting a post with many comments and likes. All rows are rolled back."
+
+  def add_arguments(self, parser):
+    parser.add_argument("--comments", type=int, default=10000, help="Amount of comments on the post, each liked once")
+    parser.add_argument("--likes", type=int, default=10000, help="Amount of likes on the post, each from another author")
+    parser.add_argument("--orm", action="store_true", help="Delete through the ORM collector instead of posts.deletion")
+
+  def handle(self, *args, **options):
+    with transaction.atomic():
+      author = self._create_authors(1)[0]
+      post = self._create_post(author)
+      rows = self._create_interactions(author, post, options["comments"], options["likes"])
+
+      with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        if options["orm"]:
+          post.delete()
+        else:
+          delete_posts([post.id])
+        elapsed = time.perf_counter() - start
+      transaction.set_rollback(True)
+
+    method = "ORM collector" if options["orm"] else "posts.deletion"
+    self.stdout.write(f"Deleted a post with {options['comments']} comments and {options['likes']} likes using {method}")
+    self.stdout.write(f"{rows} rows in {elapsed:.3f}s using {len(queries)} statements")
+
+  def _create_post(self, author: Author) -> Post:
+    post_id = generate_next_id()
+    return Post.objects.create(
+      id=post_id,
+      title="Benchmark",
+      description="Benchmark post",
+      content_type=Post.ContentType.PLAIN,
+      content="Benchmark post",
+      author=author,
+      visibility=Post.Visibility.PUBLIC,
+      origin=generate_full_api_url("post", kwargs={ "author_id": author.id, "post_id": post_id }),
+      source=generate_full_api_url("post", kwargs={ "author_id": author.id, "post_id": post_id })
+    )
+
+  def _create_interactions(self, author: Author, post: Post, comment_count: int, like_count: int) -> int:
+    """
+    Create the comments and likes along with their inbox messages. Returns the amount of rows created.
+    """
+    comments = Comment.objects.bulk_create([
+      Comment(id=generate_next_id(), post=post, author=author, content="Benchmark comment", content_type=Comment.ContentType.PLAIN)
+      for _ in range(comment_count)
+    ], batch_size=500)
+    likers = self._create_authors(like_count)
+    likes = Like.objects.bulk_create([
+      Like(id=generate_next_id(), send_author=liker, receive_author=author, content_id=post.id, content_type=Like.ContentType.POST, post=post)
+      for liker in likers
+    ] + [
+      Like(id=generate_next_id(), send_author=author, receive_author=author, content_id=comment.id, content_type=Like.ContentType.COMMENT, comment=comment)
+      for comment in comments
+    ], batch_size=500)
+    messages = InboxMessage.objects.bulk_create([
+      InboxMessage(author=author, content_id=comment.id, content_type=InboxMessage.ContentType.COMMENT, comment=comment)
+      for comment in comments
+    ] + [
+      InboxMessage(author=author, content_id=like.id, content_type=InboxMessage.ContentType.LIKE, like=like)
+      for like in likes
+    ], batch_size=500)
+
+    return 1 + len(comments) + len(likes) + len(messages)
+
+  def _create_authors(self, count: int) -> list[Author]:
+    prefix = generate_next_id()[:8]
+    users = User.objects.bulk_create([
+      User(username=f"bench-{prefix}-{i}", is_active=False) for i in range(count)
+    ], batch_size=500)
+
+    authors = []
+    for user in users:
+      id = generate_next_id()
+      authors.append(Author(
+        id=id,
+        user=user,
+        display_name=user.username,
+        host=SITE_HOST_URL,
+        profile_url=generate_full_api_url("author", kwargs={ "author_id": id })
+      ))
+    return Author.objects.bulk_create(authors, batch_size=500)
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_origin_author'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-published_date'], name='comment_post_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='followingfeedpost',
+            index=models.Index(fields=['follower', '-published_date'], name='feed_follower_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['visibility', '-published_date'], name='post_visibility_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-published_date'], name='post_author_published_idx'),
+        ),
+    ]
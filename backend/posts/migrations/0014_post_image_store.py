@@ -0,0 +1,47 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+IMAGE_CONTENT_TYPES = ("application/base64", "image/png;base64", "image/jpeg;base64")
+
+
+def move_images_to_store(apps, schema_editor):
+    from posts.images import parse_image_content, store_image
+    Post = apps.get_model("posts", "Post")
+
+    posts = Post.objects.filter(content_type__in=IMAGE_CONTENT_TYPES, image_digest__isnull=True).exclude(content="")
+    for post in posts.iterator(chunk_size=100):
+        image = parse_image_content(post.content, post.content_type)
+        if image is None:
+            continue
+        data, mime_type = image
+        Post.objects.filter(id=post.id).update(image_digest=store_image(data), image_mime_type=mime_type, content="")
+
+
+def restore_images_from_store(apps, schema_editor):
+    from posts.images import build_image_data_url
+    Post = apps.get_model("posts", "Post")
+
+    for post in Post.objects.filter(image_digest__isnull=False).iterator(chunk_size=100):
+        Post.objects.filter(id=post.id).update(content=build_image_data_url(post.image_digest, post.image_mime_type))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_comment_comment_post_published_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_digest',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_mime_type',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.RunPython(move_images_to_store, restore_images_from_store),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_feed_post_columns(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    FollowingFeedPost = apps.get_model("posts", "FollowingFeedPost")
+
+    posts = Post.objects.filter(id=OuterRef("post_id"))
+    FollowingFeedPost.objects.update(
+        visibility=Subquery(posts.values("visibility")[:1]),
+        origin_author=Subquery(posts.values("origin_author")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('identity', '0022_inboxmessage_inbox_author_id_idx_and_more'),
+        ('posts', '0014_post_image_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='followingfeedpost',
+            name='origin_author',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='feed_origin_author', to='identity.author'),
+        ),
+        migrations.AddField(
+            model_name='followingfeedpost',
+            name='visibility',
+            field=models.CharField(choices=[('PUBLIC', 'Public'), ('FRIENDS', 'Friends'), ('UNLISTED', 'Unlisted')], default='PUBLIC', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='fanout_skipped',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(populate_feed_post_columns, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='followingfeedpost',
+            name='feed_follower_published_idx',
+        ),
+        migrations.AddIndex(
+            model_name='followingfeedpost',
+            index=models.Index(fields=['follower', '-published_date', '-id'], name='feed_follower_published_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_feed_denormalization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostReplica',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='replica', serialize=False, to='posts.post')),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+                ('sync_next_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sync_failures', models.PositiveIntegerField(default=0)),
+                ('sync_error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sync_next_at'], name='replica_sync_next_idx')],
+            },
+        ),
+    ]
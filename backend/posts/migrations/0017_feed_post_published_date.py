@@ -0,0 +1,37 @@
+# Generated by Django 5.0.3 on 2026-10-18 13:21
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_post_published_dates(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    FollowingFeedPost = apps.get_model("posts", "FollowingFeedPost")
+
+    posts = Post.objects.filter(id=OuterRef("post_id"))
+    FollowingFeedPost.objects.update(published_date=Subquery(posts.values("published_date")[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_postreplica'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='followingfeedpost',
+            name='feed_follower_published_idx',
+        ),
+        migrations.AlterField(
+            model_name='followingfeedpost',
+            name='published_date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_post_published_dates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='followingfeedpost',
+            index=models.Index(fields=['follower', '-published_date', '-post'], name='feed_follower_published_idx'),
+        ),
+    ]
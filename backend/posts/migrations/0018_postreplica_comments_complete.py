@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_feed_post_published_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postreplica',
+            name='comments_complete',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from identity.models import Author
 from following.models import Following
 from nodes.models import Node
@@ -29,10 +30,44 @@ class Post(models.Model):
   author = models.ForeignKey(Author, blank=False, null=False, on_delete=models.CASCADE)
   published_date = models.DateTimeField(auto_now_add=True, blank=False, null=False)
   visibility = models.CharField(choices=Visibility.choices, max_length=8, blank=False, null=False)
+  # Set when the author had too many followers to fan the post out, followers then pull it into their stream
+  fanout_skipped = models.BooleanField(default=False, blank=False, null=False)
+  # Image posts keep their bytes in the image store (see posts.images), content is then left empty
+  image_digest = models.CharField(max_length=64, blank=True, null=True)
+  image_mime_type = models.CharField(max_length=100, blank=True, null=True)
+
+  class Meta:
+    indexes = [
+      # Public stream: filter by visibility, newest first
+      models.Index(fields=["visibility", "-published_date"], name="post_visibility_published_idx"),
+      # Author posts: filter by author, newest first
+      models.Index(fields=["author", "-published_date"], name="post_author_published_idx")
+    ]
+
+  def is_image(self) -> bool:
+    return self.content_type in IMAGE_CONTENT_TYPES
+
+  def save(self, *args, **kwargs):
+    if self.is_image() and len(self.content) > 0:
+      # Move newly set base64 content into the image store
+      from .images import generate_image_variants, parse_image_content, store_image
+      image = parse_image_content(self.content, self.content_type)
+      if image is not None:
+        data, mime_type = image
+        self.image_digest = store_image(data)
+        self.image_mime_type = mime_type
+        self.content = ""
+        generate_image_variants(self.image_digest, self.image_mime_type)
+    elif not self.is_image():
+      self.image_digest = None
+      self.image_mime_type = None
+    super().save(*args, **kwargs)
 
   def __str__(self) -> str:
     return f"Post {self.id} - ({self.author.display_name}) [{self.content_type}] [{self.visibility}]"
 
+IMAGE_CONTENT_TYPES = (Post.ContentType.APPLICATION_BASE64, Post.ContentType.PNG_BASE64, Post.ContentType.JPEG_BASE64)
+
 class Comment(models.Model):
   class ContentType(models.TextChoices):
     MARKDOWN = "text/markdown"
@@ -45,9 +80,44 @@ class Comment(models.Model):
   content = models.TextField(blank=False, null=False)
   published_date = models.DateTimeField(auto_now_add=True, blank=False, null=False)
 
+  class Meta:
+    indexes = [
+      models.Index(fields=["post", "-published_date"], name="comment_post_published_idx")
+    ]
+
 class FollowingFeedPost(models.Model):
   id = models.CharField(primary_key=True, max_length=255, default=generate_next_id)
   post = models.ForeignKey(Post, blank=False, null=False, on_delete=models.CASCADE)
   follower = models.ForeignKey(Author, blank=False, null=False, on_delete=models.CASCADE, related_name="feed_follower")
   from_author = models.ForeignKey(Author, blank=False, null=False, on_delete=models.CASCADE, related_name="feed_from_author")
-  published_date = models.DateTimeField(auto_now_add=True, blank=False, null=False)
\ No newline at end of file
+  # Copy of the post's published date, so the feed pages on the same key as posts (see get_following_stream)
+  published_date = models.DateTimeField(default=timezone.now, blank=False, null=False)
+  # Copies of the post columns the following stream filters on, so it never has to join posts
+  visibility = models.CharField(choices=Post.Visibility.choices, max_length=8, blank=False, null=False, default=Post.Visibility.PUBLIC)
+  origin_author = models.ForeignKey(Author, blank=True, null=True, on_delete=models.CASCADE, related_name="feed_origin_author")
+
+  class Meta:
+    indexes = [
+      # Following stream: a follower's feed, newest first (the post breaks ties for cursor pagination)
+      models.Index(fields=["follower", "-published_date", "-post"], name="feed_follower_published_idx")
+    ]
+
+class PostReplica(models.Model):
+  """
+  Sync state of the local mirror of a remote post's comments and likes (see posts.replica).
+  """
+  post = models.OneToOneField(Post, primary_key=True, on_delete=models.CASCADE, related_name="replica")
+  synced_at = models.DateTimeField(blank=True, null=True)
+  sync_next_at = models.DateTimeField(default=timezone.now, blank=False, null=False)
+  sync_failures = models.PositiveIntegerField(default=0)
+  sync_error = models.TextField(blank=True, null=False, default="")
+  # If the last sync mirrored every comment, otherwise comment reads still go to the remote node
+  comments_complete = models.BooleanField(default=False)
+
+  class Meta:
+    indexes = [
+      models.Index(fields=["sync_next_at"], name="replica_sync_next_idx")
+    ]
+
+  def __str__(self):
+    return f"PostReplica {self.post_id} [synced: {self.synced_at}]"
@@ -3,6 +3,11 @@ from rest_framework.response import Response
 from rest_framework import serializers
 from drf_spectacular.utils import inline_serializer, OpenApiParameter
 
+# Keyset ordering used by the cursor mode of post listings
+POSTS_CURSOR_ORDERING = ("-published_date", "-id")
+# Same key for following feed rows, which copy the post's published date
+FEED_CURSOR_ORDERING = ("-published_date", "-post_id")
+
 class CommentsPagination(PageNumberPagination):
     page_size = 5                  # default page size
     page_size_query_param = 'size'  # allow client to override the page size using this query parameter
@@ -0,0 +1,274 @@
+# Local mirror of the comments and likes of remote posts which reached our feeds,
+# so reads of them do not have to go to the remote node
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from deadlybird.settings import SITE_HOST_URL
+from deadlybird.util import resolve_remote_route, get_host_from_api_url, compare_domains, remove_trailing_slash
+from identity.models import Author
+from likes.models import Like
+from nodes.client import get_node_auth, node_get
+from nodes.util import upsert_remote_authors_from_api_payloads
+from .cache import invalidate_public_stream
+from .models import Post, Comment, PostReplica
+from .serializers import InboxCommentSerializer
+import requests
+
+# Seconds a claimed replica is left alone by other workers while it is synced
+CLAIM_LEASE_SECONDS = 300
+
+class FetchedReplica:
+  """
+  Comments and likes of a remote post as returned by its node.
+  """
+  def __init__(self):
+    self.comments = []
+    self.likes = []
+    # Only a complete listing allows removing what the node no longer has
+    self.comments_complete = True
+    self.error = None
+
+def track_remote_post(post: Post):
+  """
+  Start mirroring a remote post, or sync it again soon if it is already mirrored.
+  """
+  if compare_domains(post.source, SITE_HOST_URL):
+    return
+  PostReplica.objects.update_or_create(post=post, defaults={ "sync_next_at": timezone.now() })
+
+def has_fresh_replica(post: Post, comments: bool = False) -> bool:
+  """
+  If the likes of a remote post can be served from the mirror, or its comments when `comments` is set.
+  Comments are only served when the last sync got all of them.
+  """
+  fresh_after = timezone.now() - timedelta(seconds=settings.REPLICA_MAX_STALENESS_SECONDS)
+  replicas = PostReplica.objects.filter(post=post, synced_at__gte=fresh_after)
+  if comments:
+    replicas = replicas.filter(comments_complete=True)
+  return replicas.exists()
+
+def _get_remote_urls(post: Post) -> tuple[str, str]|None:
+  host = get_host_from_api_url(post.source)
+  if host is None:
+    return None
+  source_author_id, _, source_post_id = post.source.split("/")[-3:]
+  kwargs = { "author_id": source_author_id, "post_id": source_post_id }
+  return (resolve_remote_route(host, "comments", kwargs), resolve_remote_route(host, "post_likes", kwargs))
+
+def _fetch_replica(post: Post, auth) -> FetchedReplica:
+  """
+  Fetch the comments and likes of a remote post. Only performs network IO so that it can run on a worker thread.
+  """
+  fetched = FetchedReplica()
+  urls = _get_remote_urls(post)
+  if urls is None:
+    fetched.error = "Post is not from a known node"
+    return fetched
+  comments_url, likes_url = urls
+
+  try:
+    for page in range(1, settings.REPLICA_MAX_COMMENT_PAGES + 1):
+      response = node_get(url=comments_url, params={ "page": page, "size": settings.REPLICA_COMMENT_PAGE_SIZE }, auth=auth)
+      if response.status_code == 404 and page > 1:
+        # Paginators reject pages past the end
+        break
+      if not response.ok:
+        fetched.error = f"Comments: HTTP {response.status_code}"
+        return fetched
+
+      comments = response.json().get("comments")
+      if not isinstance(comments, list):
+        fetched.error = "Comments: response is not in the API comments format"
+        return fetched
+      fetched.comments.extend(comments)
+      if len(comments) < settings.REPLICA_COMMENT_PAGE_SIZE:
+        break
+    else:
+      fetched.comments_complete = False
+
+    response = node_get(url=likes_url, auth=auth)
+    if not response.ok:
+      fetched.error = f"Likes: HTTP {response.status_code}"
+      return fetched
+    likes = response.json().get("items")
+    if not isinstance(likes, list):
+      fetched.error = "Likes: response is not in the API likes format"
+      return fetched
+    fetched.likes = likes
+  except (requests.RequestException, ValueError, AttributeError) as e:
+    fetched.error = f"{type(e).__name__}: {e}"
+
+  return fetched
+
+def _resolve_authors(payloads: list) -> list[str|None]:
+  """
+  Ids of the authors of a list of API author payloads, storing the remote ones in one batch.
+  Our own authors are only looked up, the copies of other nodes must not overwrite their profiles.
+  """
+  ids = [None] * len(payloads)
+  remote_payloads = []
+  remote_indices = []
+  for i, payload in enumerate(payloads):
+    if not isinstance(payload, dict) or not isinstance(payload.get("id"), str) or not isinstance(payload.get("host"), str):
+      continue
+    if compare_domains(payload["host"], SITE_HOST_URL):
+      ids[i] = remove_trailing_slash(payload["id"]).split("/")[-1]
+    else:
+      remote_payloads.append(payload)
+      remote_indices.append(i)
+
+  for i, author in zip(remote_indices, upsert_remote_authors_from_api_payloads(remote_payloads)):
+    ids[i] = author.id if author is not None else None
+
+  local_ids = set(Author.objects.filter(id__in=[id for id in ids if id is not None]).values_list("id", flat=True))
+  return [id if id in local_ids else None for id in ids]
+
+def _apply_comments(post: Post, items: list, complete: bool) -> tuple[bool, bool]:
+  """
+  Make the local comments of a post match the fetched ones.
+  Returns if anything changed and if every comment of the post is mirrored.
+  """
+  parsed = {}
+  for item in items:
+    serializer = InboxCommentSerializer(data=item)
+    if not serializer.is_valid() or serializer.validated_data["content_type"] not in Comment.ContentType.values:
+      complete = False
+      continue
+    parsed[serializer.validated_data["id"].split("/")[-1]] = (item["author"], serializer.validated_data)
+
+  author_ids = _resolve_authors([author for author, _ in parsed.values()])
+  wanted = {}
+  for (id, (_, data)), author_id in zip(parsed.items(), author_ids):
+    if author_id is None:
+      complete = False
+      continue
+    wanted[id] = (author_id, data)
+
+  found = Comment.objects.in_bulk(list(wanted.keys()))
+  # Ids of other posts' comments are left alone
+  existing = { id: comment for id, comment in found.items() if comment.post_id == post.id }
+
+  created = [
+    Comment(id=id, post=post, author_id=author_id, content=data["content"], content_type=data["content_type"], published_date=data["published_date"])
+    for id, (author_id, data) in wanted.items() if id not in found
+  ]
+  if len(created) > 0:
+    Comment.objects.bulk_create(created)
+    # published_date is set on insert by auto_now_add, keep the remote one
+    for comment in created:
+      comment.published_date = wanted[comment.id][1]["published_date"]
+    Comment.objects.bulk_update(created, ["published_date"])
+
+  updated = []
+  for id, comment in existing.items():
+    data = wanted[id][1]
+    if comment.content != data["content"] or comment.content_type != data["content_type"]:
+      comment.content = data["content"]
+      comment.content_type = data["content_type"]
+      updated.append(comment)
+  if len(updated) > 0:
+    Comment.objects.bulk_update(updated, ["content", "content_type"])
+
+  removed = 0
+  if complete:
+    # Through the ORM so likes and inbox messages of the comments go with them
+    removed, _ = Comment.objects.filter(post=post).exclude(id__in=list(wanted.keys())).delete()
+
+  return (len(created) > 0 or len(updated) > 0 or removed > 0, complete)
+
+def _apply_likes(post: Post, items: list) -> bool:
+  """
+  Make the local likes of a post match the fetched ones. Returns if anything changed.
+  """
+  author_ids = _resolve_authors([item.get("author") if isinstance(item, dict) else None for item in items])
+  complete = all(id is not None for id in author_ids)
+  wanted = set(id for id in author_ids if id is not None)
+
+  likes = Like.objects.filter(content_type=Like.ContentType.POST, content_id=post.id)
+  existing = set(likes.values_list("send_author_id", flat=True))
+
+  # bulk_create returns the ignored conflicts too, so changes are counted from what was missing
+  added = wanted - existing
+  Like.objects.bulk_create([
+    Like(send_author_id=author_id, receive_author_id=post.author_id, content_id=post.id, content_type=Like.ContentType.POST, post=post)
+    for author_id in added
+  ], ignore_conflicts=True)
+
+  removed = 0
+  if complete:
+    removed, _ = likes.exclude(send_author_id__in=wanted).delete()
+
+  return len(added) > 0 or removed > 0
+
+def _get_sync_interval(post: Post) -> timedelta:
+  """
+  Recent posts get most of the comments and likes, older ones are synced less often.
+  """
+  age_days = max((timezone.now() - post.published_date).days, 0)
+  return timedelta(seconds=min(settings.REPLICA_SYNC_INTERVAL_SECONDS * (2 ** age_days), settings.REPLICA_SYNC_MAX_INTERVAL_SECONDS))
+
+def _record_sync(replica: PostReplica, fetched: FetchedReplica):
+  now = timezone.now()
+  if fetched.error is not None:
+    replica.sync_failures += 1
+    replica.sync_error = fetched.error
+    replica.sync_next_at = now + min(_get_sync_interval(replica.post) * (2 ** replica.sync_failures), timedelta(seconds=settings.REPLICA_SYNC_MAX_INTERVAL_SECONDS))
+    replica.save()
+    print(f"[REPLICA] Failed to sync post {replica.post_id} (failures={replica.sync_failures}): {fetched.error}")
+    return
+
+  with transaction.atomic():
+    changed, replica.comments_complete = _apply_comments(replica.post, fetched.comments, fetched.comments_complete)
+    changed = _apply_likes(replica.post, fetched.likes) or changed
+    replica.synced_at = now
+    replica.sync_failures = 0
+    replica.sync_error = ""
+    replica.sync_next_at = now + _get_sync_interval(replica.post)
+    replica.save()
+
+  if changed:
+    # Bulk writes skip the comment signals which keep the public stream cache fresh
+    invalidate_public_stream()
+
+def reconcile_replicas(limit: int = None) -> int:
+  """
+  Sync the due replicas, the posts read by the most followers and the newest first.
+  Replicas of posts older than REPLICA_POST_MAX_AGE_DAYS are dropped, their reads go back to the remote node.
+  Database access stays on the calling thread, worker threads only do HTTP.
+  Returns the number of replicas synced.
+  """
+  now = timezone.now()
+  PostReplica.objects.filter(post__published_date__lt=now - timedelta(days=settings.REPLICA_POST_MAX_AGE_DAYS)).delete()
+
+  due_ids = list(PostReplica.objects.filter(sync_next_at__lte=now) \
+    .annotate(readers=Count("post__followingfeedpost")) \
+    .order_by("-readers", "-post__published_date") \
+    .values_list("post_id", flat=True)[:limit or settings.REPLICA_BATCH_SIZE])
+  if len(due_ids) == 0:
+    return 0
+
+  # Claimed by pushing the next sync past the lease, so other workers skip them meanwhile
+  claimed_until = now + timedelta(seconds=CLAIM_LEASE_SECONDS)
+  PostReplica.objects.filter(post_id__in=due_ids, sync_next_at__lte=now).update(sync_next_at=claimed_until)
+  replicas = list(PostReplica.objects.filter(post_id__in=due_ids, sync_next_at=claimed_until).select_related("post"))
+
+  auth_by_host = {}
+  for replica in replicas:
+    host = get_host_from_api_url(replica.post.source)
+    if host is not None and host not in auth_by_host:
+      auth_by_host[host] = get_node_auth(host)
+
+  with ThreadPoolExecutor(max_workers=settings.REPLICA_SYNC_WORKERS) as executor:
+    futures = [
+      (replica, executor.submit(_fetch_replica, replica.post, auth_by_host.get(get_host_from_api_url(replica.post.source))))
+      for replica in replicas
+    ]
+    results = [(replica, future.result()) for replica, future in futures]
+
+  for replica, fetched in results:
+    _record_sync(replica, fetched)
+
+  return len(replicas)
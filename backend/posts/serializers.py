@@ -1,12 +1,26 @@
+from django.db.models import Prefetch, QuerySet
 from rest_framework import serializers
 from drf_spectacular.utils import extend_schema_field
 from identity.serializers import AuthorSerializer
 from deadlybird.settings import SITE_HOST_URL
-from deadlybird.util import generate_full_api_url, remove_trailing_slash, resolve_remote_route
+from deadlybird.util import count_subquery, generate_full_api_url, remove_trailing_slash, resolve_remote_route
 from .models import Post, Comment
+from .images import VARIANTS, build_image_data_url
 from identity.serializers import InboxAuthorSerializer
 from .pagination import generate_comments_pagination_schema
 
+# Amount of comments embedded in a serialized post
+EMBEDDED_COMMENTS_COUNT = 5
+
+def get_post_serializer_context(request) -> dict:
+  """
+  Serializer context of post listings. Passing ?images=<variant> makes image posts link
+  to that variant of their image instead of inlining the base64 content.
+  """
+  image_variant = request.query_params.get("images")
+  if image_variant in VARIANTS:
+    return { "image_variant": image_variant }
+  return {}
 
 class CommentSerializer(serializers.ModelSerializer):
   type = serializers.CharField(read_only=True, default="comment")
@@ -19,6 +33,13 @@ class CommentSerializer(serializers.ModelSerializer):
     model = Comment
     fields = ["type", "id", "author", "comment", "contentType", "published"]
 
+  @staticmethod
+  def setup_eager_loading(queryset: QuerySet) -> QuerySet:
+    """
+    Load the comment author and post author needed by the serializer.
+    """
+    return queryset.select_related("author", "post__author")
+
   def to_internal_value(self, data):
     internal_data = super().to_internal_value(data)
     internal_data["id"] = remove_trailing_slash(internal_data["id"]).split("/")[:-1]
@@ -41,7 +62,24 @@ class PostSerializer(serializers.ModelSerializer):
   commentsSrc = serializers.SerializerMethodField()
   published = serializers.DateTimeField(source="published_date")
     
+  @staticmethod
+  def setup_eager_loading(queryset: QuerySet) -> QuerySet:
+    """
+    Annotate and prefetch everything the serializer reads, so a page of posts
+    is serialized in a constant number of queries regardless of its size.
+    """
+    recent_comments = Comment.objects \
+      .select_related("author") \
+      .order_by("-published_date")[:EMBEDDED_COMMENTS_COUNT]
+
+    return queryset \
+      .select_related("author", "origin_author") \
+      .annotate(comment_count=count_subquery(Comment.objects.all(), "post")) \
+      .prefetch_related(Prefetch("comment_set", queryset=recent_comments, to_attr="recent_comments"))
+
   def get_count(self, object: Post) -> int:
+    if hasattr(object, "comment_count"):
+      return object.comment_count
     return Comment.objects.filter(post=object).count()
   
   def get_comments(self, object: Post) -> str:
@@ -49,13 +87,18 @@ class PostSerializer(serializers.ModelSerializer):
   
   @extend_schema_field(field=generate_comments_pagination_schema())
   def get_commentsSrc(self, object: Post) -> None:
+    if hasattr(object, "recent_comments"):
+      comments = object.recent_comments
+    else:
+      comments = Comment.objects.filter(post=object).order_by("-published_date")[:EMBEDDED_COMMENTS_COUNT]
+
     return {
       'type': 'comments',
       'page': 1,
-      'size': 5,
+      'size': EMBEDDED_COMMENTS_COUNT,
       'post': object.id,
       'id': object.id,
-      'comments': CommentSerializer(Comment.objects.filter(post=object).order_by("-published_date")[:5], many=True).data
+      'comments': CommentSerializer(comments, many=True).data
     }
   
   def to_internal_value(self, data):
@@ -72,6 +115,15 @@ class PostSerializer(serializers.ModelSerializer):
     data["source"] = generate_full_api_url("post", kwargs={ "author_id": author_id, "post_id": data["id"] }, force_no_slash=True)
     data["id"] = generate_full_api_url("post", kwargs={ "author_id": author_id, "post_id": data["id"] }, force_no_slash=True)
     data["originAuthor"] = data.pop("origin_author")
+    if instance.image_digest is not None and "image_variant" in self.context:
+      image_url = generate_full_api_url("post_image", kwargs={ "author_id": author_id, "post_id": instance.id })
+      data["content"] = f"{image_url}?variant={self.context['image_variant']}"
+    elif instance.image_digest is not None:
+      # Federated nodes expect image posts to carry their base64 content
+      try:
+        data["content"] = build_image_data_url(instance.image_digest, instance.image_mime_type)
+      except FileNotFoundError:
+        print(f"Image {instance.image_digest} of post {instance.id} is missing from the image store")
     return data
 
   class Meta:
@@ -95,6 +147,13 @@ class InboxPostSerializer(serializers.Serializer):
   published = serializers.DateTimeField(source="published_date")
   visibility = serializers.ChoiceField(choices=Post.Visibility.values)
 
+  def to_representation(self, instance):
+    data = super().to_representation(instance)
+    if isinstance(instance, Post) and instance.image_digest is not None:
+      # Image content lives in the image store, nodes get it inlined as base64
+      data["content"] = build_image_data_url(instance.image_digest, instance.image_mime_type)
+    return data
+
   def to_internal_value(self, data):
     internal_data = super().to_internal_value(data)
     internal_data["id"] = internal_data["id"].split("/")[-1]
@@ -1,17 +1,35 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Post, Comment
-from identity.models import InboxMessage
-from likes.models import Like
+from .models import Post, Comment, FollowingFeedPost
+from identity.models import Author
+from identity.util import adjust_author_counter
+from .cache import invalidate_public_stream
+
+@receiver(post_save, sender=Post)
+def handle_save_post(sender, instance: Post, created: bool, **kwargs):
+  invalidate_public_stream()
+  if created:
+    adjust_author_counter(instance.author_id, "post_count", 1)
+  else:
+    # Feed rows keep a copy of the visibility
+    FollowingFeedPost.objects.filter(post=instance).exclude(visibility=instance.visibility).update(visibility=instance.visibility)
 
 @receiver(post_delete, sender=Post)
 def handle_delete_post(sender, instance: Post, **kwargs):
-  post_id = instance.id
-  Like.objects.all().filter(content_type=Like.ContentType.POST, content_id=post_id).delete()
-  InboxMessage.objects.all().filter(content_type=InboxMessage.ContentType.POST, content_id=post_id).delete()
+  # Likes and inbox messages of the post are deleted by their foreign keys
+  invalidate_public_stream()
+  adjust_author_counter(instance.author_id, "post_count", -1)
+
+@receiver(post_save, sender=Comment)
+def handle_save_comment(sender, instance: Comment, **kwargs):
+  # Posts embed their latest comments
+  invalidate_public_stream()
 
 @receiver(post_delete, sender=Comment)
 def handle_delete_comment(sender, instance: Comment, **kwargs):
-  comment_id = instance.id
-  Like.objects.all().filter(content_type=Like.ContentType.COMMENT, content_id=comment_id).delete()
-  InboxMessage.objects.all().filter(content_type=InboxMessage.ContentType.COMMENT, content_id=comment_id).delete()
+  invalidate_public_stream()
+
+@receiver(post_save, sender=Author)
+def handle_save_author(sender, instance: Author, **kwargs):
+  # Posts embed their author profiles
+  invalidate_public_stream()
@@ -1,8 +1,31 @@
+from unittest.mock import Mock, patch
+from io import BytesIO
+import base64
+import json
+import os
+import requests
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
 from deadlybird.base_test import BaseTestCase
 from deadlybird.util import generate_full_api_url, generate_next_id
 from following.models import Following
-from .models import Comment, Post
+from identity.models import Author, BlockedAuthor, InboxMessage
+from identity.serializers import AuthorSerializer
+from nodes.models import Node, OutboundDelivery
+from likes.models import Like
+from .models import Comment, Post, FollowingFeedPost, PostReplica
+from .util import send_post_to_inboxes, get_following_feed
+from .deletion import delete_posts
+from .replica import track_remote_post, has_fresh_replica, reconcile_replicas, _apply_likes
+from .images import get_image_path, get_variant_path
 
 # Create your tests here.
 
@@ -419,4 +442,550 @@ class AuthorPostTest(BaseTestCase):
       "contentType": "text/plain",
       "comment": "Hello World"
     })
-    self.assertEquals(response.status_code, 404)
\ No newline at end of file
+    self.assertEquals(response.status_code, 404)
+class PostDeletionTest(BaseTestCase):
+  def _create_popular_post(self, comments: int):
+    author = self.create_author()
+    post = self.create_post(author.id)
+    follower = self.authors[0]
+    FollowingFeedPost.objects.create(post=post, follower=follower, from_author=author)
+    InboxMessage.objects.create(author=follower, content_id=post.id, content_type=InboxMessage.ContentType.POST, post=post)
+    created_comments = Comment.objects.bulk_create([
+      Comment(post=post, author=self.authors[i % 5], content="A comment", content_type=Comment.ContentType.PLAIN)
+      for i in range(comments)
+    ])
+    comment_likes = Like.objects.bulk_create([
+      Like(send_author=author, receive_author=comment.author, content_id=comment.id, content_type=Like.ContentType.COMMENT, comment=comment)
+      for comment in created_comments
+    ])
+    InboxMessage.objects.bulk_create([
+      InboxMessage(author=author, content_id=comment.id, content_type=InboxMessage.ContentType.COMMENT, comment=comment)
+      for comment in created_comments
+    ] + [
+      InboxMessage(author=like.receive_author, content_id=like.id, content_type=InboxMessage.ContentType.LIKE, like=like)
+      for like in comment_likes
+    ])
+    for liker in self.authors[0:5]:
+      # Likes from before the typed foreign keys only have a content id
+      Like.objects.create(send_author=liker, receive_author=author, content_id=post.id, content_type=Like.ContentType.POST)
+    return (author, post)
+
+  def test_delete_posts(self):
+    """
+    Check that deleting a post removes everything referring to it with a constant number of statements.
+    """
+    author, post = self._create_popular_post(comments=2)
+    other_post = self.posts[1]
+    Like.objects.create(send_author=author, receive_author=other_post.author, content_id=other_post.id, content_type=Like.ContentType.POST, post=other_post)
+    author.refresh_from_db()
+    self.assertEquals(author.post_count, 1)
+
+    with CaptureQueriesContext(connection) as small:
+      delete_posts([post.id])
+    self.assertFalse(Comment.objects.filter(post_id=post.id).exists())
+    self.assertFalse(Like.objects.filter(receive_author=author).exists())
+    self.assertFalse(InboxMessage.objects.filter(Q(post_id=post.id) | Q(author=author)).exists())
+    self.assertFalse(FollowingFeedPost.objects.filter(post_id=post.id).exists())
+    self.assertEquals(Like.objects.filter(content_id=other_post.id).count(), 1)
+    author.refresh_from_db()
+    self.assertEquals(author.post_count, 0)
+
+    # More comments than the ORM collector handles in one batch
+    _, popular_post = self._create_popular_post(comments=1500)
+    with CaptureQueriesContext(connection) as large, patch("posts.signals.invalidate_public_stream") as mock_invalidate:
+      delete_posts([popular_post.id])
+    self.assertEquals(len(small), len(large))
+    mock_invalidate.assert_called_once()
+    self.assertFalse(Comment.objects.filter(post_id=popular_post.id).exists())
+
+class PostReplicaTest(BaseTestCase):
+  host = "http://remote.example.com/"
+
+  def setUp(self):
+    super().setUp()
+    with patch("nodes.directory.node_get", return_value=Mock(status_code=503)):
+      Node.objects.create(host=self.host, outgoing_username="user", outgoing_password="pass")
+    self.remote_author = self._create_remote_author("replica-author")
+    post_id = generate_next_id()
+    source = f"{self.host}api/authors/{self.remote_author.id}/posts/{post_id}"
+    self.post = Post.objects.create(id=post_id, title="Remote", description="Remote post", content_type=Post.ContentType.PLAIN,
+      content="Remote post", author=self.remote_author, visibility=Post.Visibility.PUBLIC, source=source, origin=source)
+
+  def _create_remote_author(self, id):
+    user = User.objects.create_user(username=id, password=None)
+    return Author.objects.create(id=id, user=user, display_name=id, host=self.host, profile_url=f"{self.host}api/authors/{id}")
+
+  def _author_payload(self, id):
+    return { "type": "author", "id": f"{self.host}api/authors/{id}", "host": self.host, "displayName": id, "url": f"{self.host}api/authors/{id}", "github": None, "profileImage": "" }
+
+  def _remote_get(self, comments, likes):
+    def get(url, **kwargs):
+      if url.endswith("/likes"):
+        return Mock(ok=True, status_code=200, json=lambda: { "type": "Likes", "items": likes })
+      return Mock(ok=True, status_code=200, json=lambda: { "type": "comments", "comments": comments })
+    return get
+
+  def _comment_payload(self, id, author_id, published):
+    return {
+      "type": "comment",
+      "id": f"{self.post.source}/comments/{id}",
+      "author": self._author_payload(author_id),
+      "comment": f"Comment {id}",
+      "contentType": "text/plain",
+      "published": published
+    }
+
+  def test_replica_is_served_locally(self):
+    """
+    Comments and likes of a synced remote post should be served without calling the remote node.
+    """
+    track_remote_post(self.post)
+    self.assertFalse(has_fresh_replica(self.post))
+
+    comments = [self._comment_payload("remote-comment-1", "commenter", "2024-03-01T10:00:00Z"), self._comment_payload("remote-comment-2", "replica-author", "2024-03-02T10:00:00Z")]
+    likes = [{ "type": "Like", "author": self._author_payload("liker"), "object": self.post.source }]
+    with patch("posts.replica.node_get", side_effect=self._remote_get(comments, likes)) as mock_get:
+      self.assertEquals(reconcile_replicas(), 1)
+      self.assertEquals(mock_get.call_count, 2)
+    self.assertTrue(has_fresh_replica(self.post))
+    self.assertEquals(Comment.objects.get(id="remote-comment-1").published_date.day, 1)
+    self.assertEquals(Like.objects.get(post=self.post).send_author_id, "liker")
+
+    self.edit_session(id=self.authors[0].id)
+    with patch("nodes.proxy.node_get") as mock_proxy_get:
+      response = self.client.get(reverse("comments", kwargs={ "author_id": self.remote_author.id, "post_id": self.post.id }))
+      self.assertEquals(response.status_code, 200)
+      self.assertEquals([comment["comment"] for comment in response.json()["comments"]], ["Comment remote-comment-2", "Comment remote-comment-1"])
+      response = self.client.get(reverse("post_likes", kwargs={ "author_id": self.remote_author.id, "post_id": self.post.id }))
+      self.assertEquals(len(response.json()["items"]), 1)
+      mock_proxy_get.assert_not_called()
+
+    # Not due again yet
+    self.assertEquals(reconcile_replicas(), 0)
+
+  def test_replica_follows_remote_changes(self):
+    """
+    Comments and likes removed on the remote node should be removed from the replica.
+    """
+    track_remote_post(self.post)
+    comments = [self._comment_payload("remote-comment-3", "commenter", "2024-03-01T10:00:00Z"), self._comment_payload("remote-comment-4", "commenter", "2024-03-01T11:00:00Z")]
+    likes = [{ "type": "Like", "author": self._author_payload("liker"), "object": self.post.source }]
+    with patch("posts.replica.node_get", side_effect=self._remote_get(comments, likes)):
+      reconcile_replicas()
+
+    track_remote_post(self.post)
+    with patch("posts.replica.node_get", side_effect=self._remote_get(comments[1:], [])):
+      reconcile_replicas()
+    self.assertEquals(list(Comment.objects.filter(post=self.post).values_list("id", flat=True)), ["remote-comment-4"])
+    self.assertFalse(Like.objects.filter(post=self.post).exists())
+
+    # Failures keep the last replica and back off
+    track_remote_post(self.post)
+    with patch("posts.replica.node_get", return_value=Mock(ok=False, status_code=503)):
+      reconcile_replicas()
+    replica = PostReplica.objects.get(post=self.post)
+    self.assertEquals(replica.sync_failures, 1)
+    self.assertTrue(has_fresh_replica(self.post))
+    self.assertEquals(Comment.objects.filter(post=self.post).count(), 1)
+
+  @override_settings(REPLICA_MAX_COMMENT_PAGES=1, REPLICA_COMMENT_PAGE_SIZE=2)
+  def test_incomplete_replica_proxies_comments(self):
+    """
+    Comments of a post with more comments than a sync fetches should still be read from the remote node.
+    """
+    track_remote_post(self.post)
+    comments = [self._comment_payload("remote-comment-5", "commenter", "2024-03-01T10:00:00Z"), self._comment_payload("remote-comment-6", "commenter", "2024-03-01T11:00:00Z")]
+    likes = [{ "type": "Like", "author": self._author_payload("liker"), "object": self.post.source }]
+    with patch("posts.replica.node_get", side_effect=self._remote_get(comments, likes)):
+      reconcile_replicas()
+    self.assertFalse(PostReplica.objects.get(post=self.post).comments_complete)
+    self.assertTrue(has_fresh_replica(self.post))
+    self.assertFalse(has_fresh_replica(self.post, comments=True))
+
+    self.edit_session(id=self.authors[0].id)
+    with patch("nodes.proxy.node_get", return_value=Mock(ok=True, status_code=200, headers={}, json=lambda: { "type": "comments", "comments": [] })) as mock_proxy_get:
+      self.client.get(reverse("comments", kwargs={ "author_id": self.remote_author.id, "post_id": self.post.id }))
+      mock_proxy_get.assert_called_once()
+
+    # Likes which are already mirrored are not a change
+    self.assertFalse(_apply_likes(self.post, likes))
+
+  def test_like_on_unreachable_remote_post(self):
+    """
+    Likes of remote posts should answer 502 when the remote node cannot be reached.
+    """
+    self.edit_session(id=self.authors[0].id)
+    body = {
+      "type": "Like",
+      "author": AuthorSerializer(self.authors[0]).data,
+      "object": generate_full_api_url("post", kwargs={ "author_id": self.remote_author.id, "post_id": self.post.id })
+    }
+    with patch("identity.inbox.node_post", side_effect=requests.Timeout("Read timed out")):
+      response = self.client.post(reverse("inbox", kwargs={ "author_id": self.remote_author.id }), data=json.dumps(body), content_type="application/json")
+    self.assertEquals(response.status_code, 502)
+    self.assertFalse(Like.objects.filter(post=self.post).exists())
+
+  def test_comment_on_remote_post(self):
+    """
+    Comments on remote posts should only be stored once the remote node accepted them, and mark the replica due.
+    """
+    self.edit_session(id=self.authors[0].id)
+    url = reverse("comments", kwargs={ "author_id": self.remote_author.id, "post_id": self.post.id })
+    body = { "comment": "A remote comment", "contentType": Comment.ContentType.PLAIN }
+
+    with patch("posts.views.node_post", side_effect=requests.ConnectionError("Connection refused")):
+      self.assertEquals(self.client.post(url, body).status_code, 502)
+    with patch("posts.views.node_post", return_value=Mock(ok=False, status_code=400)):
+      self.assertEquals(self.client.post(url, body).status_code, 400)
+    self.assertFalse(Comment.objects.filter(post=self.post).exists())
+    self.assertFalse(PostReplica.objects.filter(post=self.post).exists())
+
+    with patch("nodes.proxy.node_get", return_value=Mock(ok=True, status_code=200, headers={}, json=lambda: { "type": "comments", "comments": [] })) as mock_get:
+      self.client.get(url)
+      with patch("posts.views.node_post", return_value=Mock(ok=True, status_code=201)) as mock_post:
+        self.assertEquals(self.client.post(url, body).status_code, 201)
+      # The proxied copy of the comments is dropped
+      self.client.get(url)
+      self.assertEquals(mock_get.call_count, 2)
+
+    comment = Comment.objects.get(post=self.post)
+    self.assertEquals(json.loads(mock_post.call_args.kwargs["data"])["id"].split("/")[-1], comment.id)
+    self.assertTrue(PostReplica.objects.get(post=self.post).sync_next_at <= timezone.now())
+
+class PostFanoutTest(BaseTestCase):
+  def setUp(self):
+    return super().setUp()
+
+  def test_friends_post_fanout(self):
+    """
+    Check that friend posts are only fanned out to mutual followers while public posts reach every follower.
+    """
+    author = self.create_author()
+    friend = self.create_author()
+    follower = self.create_author()
+    Following.objects.create(author=friend, target_author=author)
+    Following.objects.create(author=author, target_author=friend)
+    Following.objects.create(author=follower, target_author=author)
+
+    friends_post = self.create_post(author.id)
+    friends_post.visibility = Post.Visibility.FRIENDS
+    friends_post.save()
+    send_post_to_inboxes(friends_post.id, author.id)
+
+    self.assertEquals(set(FollowingFeedPost.objects.filter(post=friends_post).values_list("follower", flat=True)), { friend.id })
+    self.assertEquals(set(InboxMessage.objects.filter(content_id=friends_post.id).values_list("author", flat=True)), { friend.id })
+
+    public_post = self.create_post(author.id)
+    send_post_to_inboxes(public_post.id, author.id)
+    self.assertEquals(set(FollowingFeedPost.objects.filter(post=public_post).values_list("follower", flat=True)), { friend.id, follower.id })
+    self.assertEquals(InboxMessage.objects.filter(content_id=public_post.id).count(), 2)
+
+  @override_settings(FEED_FANOUT_FOLLOWER_THRESHOLD=1)
+  def test_popular_author_posts_are_pulled(self):
+    """
+    Check that posts of authors above the fanout threshold skip the feed but still show up in the following stream.
+    """
+    author = self.create_author()
+    friend = self.create_author()
+    follower = self.create_author()
+    Following.objects.create(author=friend, target_author=author)
+    Following.objects.create(author=author, target_author=friend)
+    Following.objects.create(author=follower, target_author=author)
+
+    pushed_post = self.create_post(friend.id)
+    send_post_to_inboxes(pushed_post.id, friend.id)
+    public_post = self.create_post(author.id)
+    send_post_to_inboxes(public_post.id, author.id)
+    friends_post = self.create_post(author.id)
+    friends_post.visibility = Post.Visibility.FRIENDS
+    friends_post.save()
+    send_post_to_inboxes(friends_post.id, author.id)
+
+    self.assertTrue(Post.objects.get(id=public_post.id).fanout_skipped)
+    self.assertFalse(FollowingFeedPost.objects.filter(post__in=[public_post, friends_post]).exists())
+    self.assertEquals(FollowingFeedPost.objects.get(post=pushed_post).follower_id, author.id)
+
+    self.edit_session(id=follower.id)
+    response = self.client.get(reverse("post_stream", kwargs={ "stream_type": "following" }))
+    self.assertEquals([post["id"].split("/")[-1] for post in response.json()["items"]], [public_post.id])
+
+    # Friends also see the friend post, merged with what was pushed to them
+    self.edit_session(id=friend.id)
+    response = self.client.get(reverse("post_stream", kwargs={ "stream_type": "following" }))
+    self.assertEquals([post["id"].split("/")[-1] for post in response.json()["items"]], [friends_post.id, public_post.id])
+
+class PostStreamQueryTest(BaseTestCase):
+  def setUp(self):
+    return super().setUp()
+
+  def _count_stream_queries(self, size: int) -> int:
+    # Start both requests cold, the block list of the viewer is cached by the first one
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.get(reverse("post_stream", kwargs={ "stream_type": "public" }), { "size": size })
+    self.assertEquals(response.status_code, 200)
+    self.assertEquals(len(response.json()["items"]), size)
+    return len(queries)
+
+  @patch("posts.views.random.randint", return_value=1)
+  def test_public_stream_query_count_is_constant(self, _):
+    """
+    Check that serializing a larger page of the public stream does not issue more queries.
+    """
+    self.edit_session(id=self.authors[0].id)
+    for post in self.posts:
+      Comment.objects.create(post=post, author=self.authors[1], content="A comment", content_type=Comment.ContentType.PLAIN)
+
+    self.assertEquals(self._count_stream_queries(2), self._count_stream_queries(8))
+
+class PostStreamCursorTest(BaseTestCase):
+  def setUp(self):
+    return super().setUp()
+
+  @patch("posts.views.random.randint", return_value=1)
+  def test_public_stream_cursor_pagination(self, _):
+    """
+    Check that following the cursor links walks the whole public stream in order and back.
+    """
+    self.edit_session(id=self.authors[0].id)
+    expected_ids = list(Post.objects.filter(visibility=Post.Visibility.PUBLIC).order_by("-published_date", "-id").values_list("id", flat=True))
+
+    pages = []
+    response = self.client.get(reverse("post_stream", kwargs={ "stream_type": "public" }), { "size": 3, "cursor": "" }).json()
+    self.assertIsNone(response["prev"])
+    pages.append(response)
+    while response["next"] is not None:
+      response = self.client.get(response["next"]).json()
+      pages.append(response)
+
+    seen_ids = [post["id"].split("/")[-1] for page in pages for post in page["items"]]
+    self.assertEquals(seen_ids, expected_ids)
+    self.assertEquals(len(pages), 4)
+
+    # Going back from the last page returns the previous page
+    previous = self.client.get(pages[-1]["prev"]).json()
+    self.assertEquals(previous["items"], pages[-2]["items"])
+
+  def test_following_stream_cursor_survives_pulled_posts(self):
+    """
+    Check that a cursor of the pushed feed keeps its place once the stream starts merging pulled posts.
+    """
+    author = self.create_author()
+    popular_author = self.create_author()
+    follower = self.create_author()
+    Following.objects.create(author=follower, target_author=author)
+    Following.objects.create(author=follower, target_author=popular_author)
+
+    now = timezone.now()
+    pushed_posts = []
+    for i in range(4):
+      post = self.create_post(author.id)
+      Post.objects.filter(id=post.id).update(published_date=now - timedelta(minutes=i))
+      send_post_to_inboxes(post.id, author.id)
+      pushed_posts.append(post.id)
+
+    self.edit_session(id=follower.id)
+    response = self.client.get(reverse("post_stream", kwargs={ "stream_type": "following" }), { "size": 2, "cursor": "" }).json()
+    self.assertEquals([post["id"].split("/")[-1] for post in response["items"]], pushed_posts[:2])
+
+    pulled_post = self.create_post(popular_author.id)
+    Post.objects.filter(id=pulled_post.id).update(published_date=now - timedelta(hours=1))
+    with override_settings(FEED_FANOUT_FOLLOWER_THRESHOLD=0):
+      send_post_to_inboxes(pulled_post.id, popular_author.id)
+
+    response = self.client.get(response["next"]).json()
+    self.assertEquals([post["id"].split("/")[-1] for post in response["items"]], pushed_posts[2:])
+    response = self.client.get(response["next"]).json()
+    self.assertEquals([post["id"].split("/")[-1] for post in response["items"]], [pulled_post.id])
+
+  def test_invalid_cursor(self):
+    """
+    Check that a tampered cursor is rejected.
+    """
+    self.edit_session(id=self.authors[0].id)
+    response = self.client.get(reverse("post_stream", kwargs={ "stream_type": "public" }), { "cursor": "not-a-cursor" })
+    self.assertEquals(response.status_code, 404)
+
+class PostQueryPlanTest(BaseTestCase):
+  def setUp(self):
+    return super().setUp()
+
+  def assertUsesIndex(self, queryset, index_name: str):
+    plan = queryset.explain()
+    self.assertIn(index_name, plan)
+    # Ordering should come straight from the index rather than a sort
+    self.assertNotIn("TEMP B-TREE", plan)
+
+  def test_stream_queries_use_indexes(self):
+    """
+    Check that the post listing queries in posts.views are served by their indexes.
+    """
+    author = self.authors[0]
+    blocked_authors = [self.authors[1]]
+
+    public_posts = Post.objects.filter(visibility=Post.Visibility.PUBLIC) \
+      .exclude(Q(author__in=blocked_authors) | Q(origin_author__in=blocked_authors)) \
+      .order_by("-published_date")
+    self.assertUsesIndex(public_posts, "post_visibility_published_idx")
+
+    author_posts = Post.objects.filter(author=author.id) \
+      .exclude(visibility=Post.Visibility.UNLISTED) \
+      .order_by("-published_date")
+    self.assertUsesIndex(author_posts, "post_author_published_idx")
+
+    feed = get_following_feed(author.id)
+    self.assertUsesIndex(feed, "feed_follower_published_idx")
+
+    comments = Comment.objects.filter(post=self.posts[0]).order_by("-published_date")
+    self.assertUsesIndex(comments, "comment_post_published_idx")
+
+class PublicStreamCacheTest(BaseTestCase):
+  def setUp(self):
+    return super().setUp()
+
+  def _get_public_stream(self):
+    response = self.client.get(reverse("post_stream", kwargs={ "stream_type": "public" }), { "size": 20 })
+    self.assertEquals(response.status_code, 200)
+    return [post for post in response.json()["items"] if post["type"] == "post"]
+
+  @patch("posts.views.random.randint", return_value=1)
+  def test_public_stream_is_cached_until_posts_change(self, _):
+    """
+    Check that a repeated public stream request is served without querying posts,
+    and that creating a post invalidates the cached page.
+    """
+    self.edit_session(id=self.authors[0].id)
+    self.assertEquals(len(self._get_public_stream()), len(self.posts))
+
+    with CaptureQueriesContext(connection) as queries:
+      self.assertEquals(len(self._get_public_stream()), len(self.posts))
+    self.assertFalse(any("posts_post" in query["sql"] for query in queries.captured_queries))
+
+    self.create_post(self.authors[1].id)
+    self.assertEquals(len(self._get_public_stream()), len(self.posts))
+
+  @patch("posts.views.random.randint", return_value=1)
+  def test_blocks_are_applied_to_cached_page(self, _):
+    """
+    Check that a cached page is still filtered by each viewer's blocks.
+    """
+    BlockedAuthor.objects.create(author=self.authors[0], blocked_author=self.authors[1])
+
+    self.edit_session(id=self.authors[2].id)
+    self.assertEquals(len(self._get_public_stream()), len(self.posts))
+
+    self.edit_session(id=self.authors[0].id)
+    posts = self._get_public_stream()
+    self.assertEquals(len(posts), len(self.posts) - 1)
+    self.assertNotIn(self.authors[1].id, [post["author"]["id"].split("/")[-1] for post in posts])
+
+class PostImageTest(BaseTestCase):
+  # A 1x1 black PNG
+  IMAGE_BYTES = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02\x00\x00\x00\x90wS\xde\x00\x00\x00\x0cIDATx\x9cc```\x00\x00\x00\x04\x00\x01\xf6\x178U\x00\x00\x00\x00IEND\xaeB`\x82"
+
+  def setUp(self):
+    super().setUp()
+    self.image_url = f"data:image/png;base64,{base64.b64encode(self.IMAGE_BYTES).decode('ascii')}"
+    self.image_post = self._create_image_post()
+
+  def _create_image_post(self) -> Post:
+    return Post.objects.create(
+      title="Image",
+      description="An image post.",
+      content_type=Post.ContentType.PNG_BASE64,
+      content=self.image_url,
+      author=self.authors[0],
+      visibility=Post.Visibility.PUBLIC,
+      source=generate_full_api_url("post", kwargs={ "author_id": "a", "post_id": "a" }),
+      origin=generate_full_api_url("post", kwargs={ "author_id": "a", "post_id": "a" })
+    )
+
+  def _image_route(self) -> str:
+    return reverse("post_image", kwargs={ "author_id": self.authors[0].id, "post_id": self.image_post.id })
+
+  def test_image_is_stored_once(self):
+    """
+    Check that image content is moved to the store, deduplicated and still served as base64 to nodes.
+    """
+    self.image_post.refresh_from_db()
+    self.assertEquals(self.image_post.content, "")
+    self.assertEquals(self.image_post.image_mime_type, "image/png")
+    self.assertTrue(os.path.exists(get_image_path(self.image_post.image_digest)))
+    self.assertEquals(self._create_image_post().image_digest, self.image_post.image_digest)
+
+    self.edit_session(id=self.authors[0].id)
+    response = self.client.get(reverse("post", kwargs={ "author_id": self.authors[0].id, "post_id": self.image_post.id })).json()
+    self.assertEquals(response["content"], self.image_url)
+
+  def test_image_is_sent_as_base64_to_remote_inboxes(self):
+    """
+    Check that deliveries of image posts to remote followers carry the image as a data url.
+    """
+    user = User.objects.create_user(username="remote-image-follower", password=None)
+    follower = Author.objects.create(id=generate_next_id(), user=user, display_name="remote-image-follower",
+      host="http://remote.example.com/", profile_url="http://remote.example.com/api/authors/remote-image-follower")
+    Following.objects.create(author=follower, target_author=self.authors[0])
+
+    send_post_to_inboxes(self.image_post.id, self.authors[0].id)
+    payload = json.loads(OutboundDelivery.objects.get().payload)
+    self.assertEquals(payload["content"], self.image_url)
+
+  def test_image_caching_headers(self):
+    """
+    Check that images are served with their mime type, ETag and honour conditional requests.
+    """
+    response = self.client.get(self._image_route())
+    self.assertEquals(response.status_code, 200)
+    self.assertEquals(response["Content-Type"], "image/png")
+    self.assertIn("max-age", response["Cache-Control"])
+    self.assertEquals(b"".join(response.streaming_content), self.IMAGE_BYTES)
+
+    response = self.client.get(self._image_route(), HTTP_IF_NONE_MATCH=response["ETag"])
+    self.assertEquals(response.status_code, 304)
+
+  def test_image_range_requests(self):
+    """
+    Check that byte ranges of an image can be requested.
+    """
+    response = self.client.get(self._image_route(), HTTP_RANGE="bytes=0-7")
+    self.assertEquals(response.status_code, 206)
+    self.assertEquals(response.content, self.IMAGE_BYTES[:8])
+    self.assertEquals(response["Content-Range"], f"bytes 0-7/{len(self.IMAGE_BYTES)}")
+
+    response = self.client.get(self._image_route(), HTTP_RANGE="bytes=-4")
+    self.assertEquals(response.content, self.IMAGE_BYTES[-4:])
+
+    response = self.client.get(self._image_route(), HTTP_RANGE=f"bytes={len(self.IMAGE_BYTES)}-")
+    self.assertEquals(response.status_code, 416)
+
+  def test_unknown_image_variant(self):
+    """
+    Check that unknown variants are rejected.
+    """
+    response = self.client.get(self._image_route(), { "variant": "huge" })
+    self.assertEquals(response.status_code, 400)
+
+  def test_image_variants(self):
+    """
+    Check that resized variants are generated for large images and linked from streams on request.
+    """
+    output = BytesIO()
+    Image.new("RGB", (600, 400), color=(255, 0, 0)).save(output, format="PNG")
+    self.image_url = f"data:image/png;base64,{base64.b64encode(output.getvalue()).decode('ascii')}"
+    self.image_post = self._create_image_post()
+    self.assertTrue(os.path.exists(get_variant_path(self.image_post.image_digest, "thumbnail")))
+
+    response = self.client.get(self._image_route(), { "variant": "thumbnail" })
+    self.assertEquals(response.status_code, 200)
+    self.assertEquals(Image.open(BytesIO(b"".join(response.streaming_content))).size, (256, 171))
+
+    # Medium is larger than the image itself, so the original is served
+    response = self.client.get(self._image_route(), { "variant": "medium" })
+    self.assertEquals(b"".join(response.streaming_content), output.getvalue())
+
+    self.edit_session(id=self.authors[0].id)
+    response = self.client.get(reverse("post_stream", kwargs={ "stream_type": "public" }), { "size": 50, "images": "thumbnail" }).json()
+    image_posts = [post for post in response["items"] if post["type"] == "post" and post["contentType"] == Post.ContentType.PNG_BASE64]
+    self.assertEquals(len(image_posts), 2)
+    for post in image_posts:
+      self.assertTrue(post["content"].endswith("/image?variant=thumbnail"))
@@ -1,57 +1,128 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, QuerySet
 from following.models import Following
-from following.util import is_friends
-from identity.models import InboxMessage, Author
+from following.util import get_friend_ids
+from identity.models import InboxMessage, Author, BlockedAuthor
 from deadlybird.settings import SITE_HOST_URL
-from nodes.util import get_auth_from_host
+from nodes.delivery import enqueue_delivery, enqueue_shared_inbox_delivery
+from nodes.registry import find_node_by_host
 from deadlybird.util import resolve_remote_route, generate_full_api_url, compare_domains
 from .serializers import InboxPostSerializer
 from .models import Post, FollowingFeedPost
-import requests
-import json
+from .pagination import POSTS_CURSOR_ORDERING, FEED_CURSOR_ORDERING
+
+# Rows written per INSERT statement when fanning out posts to local followers
+FANOUT_BATCH_SIZE = 500
+
+def get_inbox_recipients(author_id: str, visibility: str):
+  """
+  Retrieve the followers of an author that should receive a post with the given visibility.
+  Friend posts are only sent to followers the author follows back, resolved with a single subquery.
+  """
+  followers = Following.objects.filter(target_author=author_id)
+  if visibility == Post.Visibility.FRIENDS:
+    followers = followers.filter(author__in=get_friend_ids(author_id))
+
+  return [follower.author for follower in followers.select_related("author")]
 
 def send_post_to_inboxes(post_id: str, author_id: str):
   post = Post.objects.get(id=post_id)
   if post.visibility == Post.Visibility.UNLISTED:
     return  # Unlisted posts do not get sent to inboxes
 
-  followers = Following.objects.filter(target_author=author_id)
-  for follower in followers:
-    if post.visibility == Post.Visibility.FRIENDS and not is_friends(author_id, follower.author.id):
-      continue  # Friend posts should only be sent to the inboxes of friends
-
-    if not compare_domains(follower.author.host, SITE_HOST_URL):
+  local_recipients = []
+  shared_inbox_recipients = {}
+  payload = None
+  for recipient in get_inbox_recipients(author_id, post.visibility):
+    if not compare_domains(recipient.host, SITE_HOST_URL):
       # Remote follower, we have to publish the post to their inbox
-      url = resolve_remote_route(follower.author.host, "inbox", {
-          "author_id": follower.author.id
-      })
-      auth = get_auth_from_host(follower.author.host)
+      if payload is None:
+        payload = InboxPostSerializer(post).data
 
-      payload = InboxPostSerializer(post).data
+      node = find_node_by_host(recipient.host)
+      if node is not None and node.shared_inbox_url and compare_domains(node.shared_inbox_url, node.host):
+        # Sent once per node below
+        shared_inbox_recipients.setdefault(node.shared_inbox_url, []).append(
+          resolve_remote_route(recipient.host, "author", { "author_id": recipient.id }, force_no_slash=True)
+        )
+        continue
 
-      print(f"PUBLISHING MESSAGE FROM {follower.target_author.display_name} ({author_id}) OF {post_id} TO {follower.author.display_name} ({follower.author.id}) with url {url} \n{json.dumps(payload)}")
+      url = resolve_remote_route(recipient.host, "inbox", {
+          "author_id": recipient.id
+      })
+      # Delivered by the outbound queue so that the request does not wait on remote nodes
+      print(f"QUEUEING MESSAGE FROM {author_id} OF {post_id} TO {recipient.display_name} ({recipient.id}) with url {url}")
+      enqueue_delivery(url, payload)
+    else:
+      local_recipients.append(recipient)
 
-      response = requests.post(
-        url=url,
-        headers={'Content-Type': 'application/json'}, 
-        data=json.dumps(payload), 
-        auth=auth
-      )
+  for url, recipients in shared_inbox_recipients.items():
+    print(f"QUEUEING MESSAGE FROM {author_id} OF {post_id} TO {len(recipients)} AUTHORS with shared inbox {url}")
+    enqueue_shared_inbox_delivery(url, payload, recipients)
 
-      if not response.ok:
-        print(f"Failed to send inbox message {post_id} to {url}")
-        print(response.text)
-        print("Sent payload is")
-        print(json.dumps(payload))
+  # Followers of authors with a large following pull the post into their stream instead of getting a feed row each
+  follower_count = Author.objects.filter(id=author_id).values_list("follower_count", flat=True).first() or 0
+  skip_feed_fanout = follower_count > settings.FEED_FANOUT_FOLLOWER_THRESHOLD
 
-    else:
-      # Local follower, so we can just publish the inbox message and be done 
-      InboxMessage.objects.create(
-        author=follower.author,
+  # Local followers, so we can just publish the inbox messages and be done
+  with transaction.atomic():
+    InboxMessage.objects.bulk_create([
+      InboxMessage(
+        author=recipient,
         content_id=post_id,
-        content_type=InboxMessage.ContentType.POST
-      )
-      FollowingFeedPost.objects.create(
-        post=post,
-        follower=follower.author,
-        from_author_id=author_id
-      )
\ No newline at end of file
+        content_type=InboxMessage.ContentType.POST,
+        post=post
+      ) for recipient in local_recipients
+    ], batch_size=FANOUT_BATCH_SIZE)
+    if skip_feed_fanout:
+      Post.objects.filter(id=post_id).update(fanout_skipped=True)
+    else:
+      FollowingFeedPost.objects.bulk_create([
+        FollowingFeedPost(
+          post=post,
+          follower=recipient,
+          from_author_id=author_id,
+          published_date=post.published_date,
+          visibility=post.visibility,
+          origin_author_id=post.origin_author_id
+        ) for recipient in local_recipients
+      ], batch_size=FANOUT_BATCH_SIZE)
+
+def get_following_feed(author_id: str) -> QuerySet:
+  """
+  Feed rows of the posts pushed to an author by the authors they follow, newest first.
+  Only reads the denormalized feed columns so it is a range scan of the (follower, published_date) index.
+  """
+  following = Following.objects.filter(author=author_id).values("target_author")
+  blocked = BlockedAuthor.objects.filter(author=author_id).values("blocked_author")
+
+  return FollowingFeedPost.objects.filter(follower_id=author_id, from_author__in=following) \
+    .exclude(visibility=Post.Visibility.UNLISTED) \
+    .exclude(Q(visibility=Post.Visibility.FRIENDS) & ~Q(from_author__in=get_friend_ids(author_id))) \
+    .exclude(origin_author__in=blocked) \
+    .order_by(*FEED_CURSOR_ORDERING)
+
+def get_pulled_following_posts(author_id: str) -> QuerySet:
+  """
+  Posts of followed authors which were not fanned out (see send_post_to_inboxes) and are read at request time instead.
+  """
+  following = Following.objects.filter(author=author_id).values("target_author")
+  blocked = BlockedAuthor.objects.filter(author=author_id).values("blocked_author")
+
+  return Post.objects.filter(fanout_skipped=True, author__in=following) \
+    .filter(Q(visibility=Post.Visibility.PUBLIC) | Q(visibility=Post.Visibility.FRIENDS, author__in=get_friend_ids(author_id))) \
+    .exclude(origin_author__in=blocked)
+
+def get_following_stream(author_id: str) -> QuerySet:
+  """
+  Posts of an author's following stream, newest first. Pushed feed rows are merged with pulled posts
+  only when a followed author skipped fanout, otherwise this is the feed alone.
+  Both are ordered by the post's published date and id, so a cursor stays valid when the stream switches between them.
+  """
+  pulled = get_pulled_following_posts(author_id)
+  if not pulled.exists():
+    return get_following_feed(author_id)
+
+  return Post.objects.filter(Q(id__in=get_following_feed(author_id).values("post")) | Q(id__in=pulled.values("id"))) \
+    .order_by(*POSTS_CURSOR_ORDERING)
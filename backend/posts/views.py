@@ -1,11 +1,11 @@
-import base64
 from drf_spectacular.utils import extend_schema, OpenApiParameter, inline_serializer, OpenApiTypes
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import serializers
-from django.db.models import Q
-from django.http import HttpRequest, HttpResponse
+from django.db.models import Prefetch, Q
+from django.http import FileResponse, HttpRequest, HttpResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django.views.decorators.gzip import gzip_page
 from deadlybird.serializers import GenericSuccessSerializer, GenericErrorSerializer
 from deadlybird.settings import SITE_HOST_URL
@@ -13,18 +13,24 @@ from deadlybird.pagination import Pagination, generate_pagination_schema, genera
 from deadlybird.permissions import RemoteOrSessionAuthenticated, SessionAuthenticated, RemoteNodeAuthenticated, IsGetRequest, IsPutRequest, IsPostRequest, IsDeleteRequest
 from deadlybird.util import generate_full_api_url, generate_next_id, resolve_remote_route, get_host_from_api_url, compare_domains
 from following.util import is_friends
-from likes.models import Like
-from identity.models import InboxMessage, BlockedAuthor
-from nodes.util import get_auth_from_host
+from identity.models import InboxMessage
+from identity.util import get_blocked_author_ids
+from nodes.client import node_post
+from nodes.proxy import proxy_get, invalidate_proxied
+from .replica import has_fresh_replica, track_remote_post
 from .models import Post, Author, Following, Comment, FollowingFeedPost
 from blue.models import Ad, Subscription
 from blue.serializers import AdSerializer
-from .serializers import CommentSerializer, PostSerializer
-from .util import send_post_to_inboxes
-from .pagination import CommentsPagination, generate_comments_pagination_schema, generate_comments_pagination_query_schema
-import requests
+from .serializers import CommentSerializer, PostSerializer, get_post_serializer_context
+from .util import send_post_to_inboxes, get_following_stream
+from .deletion import delete_posts
+from .cache import cache_public_page, get_cached_public_page, get_public_stream_cache_key
+from .images import IMAGE_CACHE_MAX_AGE, ORIGINAL_VARIANT, VARIANTS, RangeNotSatisfiable, parse_range_header, resolve_image_variant
+from .pagination import POSTS_CURSOR_ORDERING, FEED_CURSOR_ORDERING, CommentsPagination, generate_comments_pagination_schema, generate_comments_pagination_query_schema
 import random
 import json
+import os
+import requests
 
 PostCreationPayloadSerializer = inline_serializer("PostCreationPayload", fields={
   "title": serializers.CharField(),
@@ -42,7 +48,8 @@ PostCreationPayloadSerializer = inline_serializer("PostCreationPayload", fields=
   operation_id="api_authors_retrieve_all_posts",
   methods=["GET"],
   parameters=[
-    *generate_pagination_query_schema()
+    *generate_pagination_query_schema(cursor=True),
+    OpenApiParameter("images", type=str, location=OpenApiParameter.QUERY, required=False, enum=VARIANTS, description="Return image posts as links to this image variant instead of inline base64")
   ],
   responses=generate_pagination_schema("posts", PostSerializer(many=True))
 )
@@ -62,7 +69,7 @@ def posts(request: HttpRequest, author_id: str):
   if request.method == "GET":
     # Retrieve author posts
     # Create paginator
-    paginator = Pagination("posts")
+    paginator = Pagination("posts", cursor_ordering=POSTS_CURSOR_ORDERING)
 
     # Check if the person has access to friend posts
     node_authenticated = hasattr(request, "is_node_authenticated") and request.is_node_authenticated
@@ -86,8 +93,9 @@ def posts(request: HttpRequest, author_id: str):
                 .order_by("-published_date")
 
     # Paginate and serialize results
+    posts = PostSerializer.setup_eager_loading(posts)
     posts_on_page = paginator.paginate_queryset(posts, request)
-    serialized_posts = PostSerializer(posts_on_page, many=True)
+    serialized_posts = PostSerializer(posts_on_page, many=True, context=get_post_serializer_context(request))
 
     return paginator.get_paginated_response(serialized_posts.data)
   else:
@@ -213,21 +221,9 @@ def post(request: HttpRequest, author_id: str, post_id: str):
     # Check if post exists
     if post is None:
       return Response({"error": True, "message": "post not found"}, status=404)
-    # Delete post
+    # Delete post along with its comments, likes, inbox messages and feed rows
     try:
-      # Delete all likes associated with the post 
-      likes = Like.objects.all().filter(content_id=post.id, content_type=Like.ContentType.POST)
-      for like in likes:
-        like.delete()
-
-      # Delete all likes associated with the comments of this post
-      comments = Comment.objects.all().filter(post=post)
-      for comment in comments:
-        likes = Like.objects.all().filter(content_id=comment.id, content_type=Like.ContentType.COMMENT)
-        for like in likes:
-          like.delete()
-
-      post.delete()
+      delete_posts([post.id])
       return Response({"error": False, "message": "post deleted"}, status=204)
     except Exception as e:
       print(e)
@@ -334,6 +330,8 @@ def share_post(request: HttpRequest, author_id: str, post_id: str):
     description=post.description,
     content_type=post.content_type,
     content=post.content,
+    image_digest=post.image_digest,
+    image_mime_type=post.image_mime_type,
     author=author,
     origin_author=origin_author,
     visibility=post.visibility
@@ -345,16 +343,19 @@ def share_post(request: HttpRequest, author_id: str, post_id: str):
 @extend_schema(
     parameters=[
         OpenApiParameter("author_id", type=str, location=OpenApiParameter.PATH, required=True, description="Author id of the post"),
-        OpenApiParameter("post_id", type=str, location=OpenApiParameter.PATH, required=True, description="Post id to retrieve image of")
+        OpenApiParameter("post_id", type=str, location=OpenApiParameter.PATH, required=True, description="Post id to retrieve image of"),
+        OpenApiParameter("variant", type=str, location=OpenApiParameter.QUERY, required=False, enum=VARIANTS, description="Resized variant of the image to retrieve (defaults to original)")
     ],
     responses={
       (200, "image/*"): OpenApiTypes.BINARY,
+      (206, "image/*"): OpenApiTypes.BINARY,
+      304: None,
       404: GenericErrorSerializer,
       400: GenericErrorSerializer
     }
 )
 @api_view(["GET"])
-def post_image(_: HttpRequest, author_id: str, post_id: str):
+def post_image(request: HttpRequest, author_id: str, post_id: str):
   # Retrieve post image
   try:
     post = Post.objects.get(id=post_id)
@@ -364,37 +365,74 @@ def post_image(_: HttpRequest, author_id: str, post_id: str):
       "message": "Post could not be found."
     }, status=404)
 
-  if (post.content_type != Post.ContentType.APPLICATION_BASE64) \
-    and (post.content_type != Post.ContentType.JPEG_BASE64) \
-    and (post.content_type != Post.ContentType.PNG_BASE64):
+  if not post.is_image():
       return Response({
         "error": True,
         "message": "This post is not an image post."
       }, status=400)
 
-  comma_index = post.content.index(",")
-  if comma_index == -1:
+  if post.image_digest is None:
     return Response({
       "error": True,
-      "message": "Invalid image content format (missing comma)"
+      "message": "Invalid image content format (base64)"
     }, status=400)
 
-  image_portion = post.content[comma_index + 1:]
-  
-  try:
-    image_base64 = base64.b64decode(image_portion)
-  except:
+  variant = request.query_params.get("variant", ORIGINAL_VARIANT)
+  if variant not in VARIANTS:
     return Response({
       "error": True,
-      "message": "Invalid image content format (base64)"
+      "message": f"Unknown image variant, expected one of {', '.join(VARIANTS)}."
     }, status=400)
-  
-  return HttpResponse(image_base64, content_type="image/*")
+
+  try:
+    image_path, mime_type = resolve_image_variant(post.image_digest, post.image_mime_type, variant)
+    image_file = open(image_path, "rb")
+  except FileNotFoundError:
+    return Response({
+      "error": True,
+      "message": "Image could not be found."
+    }, status=404)
+
+  # Blobs are content addressed, so the digest is a strong validator
+  etag = f'"{post.image_digest}"' if variant == ORIGINAL_VARIANT else f'"{post.image_digest}-{variant}"'
+  headers = {
+    "ETag": etag,
+    "Cache-Control": f"public, max-age={IMAGE_CACHE_MAX_AGE}",
+    "Accept-Ranges": "bytes"
+  }
+
+  if_none_match = request.headers.get("If-None-Match")
+  if if_none_match is not None and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+    image_file.close()
+    return HttpResponseNotModified(headers=headers)
+
+  size = os.fstat(image_file.fileno()).st_size
+  range_header = request.headers.get("Range")
+  if_range = request.headers.get("If-Range")
+  if range_header is not None and (if_range is None or if_range.strip() == etag):
+    try:
+      byte_range = parse_range_header(range_header, size)
+    except RangeNotSatisfiable:
+      image_file.close()
+      response = HttpResponse(status=416, headers=headers)
+      response["Content-Range"] = f"bytes */{size}"
+      return response
+
+    if byte_range is not None:
+      start, end = byte_range
+      image_file.seek(start)
+      response = HttpResponse(image_file.read(end - start + 1), status=206, content_type=mime_type, headers=headers)
+      image_file.close()
+      response["Content-Range"] = f"bytes {start}-{end}/{size}"
+      return response
+
+  return FileResponse(image_file, content_type=mime_type, headers=headers)
 
 @extend_schema(
     parameters=[
         OpenApiParameter("stream_type", type=str, location=OpenApiParameter.PATH, required=True, description="Either \"following\" or \"public\""),
-        *generate_pagination_query_schema()
+        *generate_pagination_query_schema(cursor=True),
+        OpenApiParameter("images", type=str, location=OpenApiParameter.QUERY, required=False, enum=VARIANTS, description="Return image posts as links to this image variant instead of inline base64")
     ],
     responses={
       200: generate_pagination_schema("posts", PostSerializer(many=True)),
@@ -407,28 +445,40 @@ def post_image(_: HttpRequest, author_id: str, post_id: str):
 def post_stream(request: HttpRequest, stream_type: str):
   # Public stream
   if stream_type == "public":
-    paginator = Pagination("posts")
-
-    # Get all public posts
+    paginator = Pagination("posts", cursor_ordering=POSTS_CURSOR_ORDERING)
 
-    blocked_authors = []
-    if "id" in request.session:
-      blocked_authors = list(map(lambda b: b.blocked_author, list(BlockedAuthor.objects.filter(author=request.session["id"]))))
-
-    posts = Post.objects.all() \
-      .filter(visibility=Post.Visibility.PUBLIC) \
-      .exclude(Q(author__in=blocked_authors) | Q(origin_author__in=blocked_authors)) \
-      .order_by("-published_date")
-      
+    # Get all public posts, the serialized page is shared by every viewer
     node_authenticated = hasattr(request, "is_node_authenticated") and request.is_node_authenticated
-    if node_authenticated:
-      posts = posts.filter(origin__startswith=SITE_HOST_URL)
-
-    # Paginate and return serialized result
-    posts_on_page = paginator.paginate_queryset(posts, request)
-    serialized_posts = PostSerializer(posts_on_page, many=True)
+    cache_key = get_public_stream_cache_key(request, node_authenticated)
+    page = get_cached_public_page(cache_key)
+    if page is None:
+      posts = Post.objects.all() \
+        .filter(visibility=Post.Visibility.PUBLIC) \
+        .order_by("-published_date")
+      if node_authenticated:
+        posts = posts.filter(origin__startswith=SITE_HOST_URL)
+
+      # Paginate and serialize result
+      posts = PostSerializer.setup_eager_loading(posts)
+      posts_on_page = paginator.paginate_queryset(posts, request)
+      page = {
+        "next": paginator.get_next_link(),
+        "prev": paginator.get_previous_link(),
+        "items": [{
+          "author": post.author_id,
+          "origin_author": post.origin_author_id,
+          "post": serialized_post
+        } for post, serialized_post in zip(posts_on_page, PostSerializer(posts_on_page, many=True, context=get_post_serializer_context(request)).data)]
+      }
+      cache_public_page(cache_key, page)
+
+    # Remove posts of blocked authors for this viewer
+    blocked_authors = frozenset()
+    if "id" in request.session:
+      blocked_authors = get_blocked_author_ids(request.session["id"])
 
-    serialized_posts_data = serialized_posts.data
+    serialized_posts_data = [item["post"] for item in page["items"] \
+                              if item["author"] not in blocked_authors and item["origin_author"] not in blocked_authors]
     if len(serialized_posts_data) > 0 and random.randint(0, 3) == 0 and not node_authenticated:
       # add an ad somewhere in the feed!
       print("adding ad to feed")
@@ -443,34 +493,22 @@ def post_stream(request: HttpRequest, stream_type: str):
         print(serialized_ad)
         serialized_posts_data.insert(random.randint(1, len(serialized_posts_data)), serialized_ad)
 
-    return paginator.get_paginated_response(serialized_posts_data)
+    return paginator.build_response(serialized_posts_data, page["next"], page["prev"])
   
   # Following stream
   elif stream_type == 'following' and "id" in request.session:
-    paginator = Pagination("posts")
-
-    # Get all authors following
-    following = Following.objects.all() \
-        .filter(author=request.session["id"]) \
-        .values_list('target_author', flat=True)
-
-    # Get all not friends from those following
-    not_friends = [follow for follow in following if not is_friends(follow, request.session["id"])]
-
-    blocked_authors = list(map(lambda b: b.blocked_author, list(BlockedAuthor.objects.filter(author=request.session["id"]))))
-
-    # Get all posts all posts from authors following
-    feed_messages = FollowingFeedPost.objects.filter(from_author__in=following, follower_id=request.session["id"]).order_by("-published_date") \
-      .exclude(post__visibility=Post.Visibility.UNLISTED) \
-      .exclude(post__visibility=Post.Visibility.FRIENDS, from_author__in=not_friends) \
-      .exclude(post__origin_author__in=blocked_authors)
-    
-    # paginate results
-    feed_messages_on_page = paginator.paginate_queryset(feed_messages, request)
-    posts = list(map(lambda fm: fm.post, feed_messages_on_page))
+    # Pushed feed rows, merged with the posts of followed authors that were too popular to fan out
+    stream = get_following_stream(request.session["id"])
+    if stream.model is FollowingFeedPost:
+      paginator = Pagination("posts", cursor_ordering=FEED_CURSOR_ORDERING)
+      stream = stream.prefetch_related(Prefetch("post", queryset=PostSerializer.setup_eager_loading(Post.objects.all())))
+      posts = [fm.post for fm in paginator.paginate_queryset(stream, request)]
+    else:
+      paginator = Pagination("posts", cursor_ordering=POSTS_CURSOR_ORDERING)
+      posts = paginator.paginate_queryset(PostSerializer.setup_eager_loading(stream), request)
     
     # return serialized result
-    serialized_posts = PostSerializer(posts, many=True)
+    serialized_posts = PostSerializer(posts, many=True, context=get_post_serializer_context(request))
 
     return paginator.get_paginated_response(serialized_posts.data)
   
@@ -534,22 +572,21 @@ def comments(request: HttpRequest, author_id: str, post_id: str):
   if request.method == "GET":
     # Get the comments on the post
 
-    if not compare_domains(post.source, SITE_HOST_URL):
-      # Remote post. get comments from remote
+    if not compare_domains(post.source, SITE_HOST_URL) and not has_fresh_replica(post, comments=True):
+      # Remote post which is not (fully) mirrored (see posts.replica). get comments from remote
       source_aid, _, source_pid = post.source.split("/")[-3:]
       url = resolve_remote_route(get_host_from_api_url(post.source), "comments", {
           "author_id": source_aid,
           "post_id": source_pid
       })
 
-      auth = get_auth_from_host(get_host_from_api_url(post.source))
-
-      res = requests.get(url=url, auth=auth, params=request.GET.dict())
-      return Response(res.json(), status=res.status_code)
+      status, body = proxy_get(url, params=request.GET.dict())
+      return Response(body, status=status)
 
     comments = Comment.objects.all() \
           .filter(post=post) \
           .order_by("-published_date")
+    comments = CommentSerializer.setup_eager_loading(comments)
     
     # Paginate the comments
     paginator = CommentsPagination()
@@ -588,25 +625,30 @@ def comments(request: HttpRequest, author_id: str, post_id: str):
           "author_id": post.author.id
       })
 
-      comment = Comment.objects.create(
+      # Only stored once the remote node accepted it
+      comment = Comment(
         post=post,
         author=author,
         content_type=request.POST["contentType"],
-        content=request.POST["comment"]
+        content=request.POST["comment"],
+        published_date=timezone.now()
       )
       payload = CommentSerializer(comment).data
-      comment.delete()  # Delete dummy comment object
 
+      keeps_comment_id = True
       if "y-com" in url:
         payload["id"] = resolve_remote_route(post.author.host, "post", kwargs={ "author_id": post.author.id, "post_id": post.id }, force_no_slash=True)
+        keeps_comment_id = False
 
-      auth = get_auth_from_host(post.author.host)
-      response = requests.post(
-        url=url,
-        headers={'Content-Type': 'application/json'}, 
-        data=json.dumps(payload), 
-        auth=auth
-      )
+      try:
+        response = node_post(
+          url=url,
+          headers={'Content-Type': 'application/json'}, 
+          data=json.dumps(payload)
+        )
+      except requests.RequestException as e:
+        print(f"Failed to send remote comment to {url}: {e}")
+        return Response({"error": True, "message": "Failed to create comment"}, status=502)
 
       # Print error if response failed
       if not response.ok:
@@ -614,6 +656,16 @@ def comments(request: HttpRequest, author_id: str, post_id: str):
         print(url)
         print(json.dumps(payload))
         return Response({"error": True, "message": "Failed to create comment"}, status=response.status_code)
+
+      # Nodes which assign their own comment ids would list it under another id, the mirror picks that copy up instead
+      if keeps_comment_id:
+        comment.save()
+      track_remote_post(post)
+      source_aid, _, source_pid = post.source.split("/")[-3:]
+      invalidate_proxied(resolve_remote_route(get_host_from_api_url(post.source), "comments", {
+          "author_id": source_aid,
+          "post_id": source_pid
+      }))
     else:
       # Local post being created
       comment = Comment.objects.create(
@@ -625,7 +677,8 @@ def comments(request: HttpRequest, author_id: str, post_id: str):
       InboxMessage.objects.create(
           author=comment.post.author,
           content_id=comment.id,
-          content_type=InboxMessage.ContentType.COMMENT
+          content_type=InboxMessage.ContentType.COMMENT,
+          comment=comment
       )
 
     return Response({
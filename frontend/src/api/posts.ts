@@ -13,7 +13,7 @@ export const apiGetAuthorPosts = async (
     size: number
 ): Promise<PostsResponse> => {
     const response = await apiRequest(
-        `${baseURL}/api/authors/${extractAuthorIdFromApi(authorID)}/posts/?page=${page}&size=${size}`
+        `${baseURL}/api/authors/${extractAuthorIdFromApi(authorID)}/posts/?page=${page}&size=${size}&images=medium`
     );    
     const data: PostsResponse = await response.json(); 
     return data;
@@ -33,7 +33,7 @@ export const apiGetPosts = async (
     size: number,
 ): Promise<PostsStreamResponse> => {
     const response = await apiRequest(
-        `${baseURL}/api/posts/${type}?page=${page}&size=${size}`
+        `${baseURL}/api/posts/${type}?page=${page}&size=${size}&images=medium`
     );    
     const data: PostsResponse = await response.json(); 
     return data;